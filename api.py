@@ -0,0 +1,220 @@
+"""Headless HTTP API for running searches from other systems.
+
+Searches are queued as background jobs (:class:`core.jobs.JobManager`) on a
+bounded worker pool whose threads keep their browser warm between jobs;
+the embedding model is cached per process as well. Finished results go to
+the shared :class:`core.result_store.ResultStore`, from which they are
+served page by page or streamed as an export.
+
+Run with::
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+Endpoints:
+
+* ``POST /jobs`` — start a search (``SearchSettings`` fields as JSON, plus
+  ``priority``; the caller is identified by the ``X-User`` header);
+* ``GET /jobs/{job_id}`` — status and progress;
+* ``DELETE /jobs/{job_id}`` — cancel (partial results are kept);
+* ``GET /jobs/{job_id}/results`` — one page of results, with filter and sort;
+* ``GET /jobs/{job_id}/export/{fmt}`` — streamed download in any export format;
+* ``GET /metrics`` — Prometheus metrics.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Literal
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+
+from core.admission import CONTROLLER
+from core.egress import get_pool
+from core.export_cache import EXPORT_FORMATS
+from core.export_excel import STREAM_WRITERS, stream_export
+from core.jobs import DEFAULT_DEADLINE_S, DEFAULT_WORKERS, JobManager, SearchJob
+from core.metrics import REGISTRY
+from core.result_store import PAGE_SIZE, ResultStore
+from core.settings import SearchSettings
+
+MAX_PAGE_SIZE = 1000
+
+
+class SearchRequest(BaseModel):
+    """Search parameters accepted by ``POST /jobs`` (a subset of ``SearchSettings``)."""
+
+    query: str = Field(min_length=1)
+    region: str = SearchSettings.region
+    date_from: date | None = None
+    date_to: date | None = None
+    doc_search: bool = True
+    extended_search: bool = True
+    limit: int = Field(SearchSettings.limit, ge=1, le=10_000)
+    near_duplicates: Literal["off", "mark", "collapse"] = "off"
+    ai_ranking: bool = False
+    ai_threshold: float = Field(SearchSettings.ai_threshold, ge=0.0, le=1.0)
+    ai_top_k: int = Field(SearchSettings.ai_top_k, ge=0)
+    ai_mode: Literal["fast", "balanced", "quality"] = "balanced"
+    ai_allow_download: bool = False
+    track_changes: bool = False
+    documents: bool = False
+    use_cache: bool = False
+    cache_max_age_h: float = Field(SearchSettings.cache_max_age_h, ge=0)
+    network_mode: Literal["live", "record", "replay"] = "live"
+    priority: Literal["interactive", "batch"] = "interactive"
+    deadline_s: float | None = Field(None, gt=0, description="Time limit of the job in seconds")
+
+    def to_settings(self) -> SearchSettings:
+        return SearchSettings(**self.model_dump(exclude={"deadline_s", "priority"}))
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    query: str
+    status: str
+    stage: str
+    pages: int
+    rows: int
+    queue_position: int | None = None
+    elapsed_s: float
+    errors: list[str] = []
+    run_id: str | None = None
+    changes: dict[str, int] | None = None  # new/changed/unchanged counts with track_changes
+    cached_at: float | None = None  # Unix time the rows were scraped, when served from the cache
+
+
+def _job_status(job: SearchJob) -> JobStatus:
+    errors = list(job.outcome.errors) if job.outcome is not None else []
+    if job.error:
+        errors.append(job.error)
+    return JobStatus(
+        job_id=job.job_id,
+        query=job.query,
+        status=job.status,
+        stage=job.progress.stage,
+        pages=job.progress.pages,
+        rows=job.progress.rows,
+        queue_position=job.progress.queue_position,
+        elapsed_s=round(job.elapsed_s, 3),
+        errors=errors,
+        run_id=job.run_id,
+        changes=job.outcome.changes.counts() if job.outcome and job.outcome.changes else None,
+        cached_at=job.outcome.cached_at if job.outcome else None,
+    )
+
+
+def create_app(manager: JobManager | None = None, store: ResultStore | None = None) -> FastAPI:
+    """Build the API around a job manager that writes to *store*."""
+    store = store or ResultStore()
+    if manager is None:
+        manager = JobManager(
+            workers=int(os.environ.get("API_WORKERS", DEFAULT_WORKERS)),
+            deadline_s=float(os.environ.get("API_DEADLINE_S", DEFAULT_DEADLINE_S)),
+            result_store=store,
+        )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        manager.close()
+
+    app = FastAPI(title="Поиск закупок", lifespan=lifespan)
+
+    def get_job(job_id: str) -> SearchJob:
+        try:
+            return manager.status(job_id)
+        except KeyError:
+            raise HTTPException(404, f"Задание не найдено: {job_id}") from None
+
+    def finished_run(job_id: str) -> str:
+        job = get_job(job_id)
+        if not job.finished:
+            raise HTTPException(409, "Поиск ещё выполняется")
+        if job.run_id is None:
+            raise HTTPException(404, "У задания нет результатов")
+        return job.run_id
+
+    @app.post("/jobs", status_code=202, response_model=JobStatus)
+    async def submit_job(
+        request: SearchRequest, http: Request, x_user: str | None = Header(None)
+    ) -> JobStatus:
+        # Per-user browser limits apply to X-User, or to the client address without it
+        user = x_user or (http.client.host if http.client else "")
+        job_id = manager.submit(
+            request.to_settings(), deadline_s=request.deadline_s, user=user, priority=request.priority
+        )
+        return _job_status(manager.status(job_id))
+
+    @app.get("/jobs/{job_id}", response_model=JobStatus)
+    async def job_status(job_id: str) -> JobStatus:
+        return _job_status(get_job(job_id))
+
+    @app.delete("/jobs/{job_id}", response_model=JobStatus)
+    async def cancel_job(job_id: str) -> JobStatus:
+        get_job(job_id)
+        manager.cancel(job_id)
+        return _job_status(manager.status(job_id))
+
+    @app.get("/jobs/{job_id}/results")
+    def job_results(
+        job_id: str,
+        page: int = Query(1, ge=1),
+        page_size: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        text: str = "",
+        source: str = "",
+        sort_by: str | None = None,
+        descending: bool = False,
+    ) -> dict:
+        run_id = finished_run(job_id)
+        try:
+            result = store.query(run_id, page, page_size, text, source, sort_by, descending)
+        except KeyError:
+            raise HTTPException(410, "Результаты удалены из хранилища") from None
+        except RuntimeError as exc:
+            raise HTTPException(400, str(exc)) from None
+        return {
+            "job_id": job_id,
+            "run_id": run_id,
+            "page": result.page,
+            "pages": result.pages,
+            "page_size": result.page_size,
+            "total": result.total,
+            "rows": json.loads(
+                result.rows.to_json(orient="records", date_format="iso", force_ascii=False)
+            ),
+        }
+
+    @app.get("/jobs/{job_id}/export/{fmt}")
+    def job_export(job_id: str, fmt: str) -> Response:
+        if fmt not in EXPORT_FORMATS:
+            raise HTTPException(404, f"Неизвестный формат: {fmt}. Доступно: {', '.join(EXPORT_FORMATS)}")
+        run_id = finished_run(job_id)
+        spec = EXPORT_FORMATS[fmt]
+        headers = {"Content-Disposition": f'attachment; filename="{spec.file_name}"'}
+        try:
+            if fmt not in STREAM_WRITERS:
+                return Response(spec.build(store.load(run_id)), media_type=spec.mime, headers=headers)
+            store.info(run_id)
+        except KeyError:
+            raise HTTPException(410, "Результаты удалены из хранилища") from None
+        return StreamingResponse(
+            stream_export(store.iter_chunks(run_id), fmt), media_type=spec.mime, headers=headers
+        )
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics() -> str:
+        return REGISTRY.to_prometheus()
+
+    @app.get("/health")
+    async def health() -> dict:
+        return {"status": "ok", "browser_contexts": CONTROLLER.snapshot(), "egress": get_pool().health()}
+
+    return app
+
+
+app = create_app()
@@ -1,17 +1,23 @@
 """Streamlit UI for the zakupki.gov.ru purchase search tool."""
 
 import datetime
+import os
+import time
+import uuid
 
 import pandas as pd
 import streamlit as st
 
-from core.ai_ranker import score_results
-from core.email_mailru import send_email
-from core.export_excel import to_csv_bytes, to_excel_bytes, to_json_bytes, to_txt_bytes
-from core.merge import merge_results
+from core.archive_index import ArchiveIndex
+from core.export_cache import EXPORT_FORMATS, ExportCache
+from core.export_excel import write_excel_stream
+from core.jobs import DEFAULT_DEADLINE_S, JobManager, SearchJob
+from core.mail_packaging import package_results
+from core.mail_queue import MailJob, MailQueue
+from core.metrics import start_http_server, summarize_spans
+from core.result_store import PAGE_SIZE, ResultStore
+from core.scheduler import ProfileStore, SearchProfile
 from core.settings import SearchSettings
-from core.sources.docsearch import search_docsearch
-from core.sources.orders_search import search_orders
 
 # ---------------------------------------------------------------------------
 # Page configuration
@@ -154,6 +160,26 @@ with st.sidebar:
         value=50,
         step=10,
     )
+    deadline_min = st.number_input(
+        "Ограничение времени поиска, мин",
+        min_value=1,
+        max_value=60,
+        value=int(DEFAULT_DEADLINE_S // 60),
+        help="По истечении времени поиск останавливается и показываются "
+        "уже найденные результаты.",
+    )
+    near_duplicates_label = st.selectbox(
+        "Похожие закупки",
+        options=["Не искать", "Отметить группы", "Оставить одну из группы"],
+        index=0,
+        help="Находит одну и ту же закупку с разными ссылками или номерами "
+        "по похожему названию, цене и дате (колонка dup_group).",
+    )
+    near_duplicates = {
+        "Не искать": "off",
+        "Отметить группы": "mark",
+        "Оставить одну из группы": "collapse",
+    }[near_duplicates_label]
 
     st.subheader("AI-ранжирование (опционально)")
     ai_ranking = st.checkbox("Включить AI-ранжирование", value=False)
@@ -185,9 +211,86 @@ with st.sidebar:
         disabled=not ai_ranking,
         help="Отсекает результаты с низкой релевантностью.",
     )
+    ai_top_k = st.number_input(
+        "Показать лучших",
+        min_value=0,
+        value=0,
+        step=10,
+        disabled=not ai_ranking,
+        help="Оставляет только N самых релевантных закупок; 0 — все.",
+    )
+
+    track_changes = st.checkbox(
+        "Только новые и изменённые",
+        value=False,
+        help="Сравнивает результаты с прошлым поиском по тому же запросу и региону: "
+        "закупки без изменений не показываются, не ранжируются и не попадают "
+        "в выгрузки и письма.",
+    )
+
+    documents = st.checkbox(
+        "Анализировать документы закупок",
+        value=False,
+        help="Скачивает вложения закупок из docSearch (ТЗ, проекты контрактов), "
+        "индексирует их текст и учитывает его при AI-ранжировании. "
+        "Уже скачанные документы повторно не загружаются.",
+    )
+
+    use_cache = st.checkbox(
+        "Использовать кэш результатов",
+        value=True,
+        help="Повторный поиск с теми же параметрами открывается из кэша без обращения к порталу. "
+        "Популярные и сохранённые поиски обновляются в кэше ночью. "
+        "Снимите флажок, чтобы получить свежие данные с портала.",
+    )
+    cache_max_age_h = st.number_input(
+        "Срок годности кэша, ч",
+        min_value=1,
+        max_value=168,
+        value=12,
+        disabled=not use_cache,
+    )
+
+    archive_enabled = st.checkbox(
+        "Сохранять результаты в архив",
+        value=False,
+        help="Добавляет найденные закупки в локальный семантический архив "
+        "для последующего поиска по смыслу.",
+    )
+
+    with st.expander("Режим сети (отладка)"):
+        network_mode = st.radio(
+            "Сеть",
+            options=["live", "record", "replay"],
+            format_func=lambda m: {
+                "live": "🌐 Обычный поиск",
+                "record": "⏺ Записать трафик в HAR",
+                "replay": "⏯ Воспроизвести из HAR (без сети)",
+            }[m],
+            index=0,
+            help="record сохраняет ответы портала в HAR-архивы, replay повторяет "
+            "поиск по ним без обращения к zakupki.gov.ru.",
+        )
+        har_path = st.text_input(
+            "Набор HAR-архивов",
+            value="",
+            placeholder="например, paper",
+            help="Подкаталог output/har; пустое поле — сам output/har.",
+            disabled=network_mode == "live",
+        )
+        profile_run = st.checkbox(
+            "Профилировать поиск",
+            value=False,
+            help="Сохраняет в output/profiles/ архив с трассой Chrome (этапы, стеки Python, "
+            "память Python и Chromium) и трассами Playwright для разбора медленных поисков.",
+        )
 
     st.subheader("Отправка по e-mail (опционально)")
-    email_recipient = st.text_input("Получатель (e-mail)", value="")
+    email_recipient = st.text_input(
+        "Получатели (e-mail)",
+        value="",
+        help="Несколько адресов можно перечислить через запятую.",
+    )
     email_mode = st.radio(
         "Режим отправки",
         options=["mailto", "smtp"],
@@ -209,6 +312,62 @@ with st.sidebar:
             help="Используйте пароль приложения. Данные не сохраняются.",
         )
 
+
+@st.cache_resource
+def get_archive(mode: str, allow_download: bool) -> ArchiveIndex:
+    """Share one archive index per encoder across sessions."""
+    return ArchiveIndex(mode=mode, allow_model_download=allow_download)
+
+
+@st.cache_resource
+def start_metrics_server() -> None:
+    """Expose /metrics and /metrics.json once per process when METRICS_PORT is set."""
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        start_http_server(int(port))
+
+
+start_metrics_server()
+
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """Share one pool of background search workers across sessions."""
+    return JobManager()
+
+
+@st.cache_resource
+def get_result_store() -> ResultStore:
+    """Share one on-disk results store across sessions."""
+    return ResultStore()
+
+
+@st.cache_resource
+def get_mail_queue() -> MailQueue:
+    """Share one background mail worker across sessions."""
+    return MailQueue()
+
+
+MAIL_STATUS_LABELS = {
+    "queued": "⏳ в очереди",
+    "sending": "📤 отправляется",
+    "done": "✅ отправлено",
+    "partial": "⚠️ отправлено частично",
+    "failed": "❌ не отправлено",
+}
+
+
+def show_mail_job(job: MailJob) -> None:
+    """Render the delivery status of one queued e-mail job."""
+    label = MAIL_STATUS_LABELS.get(job.status, job.status)
+    st.write(
+        f"Письмо для {', '.join(job.recipients)}: {label} "
+        f"({len(job.sent)} из {len(job.recipients)}, попыток: {job.attempts})"
+    )
+    for recipient, error in job.failed.items():
+        st.error(f"{recipient}: {error}")
+
+
 # ---------------------------------------------------------------------------
 # Main area — run search
 # ---------------------------------------------------------------------------
@@ -217,77 +376,304 @@ run_clicked = st.button("▶ Запустить поиск", type="primary", dis
 if not query:
     st.info("Введите поисковый запрос в боковой панели и нажмите «Запустить поиск».")
 
-if run_clicked and query:
-    settings = SearchSettings(
-        query=query,
-        region=region,
-        date_from=date_from,
-        date_to=date_to,
-        doc_search=doc_search,
-        extended_search=extended_search,
-        limit=int(limit),
-        ai_ranking=ai_ranking,
-        ai_threshold=float(ai_threshold),
-        ai_mode=ai_mode,
-        ai_allow_download=ai_allow_download,
-        email_recipient=email_recipient,
-        email_mode=email_mode,
-        smtp_login=smtp_login,
-        smtp_password=smtp_password,
-    )
+current_settings = SearchSettings(
+    query=query,
+    region=region,
+    date_from=date_from,
+    date_to=date_to,
+    doc_search=doc_search,
+    extended_search=extended_search,
+    limit=int(limit),
+    near_duplicates=near_duplicates,
+    ai_ranking=ai_ranking,
+    ai_threshold=float(ai_threshold),
+    ai_top_k=int(ai_top_k),
+    ai_mode=ai_mode,
+    ai_allow_download=ai_allow_download,
+    track_changes=track_changes,
+    documents=documents,
+    use_cache=use_cache,
+    cache_max_age_h=float(cache_max_age_h),
+    archive_enabled=archive_enabled,
+    network_mode=network_mode,
+    har_path=har_path,
+    profile=profile_run,
+    email_recipient=email_recipient,
+    email_mode=email_mode,
+    smtp_login=smtp_login,
+    smtp_password=smtp_password,
+)
 
-    results_dfs: list[pd.DataFrame] = []
-    search_errors: list[str] = []
-
-    with st.spinner("Выполняется поиск…"):
-        if settings.doc_search:
-            try:
-                df_doc = search_docsearch(settings)
-                results_dfs.append(df_doc)
-            except Exception as exc:
-                search_errors.append(f"docSearch: {exc}")
-
-        if settings.extended_search:
-            try:
-                df_orders = search_orders(settings)
-                results_dfs.append(df_orders)
-            except Exception as exc:
-                search_errors.append(f"extendedsearch: {exc}")
-
-    combined = merge_results(results_dfs)
-
-    if settings.ai_ranking and not combined.empty:
-        with st.spinner("AI-ранжирование…"):
-            combined = score_results(
-                combined,
-                query=settings.query,
-                threshold=settings.ai_threshold,
-                mode=settings.ai_mode,
-                model_name=settings.ai_model or None,
-                allow_model_download=settings.ai_allow_download,
-            )
+SEARCH_STAGE_LABELS = {
+    "queued": "в очереди",
+    "cache": "чтение из кэша",
+    "docSearch": "поиск в docSearch",
+    "extendedsearch": "поиск в extendedsearch",
+    "merge": "объединение результатов",
+    "changes": "сравнение с прошлым поиском",
+    "near_duplicates": "поиск похожих закупок",
+    "documents": "загрузка документов",
+    "ranking": "AI-ранжирование",
+    "done": "завершение",
+}
+SEARCH_STOP_NOTICES = {
+    "cancelled": "Поиск остановлен — показаны результаты, найденные до остановки.",
+    "timed_out": "Время поиска истекло — показаны результаты, найденные до остановки.",
+}
 
-    st.session_state["results"] = combined
+
+def store_search_results(job: SearchJob, settings: SearchSettings) -> None:
+    """Store the results of a finished search job and keep only its run id in the session."""
+    if job.outcome is None:
+        combined, search_errors, timings = pd.DataFrame(), [job.error], []
+    else:
+        combined = job.outcome.results
+        search_errors = list(job.outcome.errors)
+        timings = job.outcome.timings
+
+    if settings.archive_enabled and not combined.empty:
+        try:
+            get_archive(settings.ai_mode, settings.ai_allow_download).add(combined)
+        except Exception as exc:
+            search_errors.append(f"архив: {exc}")
+
+    st.session_state["run_id"] = get_result_store().save(combined, query=settings.query)
     st.session_state["settings"] = settings
     st.session_state["search_errors"] = search_errors
+    st.session_state["search_notice"] = SEARCH_STOP_NOTICES.get(job.status, "")
+    st.session_state["timings"] = timings
+    changes = job.outcome.changes if job.outcome is not None else None
+    st.session_state["change_counts"] = changes.counts() if changes is not None else None
+    st.session_state["profile_path"] = job.outcome.profile_path if job.outcome is not None else None
+    st.session_state["document_stats"] = job.outcome.documents if job.outcome is not None else None
+    st.session_state["cached_at"] = job.outcome.cached_at if job.outcome is not None else None
+
+
+@st.fragment(run_every=1.0)
+def show_search_job() -> None:
+    """Poll the running search job; rerun the whole page once it is finished."""
+    manager = get_job_manager()
+    try:
+        job = manager.status(st.session_state["search_job"])
+    except KeyError:
+        st.session_state.pop("search_job", None)
+        return
+    if job.finished:
+        store_search_results(job, st.session_state.pop("search_job_settings"))
+        manager.forget(job.job_id)
+        del st.session_state["search_job"]
+        st.rerun()
+    stage = SEARCH_STAGE_LABELS.get(job.progress.stage, job.progress.stage)
+    if job.progress.queue_position is not None:
+        st.info(
+            f"⏳ Ожидание свободного браузера ({stage}): вы {job.progress.queue_position}-й в очереди."
+        )
+    else:
+        st.info(
+            f"⏳ Выполняется поиск: {stage}. Страниц: {job.progress.pages}, "
+            f"записей: {job.progress.rows}, прошло {job.elapsed_s:.0f} с."
+        )
+    if st.button("⏹ Остановить поиск"):
+        manager.cancel(job.job_id)
+
+
+if run_clicked and query:
+    if "search_job" in st.session_state:
+        get_job_manager().cancel(st.session_state["search_job"])
+    # Each browser session counts as one user for the per-user browser limit
+    user_id = st.session_state.setdefault("user_id", uuid.uuid4().hex)
+    st.session_state["search_job"] = get_job_manager().submit(
+        current_settings, deadline_s=float(deadline_min) * 60, user=user_id
+    )
+    st.session_state["search_job_settings"] = current_settings
+
+if "search_job" in st.session_state:
+    show_search_job()
+
+# ---------------------------------------------------------------------------
+# Saved searches run by the scheduler (python -m core.scheduler)
+# ---------------------------------------------------------------------------
+with st.expander("🗓 Сохранённые поиски"):
+    profile_store = ProfileStore()
+    st.caption(
+        "Профили запускаются планировщиком (`python -m core.scheduler`); новые закупки "
+        "приходят одним письмом на каждого получателя. SMTP-пароль не сохраняется — "
+        "планировщик берёт SMTP_LOGIN / SMTP_PASSWORD из окружения или .env."
+    )
+    profile_name = st.text_input("Название профиля", value=query, key="profile_name")
+    profile_interval = st.number_input(
+        "Интервал запуска, ч", min_value=1.0, max_value=168.0, value=24.0, step=1.0
+    )
+    if st.button("💾 Сохранить текущий поиск", disabled=not (query and profile_name)):
+        # A range ending today is kept as "the last N days" of every run
+        profile_store.save(
+            SearchProfile.from_search(profile_name, current_settings, interval_hours=float(profile_interval))
+        )
+        st.success(f"Профиль «{profile_name}» сохранён.")
+    profiles = profile_store.profiles()
+    if profiles:
+        st.dataframe(
+            pd.DataFrame(
+                {
+                    "Профиль": [p.name for p in profiles],
+                    "Запрос": [p.settings.query for p in profiles],
+                    "Период": [
+                        f"последние {p.days_back} дн."
+                        if p.days_back is not None
+                        else f"{p.settings.date_from or '…'} — {p.settings.date_to or '…'}"
+                        for p in profiles
+                    ],
+                    "Получатели": [p.settings.email_recipient for p in profiles],
+                    "Интервал, ч": [p.interval_hours for p in profiles],
+                    "Последний запуск": [
+                        pd.to_datetime(p.last_run, unit="s") if p.last_run else pd.NaT
+                        for p in profiles
+                    ],
+                }
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+        profile_to_delete = st.selectbox("Удалить профиль", [p.name for p in profiles])
+        if st.button("🗑 Удалить профиль"):
+            profile_store.delete(profile_to_delete)
+            st.rerun()
+
+# ---------------------------------------------------------------------------
+# Semantic search in archive
+# ---------------------------------------------------------------------------
+with st.expander("🗂 Семантический поиск по архиву"):
+    archive_query = st.text_input("Запрос по архиву", value="", key="archive_query")
+    archive_top_k = st.number_input(
+        "Количество результатов",
+        min_value=1,
+        max_value=200,
+        value=20,
+        key="archive_top_k",
+    )
+    if archive_query:
+        # Built only on demand: with downloads allowed it may fetch the model
+        archive = get_archive(ai_mode, ai_allow_download)
+        st.caption(f"Закупок в архиве: {len(archive)} (энкодер: {archive.encoder})")
+        st.dataframe(
+            archive.search(archive_query, top_k=int(archive_top_k)),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "url": st.column_config.LinkColumn("Ссылка на закупку", display_text="Открыть")
+            },
+        )
 
 # ---------------------------------------------------------------------------
 # Display results
 # ---------------------------------------------------------------------------
-if "results" in st.session_state:
-    combined: pd.DataFrame = st.session_state["results"]
+result_info = None
+if "run_id" in st.session_state:
+    try:
+        result_info = get_result_store().info(st.session_state["run_id"])
+    except KeyError:
+        del st.session_state["run_id"]
+        st.warning("Результаты прошлого поиска удалены из хранилища — запустите поиск заново.")
+
+if result_info is not None:
+    result_store = get_result_store()
+    run_id: str = result_info.run_id
     settings: SearchSettings = st.session_state["settings"]
     search_errors: list[str] = st.session_state.get("search_errors", [])
 
+    if st.session_state.get("search_notice"):
+        st.warning(st.session_state["search_notice"])
     for err in search_errors:
         st.error(f"Ошибка источника: {err}")
 
-    if combined.empty:
+    timings = st.session_state.get("timings", [])
+    if timings:
+        with st.expander("⏱ Время выполнения по этапам"):
+            st.dataframe(
+                pd.DataFrame(summarize_spans(timings)),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "stage": "Этап",
+                    "calls": "Вызовов",
+                    "total_s": st.column_config.NumberColumn("Всего, с", format="%.3f"),
+                    "max_s": st.column_config.NumberColumn("Макс., с", format="%.3f"),
+                    "errors": "Ошибок",
+                },
+            )
+
+    profile_path = st.session_state.get("profile_path")
+    if profile_path is not None and profile_path.exists():
+        st.download_button(
+            label="⬇ Скачать профиль поиска",
+            data=profile_path.read_bytes(),
+            file_name=profile_path.name,
+            mime="application/zip",
+            help="trace.json открывается в ui.perfetto.dev или chrome://tracing, "
+            "трассы Playwright — на trace.playwright.dev.",
+        )
+
+    change_counts = st.session_state.get("change_counts")
+    if change_counts:
+        st.info(
+            f"Новых закупок: {change_counts['new']}, изменённых: {change_counts['changed']}, "
+            f"без изменений (скрыты): {change_counts['unchanged']}"
+        )
+
+    cached_at = st.session_state.get("cached_at")
+    if cached_at is not None:
+        age_min = max(0, int((time.time() - cached_at) // 60))
+        st.info(
+            f"Результаты из кэша: данные портала от "
+            f"{datetime.datetime.fromtimestamp(cached_at):%d.%m.%Y %H:%M} "
+            f"({age_min // 60} ч {age_min % 60} мин назад). "
+            "Для свежих данных снимите флажок «Использовать кэш результатов»."
+        )
+
+    document_stats = st.session_state.get("document_stats")
+    if document_stats is not None:
+        st.info(
+            f"Документы: скачано {document_stats.downloaded} "
+            f"({document_stats.bytes / 2**20:.1f} МБ), уже в индексе {document_stats.already_indexed}, "
+            f"дубликатов {document_stats.duplicates}"
+            + (" — лимит загрузки исчерпан" if document_stats.budget_exhausted else "")
+        )
+
+    if result_info.rows == 0:
         st.warning("Результаты не найдены.")
     else:
-        st.success(f"Найдено записей: {len(combined)}")
+        st.success(f"Найдено записей: {result_info.rows}")
+        # Only the displayed page is read from the store, with filter and sort pushed down
+        filter_col, source_col, sort_col, order_col, size_col, page_col = st.columns([3, 2, 2, 1, 1, 1])
+        with filter_col:
+            table_filter = st.text_input("Фильтр по названию или номеру", value="", key="table_filter")
+        with source_col:
+            table_source = st.selectbox("Источник", ["", *result_info.sources], format_func=lambda s: s or "Все")
+        with sort_col:
+            table_sort = st.selectbox(
+                "Сортировка", ["", *result_info.columns], format_func=lambda c: c or "Как найдено"
+            )
+        with order_col:
+            table_desc = st.checkbox("По убыванию", value=False)
+        with size_col:
+            table_page_size = st.selectbox("Строк", [50, PAGE_SIZE, 500], index=1)
+        with page_col:
+            table_page = st.number_input("Страница", min_value=1, value=1, step=1)
+        result_page = result_store.query(
+            run_id,
+            page=int(table_page),
+            page_size=int(table_page_size),
+            text=table_filter,
+            source=table_source,
+            sort_by=table_sort or None,
+            descending=table_desc,
+        )
+        st.caption(
+            f"Страница {result_page.page} из {result_page.pages}, "
+            f"записей по фильтру: {result_page.total}"
+        )
         st.data_editor(
-            combined,
+            result_page.rows,
             use_container_width=True,
             hide_index=True,
             disabled=True,
@@ -296,42 +682,38 @@ if "results" in st.session_state:
                     "Ссылка на закупку",
                     display_text="Открыть",
                     help="Нажмите, чтобы открыть закупку на zakupki.gov.ru",
-                )
+                ),
+                "publish_date": st.column_config.DateColumn(
+                    "Дата публикации", format="DD.MM.YYYY"
+                ),
+                "price": st.column_config.NumberColumn("Цена, руб.", format="%.2f"),
             },
         )
 
         # ----------------------------------------------------------------
         # File download
         # ----------------------------------------------------------------
-        xlsx_bytes = to_excel_bytes(combined)
-        csv_bytes = to_csv_bytes(combined)
-        txt_bytes = to_txt_bytes(combined)
-        json_bytes = to_json_bytes(combined)
+        # Each format is built only when requested and memoised per results
+        # Runs are immutable, so the run id doubles as the cache fingerprint
+        export_cache: ExportCache = st.session_state.setdefault("export_cache", ExportCache())
+        for column, (fmt, spec) in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS.items()):
+            with column:
+                data = export_cache.peek(run_id, fmt)
+                if data is None and st.button(f"Подготовить {spec.label}", key=f"prepare_{fmt}"):
+                    with st.spinner(f"Формирование {spec.label}…"):
+                        data = export_cache.get(result_store.load(run_id), fmt, fingerprint=run_id)
+                if data is not None:
+                    st.download_button(
+                        label=f"⬇ Скачать {spec.label}",
+                        data=data,
+                        file_name=spec.file_name,
+                        mime=spec.mime,
+                        key=f"download_{fmt}",
+                    )
 
-        st.download_button(
-            label="⬇ Скачать Excel",
-            data=xlsx_bytes,
-            file_name="results.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        st.download_button(
-            label="⬇ Скачать CSV",
-            data=csv_bytes,
-            file_name="results.csv",
-            mime="text/csv",
-        )
-        st.download_button(
-            label="⬇ Скачать TXT",
-            data=txt_bytes,
-            file_name="results.txt",
-            mime="text/plain",
-        )
-        st.download_button(
-            label="⬇ Скачать JSON",
-            data=json_bytes,
-            file_name="results.json",
-            mime="application/json",
-        )
+        if st.button("💾 Сохранить Excel в папку output/"):
+            saved_path = write_excel_stream(result_store.load(run_id))
+            st.success(f"Файл сохранён: {saved_path}")
 
         # ----------------------------------------------------------------
         # E-mail sending
@@ -346,7 +728,7 @@ if "results" in st.session_state:
                 body = urllib.parse.quote(
                     f"Поисковый запрос: {settings.query}\n"
                     f"Регион: {settings.region}\n"
-                    f"Записей: {len(combined)}\n\n"
+                    f"Записей: {result_info.rows}\n\n"
                     "Файл results.xlsx прикреплён вручную."
                 )
                 mailto_url = (
@@ -359,7 +741,7 @@ if "results" in st.session_state:
                     unsafe_allow_html=True,
                 )
                 st.caption(
-                    "Скачайте Excel-файл выше и прикрепите его к письму вручную. "
+                    "Подготовьте и скачайте Excel-файл выше и прикрепите его к письму вручную. "
                     "Автоматическое прикрепление через mailto: не поддерживается браузерами."
                 )
             else:
@@ -369,22 +751,47 @@ if "results" in st.session_state:
                 if email_fields_filled:
                     if st.button("📧 Отправить по e-mail (SMTP)"):
                         try:
-                            send_email(
-                                recipient=settings.email_recipient,
+                            with st.spinner("Подготовка вложения…"):
+                                combined = result_store.load(run_id)
+                                plan = package_results(
+                                    combined,
+                                    xlsx_bytes=export_cache.get(
+                                        combined, "xlsx", fingerprint=run_id
+                                    ),
+                                )
+                            body = (
+                                f"Поисковый запрос: {settings.query}\n"
+                                f"Регион: {settings.region}\n"
+                                f"Записей: {result_info.rows}\n"
+                            )
+                            if plan.note:
+                                body += f"\n{plan.note}\n"
+                            job_id = get_mail_queue().submit(
+                                recipients=settings.email_recipient,
                                 subject=f"Результаты поиска закупок: {settings.query}",
-                                body=(
-                                    f"Поисковый запрос: {settings.query}\n"
-                                    f"Регион: {settings.region}\n"
-                                    f"Записей: {len(combined)}\n"
-                                ),
-                                attachment_bytes=xlsx_bytes,
-                                attachment_filename="results.xlsx",
+                                body=body,
+                                attachments=plan.attachments,
+                                one_per_message=plan.one_per_message,
                                 smtp_login=settings.smtp_login,
                                 smtp_password=settings.smtp_password,
                             )
-                            st.success("Письмо успешно отправлено!")
+                            st.session_state.setdefault("mail_jobs", []).append(job_id)
+                            st.info("Письмо поставлено в очередь на отправку.")
+                            if plan.note:
+                                st.caption(plan.note)
+                            if plan.saved_path is not None:
+                                st.caption(f"Полная выгрузка сохранена: {plan.saved_path}")
                         except Exception as exc:
                             st.error(f"Ошибка отправки: {exc}")
+                    mail_jobs: list[str] = st.session_state.get("mail_jobs", [])
+                    if mail_jobs:
+                        mail_queue = get_mail_queue()
+                        for job_id in mail_jobs:
+                            try:
+                                show_mail_job(mail_queue.status(job_id))
+                            except KeyError:
+                                continue  # Finished long ago and pruned from the queue
+                        st.button("🔄 Обновить статус отправки")
                 else:
                     st.caption(
                         "Заполните SMTP логин и пароль в боковой панели для отправки."
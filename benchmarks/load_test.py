@@ -0,0 +1,398 @@
+"""Concurrent-session load test of the search service.
+
+Simulates N users of the Streamlit app at once. Each session repeats the
+app's flow on the same shared objects the app uses — a search job on one
+:class:`core.jobs.JobManager` (admission control included), a page of the
+results from the :class:`core.result_store.ResultStore`, a re-rank of the
+results with another query and an Excel export — with a think time between
+flows. The portal is replaced by :mod:`benchmarks.portal_stub`.
+
+The concurrency levels run one after another; for every level the report
+gives latency percentiles per step, flows per minute, error rates by kind
+(timed-out, failed and partially failed searches) and peak memory of the
+Python process, of its child processes (Chromium) and of the container
+(cgroup), which is what deployments are sized by.
+
+``--no-browser`` replaces the Playwright sources with an in-process page
+generator that keeps the stub latency and the admission control, so the
+rest of the stack can be measured where Chromium is not available.
+
+Usage::
+
+    python -m benchmarks.load_test --concurrency 1,2,4,8 --iterations 3 --latency-ms 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+import core.jobs
+from benchmarks.portal_stub import PortalStub, StubConfig
+from benchmarks.run import RESULTS_DIR, synthetic_results
+from core.admission import admit
+from core.ai_ranker import score_results
+from core.export_cache import EXPORT_FORMATS
+from core.jobs import DEFAULT_DEADLINE_S, DEFAULT_WORKERS, JobManager
+from core.merge import StreamingMerger
+from core.pipeline import SearchOutcome, SearchProgress
+from core.profiling import memory_usage
+from core.result_store import ResultStore
+from core.settings import SearchSettings
+
+DEFAULT_LEVELS = (1, 2, 4, 8)
+QUERIES = ("поставка бумаги", "ремонт зданий", "медицинские изделия", "продукты питания")
+RERANK_QUERIES = ("офисная техника", "поставка материалов")
+STEPS = ("search", "page", "rerank", "export", "flow")
+MEMORY_INTERVAL_S = 0.5
+_CGROUP_MEMORY = ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory/memory.usage_in_bytes")
+
+
+def container_memory() -> int | None:
+    """Return the memory charged to the container's cgroup, or ``None`` outside one."""
+    for path in _CGROUP_MEMORY:
+        try:
+            return int(Path(path).read_text().strip())
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "count": len(values),
+        "p50": round(float(p50), 4),
+        "p90": round(float(p90), 4),
+        "p99": round(float(p99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+class _MemorySampler:
+    """Peak memory of this process, its children and the container while running."""
+
+    def __init__(self) -> None:
+        self.peaks = {"python_mb": 0.0, "browser_mb": 0.0, "container_mb": None}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _sample(self) -> None:
+        python, children = memory_usage()
+        container = container_memory()
+        self.peaks["python_mb"] = max(self.peaks["python_mb"], round((python or 0) / 2**20, 1))
+        self.peaks["browser_mb"] = max(self.peaks["browser_mb"], round(children / 2**20, 1))
+        if container is not None:
+            self.peaks["container_mb"] = max(self.peaks["container_mb"] or 0.0, round(container / 2**20, 1))
+
+    def _run(self) -> None:
+        while not self._stop.wait(MEMORY_INTERVAL_S):
+            self._sample()
+
+    def __enter__(self) -> "_MemorySampler":
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def synthetic_search(config: StubConfig):
+    """Return a ``run_search`` stand-in that serves stub-like pages without a browser.
+
+    Every enabled source holds an admission slot while it "scrapes"
+    ``config.pages`` pages, waiting ``config.latency_s`` per page.
+    """
+
+    def run_search(
+        settings: SearchSettings,
+        stop: threading.Event | None = None,
+        progress: SearchProgress | None = None,
+    ) -> SearchOutcome:
+        progress = progress if progress is not None else SearchProgress()
+        merger = StreamingMerger()
+        sources = [
+            name
+            for name, enabled in (("docSearch", settings.doc_search), ("extendedsearch", settings.extended_search))
+            if enabled
+        ]
+        for offset, source in enumerate(sources):
+            progress.stage = source
+            with admit(stop):
+                for page in range(config.pages):
+                    if stop is not None and stop.is_set():
+                        break
+                    time.sleep(config.latency_s)
+                    start = (page + offset * config.pages // 2) * config.cards_per_page
+                    batch = synthetic_results(config.cards_per_page, seed=page, source=source, start=start)
+                    progress.pages += 1
+                    progress.rows += len(batch)
+                    merger.add(batch)
+        progress.stage = "done"
+        return SearchOutcome(results=merger.result())
+
+    return run_search
+
+
+@contextmanager
+def _portal(config: StubConfig, browser: bool) -> Iterator[None]:
+    """Point the job workers at the portal stand-in for the duration of the block."""
+    original_search = core.jobs.run_search
+    if not browser:
+        core.jobs.run_search = synthetic_search(config)
+        try:
+            yield
+        finally:
+            core.jobs.run_search = original_search
+        return
+
+    from core.sources import docsearch, orders_search
+
+    with PortalStub(config) as stub:
+        originals = {module: module.BASE_URL for module in (docsearch, orders_search)}
+        for module in originals:
+            module.BASE_URL = stub.url(module.SOURCE)
+        try:
+            yield
+        finally:
+            for module, url in originals.items():
+                module.BASE_URL = url
+
+
+def _session(
+    index: int,
+    manager: JobManager,
+    store: ResultStore,
+    iterations: int,
+    limit: int,
+    think_s: float,
+    latencies: dict[str, list[float]],
+    errors: dict[str, int],
+    lock: threading.Lock,
+) -> None:
+    """Run one simulated user: search, page, re-rank and export, *iterations* times."""
+
+    def record(step: str, seconds: float) -> None:
+        with lock:
+            latencies[step].append(seconds)
+
+    def fail(kind: str) -> None:
+        with lock:
+            errors[kind] = errors.get(kind, 0) + 1
+
+    for iteration in range(iterations):
+        query = QUERIES[(index + iteration) % len(QUERIES)]
+        flow_started = time.perf_counter()
+        try:
+            started = time.perf_counter()
+            job_id = manager.submit(SearchSettings(query=query, limit=limit), user=f"session-{index}")
+            job = manager.wait(job_id)
+            manager.forget(job_id)
+            record("search", time.perf_counter() - started)
+            if job.status != "done":
+                fail(job.status)
+                continue
+            if job.outcome is not None and job.outcome.errors:
+                fail("source_error")
+
+            started = time.perf_counter()
+            store.query(job.run_id, page=1, sort_by="price", descending=True)
+            record("page", time.perf_counter() - started)
+
+            results = store.load(job.run_id)
+            started = time.perf_counter()
+            score_results(results, RERANK_QUERIES[iteration % len(RERANK_QUERIES)])
+            record("rerank", time.perf_counter() - started)
+
+            started = time.perf_counter()
+            EXPORT_FORMATS["xlsx"].build(results)
+            record("export", time.perf_counter() - started)
+            record("flow", time.perf_counter() - flow_started)
+        except Exception as exc:
+            fail(type(exc).__name__)
+        if think_s > 0:
+            time.sleep(think_s)
+
+
+def run_level(
+    concurrency: int,
+    iterations: int = 2,
+    workers: int = DEFAULT_WORKERS,
+    deadline_s: float = DEFAULT_DEADLINE_S,
+    limit: int = 100,
+    think_s: float = 0.0,
+) -> dict:
+    """Run *concurrency* sessions at once and return the level's report."""
+    latencies: dict[str, list[float]] = {step: [] for step in STEPS}
+    errors: dict[str, int] = {}
+    lock = threading.Lock()
+    with tempfile.TemporaryDirectory(prefix="load_") as tmp:
+        store = ResultStore(Path(tmp), max_runs=concurrency * iterations + 1)
+        manager = JobManager(
+            workers=workers, deadline_s=deadline_s, max_finished=concurrency * 2, result_store=store
+        )
+        sessions = [
+            threading.Thread(
+                target=_session,
+                args=(index, manager, store, iterations, limit, think_s, latencies, errors, lock),
+                name=f"session-{index}",
+            )
+            for index in range(concurrency)
+        ]
+        started = time.perf_counter()
+        with _MemorySampler() as memory:
+            for session in sessions:
+                session.start()
+            for session in sessions:
+                session.join()
+        wall_s = time.perf_counter() - started
+        manager.close()
+
+    flows = concurrency * iterations
+    failed = sum(errors.values())
+    report = {
+        "concurrency": concurrency,
+        "flows": flows,
+        "completed": len(latencies["flow"]),
+        "wall_s": round(wall_s, 3),
+        "flows_per_min": round(len(latencies["flow"]) / wall_s * 60, 2) if wall_s else None,
+        "error_rate": round(failed / flows, 4) if flows else 0.0,
+        "errors": errors,
+        "latency_s": {step: percentiles(values) for step, values in latencies.items()},
+        "memory_peak": memory.peaks,
+    }
+    search = report["latency_s"]["search"]
+    print(
+        f"{concurrency:>4} sessions  {report['flows_per_min']:>8} flows/min  "
+        f"search p50 {search.get('p50', '-')} s  p90 {search.get('p90', '-')} s  "
+        f"errors {report['error_rate']:.1%}  python {memory.peaks['python_mb']} MB  "
+        f"browser {memory.peaks['browser_mb']} MB  container {memory.peaks['container_mb']} MB",
+        flush=True,
+    )
+    return report
+
+
+def max_sustainable(levels: list[dict], max_error_rate: float, slo_s: float | None) -> int | None:
+    """Highest concurrency whose error rate (and search p90, with *slo_s*) stayed within limits."""
+    best = None
+    for level in levels:
+        p90 = level["latency_s"]["search"].get("p90")
+        if level["error_rate"] > max_error_rate or (slo_s is not None and (p90 is None or p90 > slo_s)):
+            break
+        best = level["concurrency"]
+    return best
+
+
+def run(
+    levels: tuple[int, ...] = DEFAULT_LEVELS,
+    iterations: int = 2,
+    pages: int = 3,
+    cards_per_page: int = 20,
+    latency_s: float = 0.1,
+    workers: int = DEFAULT_WORKERS,
+    deadline_s: float = DEFAULT_DEADLINE_S,
+    think_s: float = 0.0,
+    browser: bool = True,
+    max_error_rate: float = 0.05,
+    slo_s: float | None = None,
+) -> dict:
+    """Run every concurrency level against the stand-in portal and return the report.
+
+    Levels stop growing once the error rate exceeds *max_error_rate*.
+    """
+    config = StubConfig(pages=pages, cards_per_page=cards_per_page, latency_s=latency_s)
+    results = []
+    with _portal(config, browser):
+        for concurrency in levels:
+            results.append(
+                run_level(
+                    concurrency,
+                    iterations=iterations,
+                    workers=workers,
+                    deadline_s=deadline_s,
+                    limit=pages * cards_per_page,
+                    think_s=think_s,
+                )
+            )
+            if results[-1]["error_rate"] > max_error_rate:
+                break
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "browser": browser,
+            "workers": workers,
+            "max_browser_contexts": os.environ.get("MAX_BROWSER_CONTEXTS"),
+        },
+        "portal": {"pages": pages, "cards_per_page": cards_per_page, "latency_s": latency_s},
+        "levels": results,
+        "max_sustainable_concurrency": max_sustainable(results, max_error_rate, slo_s),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent-session load test")
+    parser.add_argument(
+        "--concurrency",
+        default=",".join(map(str, DEFAULT_LEVELS)),
+        help="Comma-separated numbers of simultaneous sessions (default: %(default)s)",
+    )
+    parser.add_argument("--iterations", type=int, default=2, help="Flows per session")
+    parser.add_argument("--pages", type=int, default=3, help="Result pages served per source")
+    parser.add_argument("--cards-per-page", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Stub response latency")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Search worker threads")
+    parser.add_argument("--deadline-s", type=float, default=DEFAULT_DEADLINE_S, help="Search time limit")
+    parser.add_argument("--think-s", type=float, default=0.0, help="Pause between flows of a session")
+    parser.add_argument("--no-browser", action="store_true", help="Generate pages in-process, without Chromium")
+    parser.add_argument("--max-error-rate", type=float, default=0.05)
+    parser.add_argument("--slo-s", type=float, help="Target p90 search latency for the sizing verdict")
+    parser.add_argument("--output", type=Path, help="JSON report path (default: benchmarks/results/)")
+    args = parser.parse_args(argv)
+
+    report = run(
+        levels=tuple(int(level) for level in args.concurrency.split(",") if level),
+        iterations=args.iterations,
+        pages=args.pages,
+        cards_per_page=args.cards_per_page,
+        latency_s=args.latency_ms / 1000,
+        workers=args.workers,
+        deadline_s=args.deadline_s,
+        think_s=args.think_s,
+        browser=not args.no_browser,
+        max_error_rate=args.max_error_rate,
+        slo_s=args.slo_s,
+    )
+
+    output = args.output
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = RESULTS_DIR / f"load_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Max sustainable concurrency: {report['max_sustainable_concurrency']}")
+    print(f"Report written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,251 @@
+"""Local stand-in for the zakupki.gov.ru result pages.
+
+Serves the docSearch and extendedsearch result pages from the HTML fixtures
+in ``benchmarks/fixtures`` with a configurable number of pages, cards per
+page and response latency, so the real Playwright sources can be driven
+offline and reproducibly. Half of the extendedsearch purchases repeat
+docSearch ones, which gives the merge step real duplicates to resolve.
+
+Every purchase also has a documents page (``.../view/documents.html``) with
+DOCX attachments: a technical specification naming the purchase, and a
+contract template that has its own URL per purchase but is byte-identical
+for all of them, so document download can be tested for deduplication.
+
+Run standalone with ``python -m benchmarks.portal_stub --port 8765``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import html
+import io
+import random
+import threading
+import time
+import zipfile
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+SOURCE_PATHS = {
+    "docSearch": "/epz/order/docSearch/results.html",
+    "extendedsearch": "/epz/order/extendedsearch/results.html",
+}
+DOCUMENTS_PATH = "/epz/order/notice/ea20/view/documents.html"
+FILE_PATH = "/44fz/filestore/public/1.0/download/priz/file.html"
+CONTRACT_TEMPLATE = "Проект государственного контракта. Стороны обязуются исполнить условия поставки."
+_WORDS = (
+    "поставка", "оказание", "услуг", "выполнение", "работ", "ремонт", "медицинских",
+    "изделий", "продуктов", "питания", "бумаги", "офисной", "техники", "лекарственных",
+    "препаратов", "строительных", "материалов", "обслуживанию", "зданий", "автомобилей",
+)
+
+
+@dataclass
+class StubConfig:
+    """Shape of the served result set."""
+
+    pages: int = 5
+    cards_per_page: int = 10
+    latency_s: float = 0.0
+    region: str = "г Москва"
+    seed: int = 0
+    documents: bool = True  # serve documents pages and attachments
+
+
+def _card_fields(index: int, seed: int) -> dict[str, str]:
+    """Deterministic purchase data for the card at global *index*."""
+    rng = random.Random(f"{seed}:{index}")
+    title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 9))).capitalize()
+    price = f"{rng.randint(10_000, 50_000_000):,}".replace(",", " ") + f",{rng.randint(0, 99):02d}"
+    date = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 365))
+    return {
+        "number": f"{10**18 + index:019d}",
+        "title": html.escape(title),
+        "price": price,
+        "date": date.strftime("%d.%m.%Y"),
+    }
+
+
+def docx_bytes(text: str) -> bytes:
+    """Minimal DOCX file whose body is *text*, one paragraph per line."""
+    paragraphs = "".join(
+        f"<w:p><w:r><w:t>{html.escape(line)}</w:t></w:r></w:p>" for line in text.splitlines()
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{paragraphs}</w:body></w:document>"
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as docx:
+        docx.writestr("[Content_Types].xml", '<?xml version="1.0" encoding="UTF-8"?><Types/>')
+        docx.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+class PortalStub:
+    """HTTP server rendering fixture result pages, usable as a context manager.
+
+    Args:
+        config: Pages, cards and latency to serve.
+        host: Interface to bind.
+        port: Port to bind (``0`` picks a free one).
+    """
+
+    def __init__(self, config: StubConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or StubConfig()
+        self.requests = 0
+        self.file_requests = 0
+        self._page_template = Template((FIXTURES_DIR / "results_page.html").read_text(encoding="utf-8"))
+        self._card_template = Template((FIXTURES_DIR / "card.html").read_text(encoding="utf-8"))
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, source: str) -> str:
+        """Return the results page URL that replaces the source's ``BASE_URL``."""
+        return self.base_url + SOURCE_PATHS[source]
+
+    def start(self) -> "PortalStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "PortalStub":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def documents_url(self, number: str) -> str:
+        return f"{self.base_url}{DOCUMENTS_PATH}?regNumber={number}"
+
+    def render_documents(self, number: str) -> str:
+        """Documents page of a purchase with links to its attachments."""
+        attachments = ((f"{number}-spec", "Техническое задание.docx"), (f"{number}-contract", "Проект контракта.docx"))
+        links = "".join(
+            f'<a class="attachment" href="{FILE_PATH}?uid={uid}" title="{name}">{name}</a>\n'
+            for uid, name in attachments
+        )
+        return f"<html><body><div class='attachments'>{links}</div></body></html>"
+
+    def attachment(self, uid: str) -> bytes | None:
+        """DOCX served for *uid*: a purchase specification or the shared contract template."""
+        number, _, kind = uid.partition("-")
+        if not number.isdigit() or kind not in ("spec", "contract"):
+            return None
+        if kind == "contract":
+            return docx_bytes(CONTRACT_TEMPLATE)
+        fields = _card_fields(int(number) - 10**18, self.config.seed)
+        return docx_bytes(
+            f"Техническое задание на закупку № {number}\n{html.unescape(fields['title'])}\n"
+            f"Требования к качеству: поставка оригинальной продукции с гарантией производителя."
+        )
+
+    def render(self, source: str, query: str, page: int | None) -> str:
+        """Render one results page; ``page=None`` is the landing page without results."""
+        config = self.config
+        cards = ""
+        next_link = ""
+        if page is not None and 1 <= page <= config.pages:
+            # extendedsearch is shifted by half the result set, so half of it overlaps docSearch
+            offset = 0 if source == "docSearch" else config.pages * config.cards_per_page // 2
+            first = offset + (page - 1) * config.cards_per_page
+            cards = "".join(
+                self._card_template.substitute(_card_fields(index, config.seed))
+                for index in range(first, first + config.cards_per_page)
+            )
+            if page < config.pages:
+                href = "?" + urlencode({"searchString": query, "pageNumber": page + 1})
+                next_link = f'    <a class="paginator-button next" href="{html.escape(href)}">Следующая</a>'
+        return self._page_template.substitute(
+            source=source,
+            region=html.escape(config.region),
+            path=SOURCE_PATHS[source],
+            query=html.escape(query),
+            cards=cards,
+            next_link=next_link,
+        )
+
+    def _handler_class(self):
+        stub = self
+        sources = {path: source for source, path in SOURCE_PATHS.items()}
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body: bytes, content_type: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                parts = urlsplit(self.path)
+                params = parse_qs(parts.query)
+                source = sources.get(parts.path)
+                documents = stub.config.documents and parts.path in (DOCUMENTS_PATH, FILE_PATH)
+                if source is None and not documents:
+                    self.send_error(404)
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                    stub.file_requests += int(parts.path == FILE_PATH)
+                if stub.config.latency_s:
+                    time.sleep(stub.config.latency_s)
+                if parts.path == DOCUMENTS_PATH:
+                    number = params.get("regNumber", [""])[0]
+                    self._send(stub.render_documents(number).encode("utf-8"), "text/html; charset=utf-8")
+                    return
+                if parts.path == FILE_PATH:
+                    data = stub.attachment(params.get("uid", [""])[0])
+                    if data is None:
+                        self.send_error(404)
+                        return
+                    self._send(data, "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+                    return
+                query = params.get("searchString", [""])[0]
+                page = int(params.get("pageNumber", ["1"])[0]) if "searchString" in params else None
+                self._send(stub.render(source, query, page).encode("utf-8"), "text/html; charset=utf-8")
+
+            def log_message(self, format, *args) -> None:  # noqa: A002 - silence access logs
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--cards-per-page", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(args.pages, args.cards_per_page, args.latency_ms / 1000)
+    stub = PortalStub(config, host=args.host, port=args.port).start()
+    for source in SOURCE_PATHS:
+        print(f"{source}: {stub.url(source)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Local forward-proxy stand-in for testing the egress pool.
+
+Forwards plain-HTTP requests in absolute form (``GET http://host/path``), as
+browsers send them to an HTTP proxy, with an optional added latency. It can
+also answer a share of requests itself with an error status instead of
+forwarding, which imitates a throttled or broken exit node. HTTPS
+(``CONNECT``) is not supported; point it at :mod:`benchmarks.portal_stub`.
+
+Run standalone with ``python -m benchmarks.proxy_stub --port 8899``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_HOP_HEADERS = {"connection", "proxy-connection", "keep-alive", "transfer-encoding", "proxy-authorization"}
+
+
+class ProxyStub:
+    """Forwarding HTTP proxy, usable as a context manager.
+
+    Args:
+        latency_s: Delay added before each request is forwarded.
+        fail_status: Status answered instead of forwarding (``None`` never fails).
+        fail_every: Fail every n-th request (1 fails all of them).
+        host: Interface to bind.
+        port: Port to bind (``0`` picks a free one).
+    """
+
+    def __init__(
+        self,
+        latency_s: float = 0.0,
+        fail_status: int | None = None,
+        fail_every: int = 1,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.latency_s = latency_s
+        self.fail_status = fail_status
+        self.fail_every = max(1, fail_every)
+        self.requests = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ProxyStub":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "ProxyStub":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _forward(self) -> None:
+                with stub._lock:
+                    stub.requests += 1
+                    failing = stub.fail_status is not None and stub.requests % stub.fail_every == 0
+                    stub.failed += int(failing)
+                if stub.latency_s:
+                    time.sleep(stub.latency_s)
+                if failing:
+                    self.send_error(stub.fail_status)
+                    return
+                if not self.path.startswith("http://"):
+                    self.send_error(400, "absolute http:// URL expected")
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else None
+                headers = {
+                    name: value for name, value in self.headers.items() if name.lower() not in _HOP_HEADERS
+                }
+                request = urllib.request.Request(self.path, data=body, headers=headers, method=self.command)
+                opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+                try:
+                    response = opener.open(request, timeout=30)
+                except urllib.error.HTTPError as exc:
+                    response = exc
+                except OSError as exc:
+                    self.send_error(502, str(exc))
+                    return
+                with response:
+                    payload = response.read()
+                    self.send_response(response.status)
+                    for name, value in response.headers.items():
+                        if name.lower() not in _HOP_HEADERS | {"content-length"}:
+                            self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+
+            do_GET = do_POST = do_HEAD = _forward
+
+            def log_message(self, format, *args) -> None:  # noqa: A002 - silence access logs
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, help="Answer this status instead of forwarding")
+    parser.add_argument("--fail-every", type=int, default=1, help="Fail every n-th request")
+    args = parser.parse_args()
+
+    stub = ProxyStub(args.latency_ms / 1000, args.fail_status, args.fail_every, args.host, args.port).start()
+    print(f"proxy: {stub.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
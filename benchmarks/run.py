@@ -0,0 +1,259 @@
+"""Offline performance benchmarks.
+
+Measures, at several result-set sizes:
+
+* ``merge`` — :func:`core.merge.merge_results` over two half-overlapping sources;
+* ``score`` — :func:`core.ai_ranker.score_results` (token fallback unless
+  ``--model`` allows loading the embedding model);
+* ``export.<format>`` — every format of :data:`core.export_cache.EXPORT_FORMATS`;
+
+and drives the real Playwright sources against :mod:`benchmarks.portal_stub`
+to get pages per second and extraction cost per card (``scrape.*``).
+
+Results are written to a JSON file; ``--baseline`` compares them with an
+earlier file and lists the measurements that got slower.
+
+Usage::
+
+    python -m benchmarks.run --sizes 1000,10000 --latency-ms 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.portal_stub import PortalStub, StubConfig
+from core.ai_ranker import score_results
+from core.export_cache import EXPORT_FORMATS
+from core.merge import merge_results
+from core.metrics import collect_spans
+from core.schema import to_schema
+from core.settings import SearchSettings
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+SUITES = ("merge", "score", "export", "scrape")
+RESULTS_DIR = Path(__file__).parent / "results"
+REGRESSION_RATIO = 1.2
+_WORDS = np.array(
+    [
+        "поставка", "оказание", "услуг", "ремонт", "медицинских", "изделий", "продуктов",
+        "питания", "бумаги", "офисной", "техники", "препаратов", "материалов", "зданий",
+    ]
+)
+
+
+def synthetic_results(rows: int, seed: int = 0, source: str = "docSearch", start: int = 0) -> pd.DataFrame:
+    """Return *rows* schema-typed result rows with purchase numbers from *start*."""
+    rng = np.random.default_rng(seed)
+    numbers = np.char.zfill((10**18 + start + np.arange(rows)).astype(str), 19)
+    words = _WORDS[rng.integers(0, len(_WORDS), size=(rows, 6))]
+    titles = [" ".join(row) for row in words]
+    return to_schema(
+        pd.DataFrame(
+            {
+                "purchase_number": numbers,
+                "title": titles,
+                "url": np.char.add("https://zakupki.gov.ru/epz/order/notice/view/", numbers),
+                "price": rng.uniform(1e4, 5e7, rows).round(2),
+                "publish_date": pd.Timestamp("2024-01-01")
+                + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+                "source": source,
+            }
+        )
+    )
+
+
+def _measure(name: str, rows: int, func: Callable[[], object], repeat: int = 1, **extra) -> dict:
+    """Run *func* *repeat* times and report the best wall-clock time."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    result = {"name": name, "rows": rows, "seconds": round(best, 6)}
+    if rows:
+        result["rows_per_s"] = round(rows / best, 1) if best else None
+    result.update(extra)
+    print(f"{name:<24} {rows:>9} rows  {best:9.3f} s", flush=True)
+    return result
+
+
+def bench_merge(rows: int) -> list[dict]:
+    half = rows // 2
+    first = synthetic_results(half, seed=1, source="docSearch")
+    second = synthetic_results(rows - half, seed=2, source="extendedsearch", start=half // 2)
+    return [_measure("merge", rows, lambda: merge_results([first, second]))]
+
+
+def bench_score(rows: int, allow_model: bool) -> list[dict]:
+    df = synthetic_results(rows, seed=3)
+    return [
+        _measure(
+            "score",
+            rows,
+            lambda: score_results(df, "поставка медицинских изделий", allow_model_download=allow_model),
+            model=allow_model,
+        )
+    ]
+
+
+def bench_exports(rows: int) -> list[dict]:
+    df = synthetic_results(rows, seed=4)
+    results = []
+    for fmt, spec in EXPORT_FORMATS.items():
+        size = {}
+
+        def build(spec=spec, size=size) -> None:
+            size["bytes"] = len(spec.build(df))
+
+        result = _measure(f"export.{fmt}", rows, build)
+        result["bytes"] = size["bytes"]
+        result["mb_per_s"] = round(size["bytes"] / 1e6 / result["seconds"], 2)
+        results.append(result)
+    return results
+
+
+def bench_scrapers(pages: int, cards_per_page: int, latency_s: float) -> list[dict]:
+    """Drive both Playwright sources against the local portal stand-in."""
+    try:
+        from core.sources import docsearch, orders_search
+    except ImportError as exc:
+        print(f"scrape: skipped ({exc})")
+        return [{"name": "scrape", "skipped": str(exc)}]
+
+    results = []
+    config = StubConfig(pages=pages, cards_per_page=cards_per_page, latency_s=latency_s)
+    cards = pages * cards_per_page
+    settings = SearchSettings(query="поставка", limit=cards)
+    with PortalStub(config) as stub:
+        for module, search in (
+            (docsearch, docsearch.search_docsearch),
+            (orders_search, orders_search.search_orders),
+        ):
+            source = module.SOURCE
+            original = module.BASE_URL
+            module.BASE_URL = stub.url(source)
+            try:
+                with collect_spans() as spans:
+                    result = _measure(f"scrape.{source}", cards, lambda: search(settings))
+            finally:
+                module.BASE_URL = original
+            extract_s = sum(s.duration_s for s in spans if s.name == "source.extract_page")
+            stages = {}
+            for span in spans:
+                stages[span.name] = round(stages.get(span.name, 0.0) + span.duration_s, 6)
+            result.update(
+                pages=pages,
+                latency_s=latency_s,
+                pages_per_s=round(pages / result["seconds"], 3),
+                extract_ms_per_card=round(extract_s * 1000 / cards, 3),
+                stages=stages,
+            )
+            results.append(result)
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict], ratio: float = REGRESSION_RATIO) -> list[str]:
+    """Return a line for every measurement at least *ratio* times slower than *baseline*."""
+    previous = {(item["name"], item.get("rows")): item for item in baseline if "seconds" in item}
+    regressions = []
+    for item in results:
+        old = previous.get((item["name"], item.get("rows")))
+        if old and "seconds" in item and old["seconds"] and item["seconds"] / old["seconds"] >= ratio:
+            regressions.append(
+                f"{item['name']} @ {item.get('rows')} rows: "
+                f"{old['seconds']:.3f} s -> {item['seconds']:.3f} s "
+                f"(x{item['seconds'] / old['seconds']:.2f})"
+            )
+    return regressions
+
+
+def run(
+    sizes: tuple[int, ...] = DEFAULT_SIZES,
+    suites: tuple[str, ...] = SUITES,
+    pages: int = 5,
+    cards_per_page: int = 20,
+    latency_s: float = 0.0,
+    allow_model: bool = False,
+) -> dict:
+    """Run the selected suites and return the JSON-ready report."""
+    results: list[dict] = []
+    for rows in sizes:
+        if "merge" in suites:
+            results += bench_merge(rows)
+        if "score" in suites:
+            results += bench_score(rows, allow_model)
+        if "export" in suites:
+            results += bench_exports(rows)
+    if "scrape" in suites:
+        results += bench_scrapers(pages, cards_per_page, latency_s)
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(map(str, DEFAULT_SIZES)),
+        help="Comma-separated row counts (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--suites", default=",".join(SUITES), help="Comma-separated subset of: " + ", ".join(SUITES)
+    )
+    parser.add_argument("--pages", type=int, default=5, help="Result pages served per source")
+    parser.add_argument("--cards-per-page", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Stub response latency")
+    parser.add_argument("--model", action="store_true", help="Allow loading the embedding model")
+    parser.add_argument("--output", type=Path, help="JSON report path (default: benchmarks/results/)")
+    parser.add_argument("--baseline", type=Path, help="Earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(
+        sizes=tuple(int(size) for size in args.sizes.split(",") if size),
+        suites=tuple(suite.strip() for suite in args.suites.split(",") if suite.strip()),
+        pages=args.pages,
+        cards_per_page=args.cards_per_page,
+        latency_s=args.latency_ms / 1000,
+        allow_model=args.model,
+    )
+
+    output = args.output
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = RESULTS_DIR / f"bench_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Report written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = compare(report["results"], baseline)
+        for line in regressions:
+            print(f"SLOWER: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+"""Admission control for browser contexts shared by all users of a host.
+
+Every source opens its browser context through :func:`admit`, which waits
+for a slot of the process-wide :data:`CONTROLLER`:
+
+* at most ``max_contexts`` contexts are open at the same time
+  (``MAX_BROWSER_CONTEXTS``, default 4), over all processes sharing the
+  ``output/`` volume;
+* one user holds at most ``per_user`` of them (``MAX_CONTEXTS_PER_USER``,
+  default 2), so one person's searches cannot starve everybody else's;
+* interactive searches are admitted before ``batch`` ones (scheduled
+  profiles); within a lane the user with fewer open contexts goes first,
+  then the earlier request.
+
+Who is asking is set around a run with :func:`request_context`; the same
+context can report the queue position while the request waits.
+
+The UI, the API and the scheduler run as separate processes. For the
+global cap to hold across them, an admitted context also takes one of
+``max_contexts`` lock files in ``output/admission/`` (``slot-<n>.lock``);
+the operating system releases them when a process dies, so a crash never
+leaks a slot. The per-user limit and the queue order are per process.
+
+Each controller also publishes how many of its requests are waiting to a
+small SQLite table in the same directory;
+:meth:`AdmissionController.waiting_everywhere` adds them up, which lets
+background work (:mod:`core.cache_warmer`) back off while searches of any
+process are queued.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import itertools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+from core.file_lock import try_lock, unlock
+from core.metrics import inc, observe
+from core.settings import OUTPUT_DIR
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+DEFAULT_MAX_CONTEXTS = 4
+DEFAULT_PER_USER = 2
+WAIT_POLL_S = 0.25
+SHARED_DIR = OUTPUT_DIR / "admission"
+HEARTBEAT_S = 5.0
+SHARED_MAX_AGE_S = 30.0  # rows not refreshed for this long belong to dead processes
+
+_SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS waiting (
+    process TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+OnWait = Callable[[int | None], None]
+
+
+@dataclass
+class _Ticket:
+    user: str
+    priority: str
+    seq: int
+    admitted: bool = False
+    slot: BinaryIO | None = None  # lock file of the host-wide slot
+
+
+@dataclass(frozen=True)
+class _Request:
+    user: str = ""
+    priority: str = "interactive"
+    on_wait: OnWait | None = None
+
+
+_request: contextvars.ContextVar[_Request] = contextvars.ContextVar(
+    "admission_request", default=_Request()
+)
+
+
+class AdmissionController:
+    """Grants browser-context slots under a global and a per-user limit.
+
+    Args:
+        max_contexts: Contexts open at the same time, over all users.
+        per_user: Contexts one user may hold at the same time.
+        shared: Directory shared with the other processes: holds the
+            host-wide slot locks and the published waiting counts. With
+            ``None`` the limits apply to this controller alone.
+    """
+
+    def __init__(
+        self,
+        max_contexts: int = DEFAULT_MAX_CONTEXTS,
+        per_user: int = DEFAULT_PER_USER,
+        shared: Path | str | None = None,
+    ) -> None:
+        self.max_contexts = max(1, max_contexts)
+        self.per_user = max(1, per_user)
+        self.shared = Path(shared) if shared is not None else None
+        self._cond = threading.Condition()
+        self._waiting: list[_Ticket] = []
+        self._active: dict[str, int] = {}
+        self._seq = itertools.count()
+        self._process = uuid.uuid4().hex  # PIDs repeat across containers
+        self._published = (0, 0.0)  # count and time of the last published row
+
+    def _order(self, ticket: _Ticket) -> tuple[int, int, int]:
+        return PRIORITIES[ticket.priority], self._active.get(ticket.user, 0), ticket.seq
+
+    def _claim_slot(self) -> tuple[bool, BinaryIO | None]:
+        """Take a free host-wide slot: ``(taken, lock file)`` (lock held)."""
+        if self.shared is None:
+            return True, None
+        try:
+            for index in range(self.max_contexts):
+                slot = try_lock(self.shared / f"slot-{index}.lock")
+                if slot is not None:
+                    return True, slot
+        except OSError:
+            return True, None  # Shared directory unusable: fall back to the local limit
+        return False, None
+
+    def _admit(self) -> None:
+        """Admit waiting tickets while there is room (lock held)."""
+        admitted = False
+        while sum(self._active.values()) < self.max_contexts:
+            candidates = [t for t in self._waiting if self._active.get(t.user, 0) < self.per_user]
+            if not candidates:
+                break
+            taken, slot = self._claim_slot()
+            if not taken:
+                break  # Other processes hold every slot; waiters poll again
+            ticket = min(candidates, key=self._order)
+            self._waiting.remove(ticket)
+            ticket.admitted, ticket.slot = True, slot
+            self._active[ticket.user] = self._active.get(ticket.user, 0) + 1
+            admitted = True
+        self._publish()
+        if admitted:
+            self._cond.notify_all()
+
+    def _publish(self) -> None:
+        """Write the waiting count to :attr:`shared` when it changed, or as a heartbeat (lock held)."""
+        if self.shared is None:
+            return
+        count, now = len(self._waiting), time.time()
+        last_count, last_at = self._published
+        if count == last_count and (not count or now - last_at < HEARTBEAT_S):
+            return
+        try:
+            self.shared.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(self.shared / "waiting.sqlite", timeout=1)) as conn, conn:
+                conn.execute(_SHARED_SCHEMA)
+                conn.execute("DELETE FROM waiting WHERE updated_at < ?", (now - SHARED_MAX_AGE_S,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO waiting (process, count, updated_at) VALUES (?, ?, ?)",
+                    (self._process, count, now),
+                )
+        except (OSError, sqlite3.Error):
+            return  # Only a hint for background work; retried on the next change or heartbeat
+        self._published = (count, now)
+
+    def _position(self, ticket: _Ticket) -> int:
+        """1-based place of *ticket* among the waiting requests (lock held)."""
+        key = self._order(ticket)
+        return 1 + sum(1 for other in self._waiting if self._order(other) < key)
+
+    @contextmanager
+    def slot(
+        self,
+        user: str = "",
+        priority: str = "interactive",
+        stop: threading.Event | None = None,
+        on_wait: OnWait | None = None,
+    ) -> Iterator[None]:
+        """Hold one browser-context slot for the duration of the block.
+
+        Args:
+            user: Who the context is for (per-user limit).
+            priority: ``"interactive"`` or ``"batch"``.
+            stop: Optional event that abandons the wait when set.
+            on_wait: Called with the queue position while waiting and with
+                ``None`` once the slot is granted.
+
+        Raises:
+            ValueError: On an unknown priority.
+            RuntimeError: If *stop* is set before a slot is granted.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority!r}")
+        ticket = _Ticket(user, priority, next(self._seq))
+        started = time.perf_counter()
+        with self._cond:
+            self._waiting.append(ticket)
+            self._admit()
+            waited = not ticket.admitted
+            while not ticket.admitted:
+                if stop is not None and stop.is_set():
+                    self._waiting.remove(ticket)
+                    self._publish()
+                    raise RuntimeError("Поиск остановлен в очереди на запуск браузера.")
+                if on_wait is not None:
+                    on_wait(self._position(ticket))
+                self._cond.wait(WAIT_POLL_S)
+                self._admit()  # Slots freed by other processes send no notification
+        if waited:
+            inc("admission_waits_total", priority=priority)
+            if on_wait is not None:
+                on_wait(None)
+        observe("admission_wait_seconds", time.perf_counter() - started, priority=priority)
+        try:
+            yield
+        finally:
+            with self._cond:
+                if ticket.slot is not None:
+                    unlock(ticket.slot)
+                self._active[user] -= 1
+                if not self._active[user]:
+                    del self._active[user]
+                self._admit()
+
+    def snapshot(self) -> dict:
+        """Return the open and waiting contexts, for status displays."""
+        with self._cond:
+            return {
+                "active": sum(self._active.values()),
+                "max_contexts": self.max_contexts,
+                "waiting": len(self._waiting),
+                "by_user": dict(self._active),
+            }
+
+    def waiting_everywhere(self, max_age_s: float = SHARED_MAX_AGE_S) -> int:
+        """Return the requests waiting for a slot here and in the processes sharing :attr:`shared`.
+
+        Rows not refreshed for *max_age_s* seconds are ignored. Falls back
+        to this process alone when the shared table cannot be read.
+        """
+        with self._cond:
+            local = len(self._waiting)
+        if self.shared is None or not (self.shared / "waiting.sqlite").exists():
+            return local
+        try:
+            with closing(sqlite3.connect(self.shared / "waiting.sqlite", timeout=1)) as conn:
+                (others,) = conn.execute(
+                    "SELECT COALESCE(SUM(count), 0) FROM waiting WHERE process != ? AND updated_at >= ?",
+                    (self._process, time.time() - max_age_s),
+                ).fetchone()
+        except sqlite3.Error:
+            return local
+        return local + others
+
+
+CONTROLLER = AdmissionController(
+    max_contexts=int(os.environ.get("MAX_BROWSER_CONTEXTS", DEFAULT_MAX_CONTEXTS)),
+    per_user=int(os.environ.get("MAX_CONTEXTS_PER_USER", DEFAULT_PER_USER)),
+    shared=SHARED_DIR,
+)
+
+
+@contextmanager
+def request_context(user: str = "", priority: str = "interactive", on_wait: OnWait | None = None) -> Iterator[None]:
+    """Attribute the browser contexts opened inside the block to *user* and *priority*."""
+    token = _request.set(_Request(user, priority, on_wait))
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def current_on_wait() -> OnWait | None:
+    """Return the queue-position callback of the current request, if any."""
+    return _request.get().on_wait
+
+
+@contextmanager
+def admit(stop: threading.Event | None = None) -> Iterator[None]:
+    """Hold a :data:`CONTROLLER` slot for the current request (see :func:`request_context`)."""
+    request = _request.get()
+    with CONTROLLER.slot(request.user, request.priority, stop=stop, on_wait=request.on_wait):
+        yield
@@ -2,17 +2,38 @@
 
 Primary strategy uses ``sentence-transformers`` embeddings.
 If model loading fails (e.g. offline environment), the ranker falls back to
-token-overlap similarity so the feature remains usable.
+token-overlap similarity so the feature remains usable. Model embeddings are
+cached on disk (:mod:`core.embedding_cache`), so titles seen before are not
+encoded again.
+
+Rows with a ``doc_text`` column (the indexed attachment text, see
+:mod:`core.documents`) are also scored on their documents; a row keeps the
+better of its title and document scores.
 """
 
 from __future__ import annotations
 
+import contextvars
+import heapq
 import math
+import multiprocessing
+import os
+import queue
 import re
+import threading
+import zlib
 from functools import lru_cache
+from multiprocessing.shared_memory import SharedMemory
 
+import numpy as np
 import pandas as pd
 
+from core.documents import DOC_TEXT_COLUMN
+from core.embedding_cache import EmbeddingCache, get_embedding_cache
+from core.merge import row_key
+from core.metrics import inc, span, timed
+from core.profiling import track_thread
+
 AI_MODELS = {
     "fast": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
     "balanced": "intfloat/multilingual-e5-base",
@@ -20,12 +41,23 @@ AI_MODELS = {
 }
 DEFAULT_MODE = "balanced"
 
+# Offline encoder used when no sentence-transformers model is available
+FALLBACK_ENCODER = "hashing-trigram-256"
+HASH_EMBEDDING_DIM = 256
+
+# Titles per task handed to an encoding worker process
+ENCODE_SHARD_SIZE = 1024
+
+# A document match counts slightly less than the same match in the title
+DOC_SCORE_WEIGHT = 0.9
+
 
 @lru_cache(maxsize=1)
 def _get_model(model_name: str):
     from sentence_transformers import SentenceTransformer
 
-    return SentenceTransformer(model_name)
+    with span("ranker.model_load", model=model_name):
+        return SentenceTransformer(model_name)
 
 
 def _resolve_model(mode: str, model_name: str | None) -> str:
@@ -48,30 +80,275 @@ def _fallback_token_score(query: str, title: str) -> float:
     return overlap / union if union else 0.0
 
 
-def _prepare_texts_for_model(
+def _fallback_passage_score(query: str, text: str) -> float:
+    """Best :func:`_fallback_token_score` over the sentences and lines of *text*.
+
+    Scoring a whole document against the query would make its score shrink
+    with its length; a title-sized passage keeps it on the scale of titles.
+    """
+    passages = re.split(r"[.!?;\n]+", str(text or ""))
+    return max((_fallback_token_score(query, passage) for passage in passages), default=0.0)
+
+
+def _prefix_for_model(texts: list[str], model_name: str, role: str) -> list[str]:
+    if "e5" in model_name.lower():
+        return [f"{role}: {text}" for text in texts]
+    return texts
+
+
+def _hash_embeddings(texts: list[str], dim: int = HASH_EMBEDDING_DIM) -> np.ndarray:
+    """Embed *texts* as L2-normalised hashed character-trigram counts."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        padded = f" {_normalize_text(text)} "
+        for start in range(len(padded) - 2):
+            bucket = zlib.crc32(padded[start:start + 3].encode("utf-8")) % dim
+            vectors[row, bucket] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def resolve_encoder(model_name: str, allow_model_download: bool = False) -> str:
+    """Return *model_name* if it can be loaded, else :data:`FALLBACK_ENCODER`."""
+    if allow_model_download:
+        try:
+            _get_model(model_name)
+            return model_name
+        except Exception:
+            pass
+    return FALLBACK_ENCODER
+
+
+def encode_texts(
+    texts: list[str],
+    encoder: str,
+    role: str = "passage",
+    batch_size: int = 32,
+) -> np.ndarray:
+    """Encode *texts* into L2-normalised float32 vectors.
+
+    Args:
+        texts: Texts to encode.
+        encoder: Model name or :data:`FALLBACK_ENCODER`, see :func:`resolve_encoder`.
+        role: ``query`` or ``passage`` (used for e5-style prefixes).
+        batch_size: Batch size passed to ``model.encode``.
+
+    Returns:
+        Array of shape ``(len(texts), dim)``.
+    """
+    inc("ranker_texts_total", len(texts), encoder=encoder)
+    if encoder == FALLBACK_ENCODER:
+        with span("ranker.encode", encoder=encoder):
+            return _hash_embeddings(texts)
+    model = _get_model(encoder)
+    with span("ranker.encode", encoder=encoder):
+        vectors = model.encode(
+            _prefix_for_model(texts, encoder, role),
+            batch_size=batch_size,
+            normalize_embeddings=True,
+        )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+# Per-process state of encoding workers, set by ``_init_encode_worker``
+_worker_encoder = FALLBACK_ENCODER
+_worker_role = "passage"
+_worker_batch_size = 32
+
+
+def _init_encode_worker(encoder: str, role: str, batch_size: int, threads: int) -> None:
+    global _worker_encoder, _worker_role, _worker_batch_size
+    _worker_encoder, _worker_role, _worker_batch_size = encoder, role, batch_size
+    if encoder != FALLBACK_ENCODER:
+        try:
+            import torch
+
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+        _get_model(encoder)
+
+
+def _worker_dimension() -> int:
+    if _worker_encoder == FALLBACK_ENCODER:
+        return HASH_EMBEDDING_DIM
+    return int(_get_model(_worker_encoder).get_sentence_embedding_dimension())
+
+
+def _encode_shard(task: tuple[str, tuple[int, int], int, list[str]]) -> int:
+    shm_name, shape, start, texts = task
+    shm = SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(texts)] = encode_texts(
+            texts, _worker_encoder, role=_worker_role, batch_size=_worker_batch_size
+        )
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+def encode_parallel(
+    texts: list[str],
+    encoder: str,
+    role: str = "passage",
+    workers: int | None = None,
+    batch_size: int = 32,
+    shard_size: int = ENCODE_SHARD_SIZE,
+) -> np.ndarray:
+    """Encode *texts* across a pool of worker processes.
+
+    Each worker loads the model once and writes its shard straight into a
+    shared-memory output buffer, so large arrays are never pickled back to the
+    parent. Small inputs and ``workers <= 1`` fall back to :func:`encode_texts`.
+
+    Args:
+        texts: Texts to encode.
+        encoder: Model name or :data:`FALLBACK_ENCODER`.
+        role: ``query`` or ``passage`` (used for e5-style prefixes).
+        workers: Number of worker processes (defaults to the CPU count).
+        batch_size: Batch size passed to ``model.encode`` inside each worker.
+        shard_size: Number of texts per task handed to a worker.
+
+    Returns:
+        Array of shape ``(len(texts), dim)``, identical to :func:`encode_texts`.
+    """
+    cpu_count = os.cpu_count() or 1
+    workers = min(workers or cpu_count, math.ceil(len(texts) / shard_size))
+    if workers <= 1:
+        return encode_texts(texts, encoder, role=role, batch_size=batch_size)
+
+    ctx = multiprocessing.get_context("spawn")
+    threads = max(1, cpu_count // workers)
+    with ctx.Pool(
+        processes=workers,
+        initializer=_init_encode_worker,
+        initargs=(encoder, role, batch_size, threads),
+    ) as pool:
+        shape = (len(texts), pool.apply(_worker_dimension))
+        shm = SharedMemory(create=True, size=shape[0] * shape[1] * 4)
+        try:
+            tasks = [
+                (shm.name, shape, start, texts[start:start + shard_size])
+                for start in range(0, len(texts), shard_size)
+            ]
+            for _ in pool.imap_unordered(_encode_shard, tasks):
+                pass
+            return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def encode_cached(
+    texts: list[str],
+    encoder: str,
+    role: str = "passage",
+    workers: int | None = 1,
+    cache: EmbeddingCache | None = None,
+) -> np.ndarray:
+    """Encode *texts* like :func:`encode_parallel`, reusing cached vectors.
+
+    Only texts never encoded by *encoder* in this *role* are encoded; their
+    vectors are added to *cache* (the process-wide
+    :class:`~core.embedding_cache.EmbeddingCache` by default).
+    """
+    cache = cache if cache is not None else get_embedding_cache()
+    found = cache.get_many(encoder, role, texts)
+    missing = [text for text in dict.fromkeys(texts) if text not in found]
+    if missing:
+        vectors = encode_parallel(missing, encoder, role=role, workers=workers)
+        cache.put_many(encoder, role, missing, vectors)
+        found.update(zip(missing, vectors))
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([found[text] for text in texts])
+
+
+def _embed_scores(
     query: str,
     titles: list[str],
     model_name: str,
-) -> tuple[str, list[str]]:
-    lowered = model_name.lower()
-    if "e5" in lowered:
-        query_text = f"query: {query}"
-        title_texts = [f"passage: {title}" for title in titles]
-        return query_text, title_texts
-    return query, titles
-
-
-def _embed_scores(query: str, titles: list[str], model_name: str) -> list[float]:
-    from sentence_transformers import util
-
-    model = _get_model(model_name)
-    query_text, title_texts = _prepare_texts_for_model(query, titles, model_name)
-    query_vec = model.encode([query_text], normalize_embeddings=True)
-    title_vecs = model.encode(title_texts, normalize_embeddings=True)
-    sims = util.cos_sim(query_vec, title_vecs)[0].tolist()
+    workers: int = 1,
+) -> list[float]:
+    query_vec = encode_cached([query], model_name, role="query")[0]
+    title_vecs = encode_cached(titles, model_name, workers=workers)
+    sims = (title_vecs @ query_vec).tolist()
     return [max(0.0, min(1.0, (float(score) + 1.0) / 2.0)) for score in sims]
 
 
+def _titles(df: pd.DataFrame) -> list[str]:
+    return [str(value) for value in df.get("title", pd.Series([""] * len(df))).tolist()]
+
+
+def _score_titles(
+    query: str,
+    titles: list[str],
+    model_name: str,
+    use_model: bool,
+    workers: int = 1,
+) -> list[float]:
+    if use_model:
+        try:
+            return _embed_scores(query=query, titles=titles, model_name=model_name, workers=workers)
+        except Exception:
+            pass
+    return [_fallback_token_score(query=query, title=title) for title in titles]
+
+
+def _clean_score(score: float) -> float:
+    return float(score) if not math.isnan(float(score)) else 0.0
+
+
+def _with_document_scores(
+    df: pd.DataFrame,
+    scores: list[float],
+    query: str,
+    model_name: str,
+    use_model: bool,
+    workers: int = 1,
+) -> list[float]:
+    """Raise *scores* of rows whose ``doc_text`` matches *query* better than their title."""
+    if DOC_TEXT_COLUMN not in df.columns:
+        return scores
+    texts = [value if isinstance(value, str) else "" for value in df[DOC_TEXT_COLUMN].tolist()]
+    indexes = [i for i, text in enumerate(texts) if text.strip()]
+    if not indexes:
+        return scores
+    documents = [texts[i] for i in indexes]
+    doc_scores = None
+    if use_model:
+        try:
+            doc_scores = _embed_scores(query=query, titles=documents, model_name=model_name, workers=workers)
+        except Exception:
+            pass
+    if doc_scores is None:
+        doc_scores = [_fallback_passage_score(query, text) for text in documents]
+    scores = [_clean_score(score) for score in scores]
+    for i, score in zip(indexes, doc_scores):
+        scores[i] = max(scores[i], DOC_SCORE_WEIGHT * _clean_score(score))
+    return scores
+
+
+def _apply_scores(df: pd.DataFrame, scores: list[float], threshold: float, top_k: int = 0) -> pd.DataFrame:
+    scores = [_clean_score(score) for score in scores]
+    df["ai_score"] = scores
+    if 0 < top_k < len(df):
+        # A bounded heap instead of sorting every row; ties keep the input order
+        best = heapq.nlargest(top_k, range(len(scores)), key=lambda i: (scores[i], -i))
+        df = df.iloc[best]
+    else:
+        df = df.sort_values(by="ai_score", ascending=False, kind="stable")
+
+    if threshold > 0.0:
+        df = df[df["ai_score"] >= threshold]
+
+    return df.reset_index(drop=True)
+
+
+@timed("ranker.score_results")
 def score_results(
     df: pd.DataFrame,
     query: str,
@@ -79,6 +356,8 @@ def score_results(
     mode: str = DEFAULT_MODE,
     model_name: str | None = None,
     allow_model_download: bool = False,
+    workers: int = 1,
+    top_k: int = 0,
 ) -> pd.DataFrame:
     """Assign an AI relevance score to each row in *df*.
 
@@ -89,10 +368,14 @@ def score_results(
         mode: Ranking profile (``fast`` | ``balanced`` | ``quality``).
         model_name: Optional direct model override.
         allow_model_download: Allow downloading model weights if absent locally.
+        workers: Encoding processes for large result sets, see
+            :func:`encode_parallel` (``1`` encodes in-process).
+        top_k: Keep only the *top_k* best rows (0 keeps all rows).
 
     Returns:
         DataFrame with an additional ``ai_score`` column (float 0–1).
-        Rows with ``ai_score < threshold`` are dropped.
+        Rows with ``ai_score < threshold`` are dropped. With a ``doc_text``
+        column the score is the better of the title and document matches.
     """
     df = df.copy()
 
@@ -100,21 +383,136 @@ def score_results(
         df["ai_score"] = pd.Series(dtype="float64")
         return df
 
-    titles = [str(value) for value in df.get("title", pd.Series([""] * len(df))).tolist()]
+    titles = _titles(df)
     resolved_model = _resolve_model(mode=mode, model_name=model_name)
+    scores = _score_titles(
+        query,
+        titles,
+        resolved_model,
+        use_model=allow_model_download,
+        workers=workers,
+    )
+    scores = _with_document_scores(df, scores, query, resolved_model, allow_model_download, workers)
+    return _apply_scores(df, scores, threshold, top_k)
 
-    if allow_model_download:
-        try:
-            scores = _embed_scores(query=query, titles=titles, model_name=resolved_model)
-        except Exception:
-            scores = [_fallback_token_score(query=query, title=title) for title in titles]
-    else:
-        scores = [_fallback_token_score(query=query, title=title) for title in titles]
 
-    df["ai_score"] = [float(score) if not math.isnan(float(score)) else 0.0 for score in scores]
-    df = df.sort_values(by="ai_score", ascending=False)
+class PipelinedRanker:
+    """Score result batches on a background thread while sources keep scraping.
 
-    if threshold > 0.0:
-        df = df[df["ai_score"] >= threshold]
+    Feed every page of rows to :meth:`submit` as soon as a source produces it,
+    then call :meth:`finish` with the merged results. Only rows that were never
+    submitted are scored synchronously, so ranking adds little latency on top
+    of the scrape. The model is also loaded in the background on first use.
 
-    return df.reset_index(drop=True)
+    A run that fails before :meth:`finish` must call :meth:`close` (or use the
+    ranker as a context manager), or the worker thread waits forever.
+
+    Args:
+        query: The original search query string.
+        mode: Ranking profile (``fast`` | ``balanced`` | ``quality``).
+        model_name: Optional direct model override.
+        allow_model_download: Allow downloading model weights if absent locally.
+        workers: Encoding processes for large batches, as in :func:`score_results`.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        mode: str = DEFAULT_MODE,
+        model_name: str | None = None,
+        allow_model_download: bool = False,
+        workers: int = 1,
+    ) -> None:
+        self.query = query
+        self._model_name = _resolve_model(mode=mode, model_name=model_name)
+        self._use_model = allow_model_download
+        self._workers = workers
+        self._scores: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        # Run in a copy of the caller's context so spans reach its collect_spans()
+        self._worker = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._run,),
+            name="pipelined-ranker",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def __enter__(self) -> PipelinedRanker:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def submit(self, batch: pd.DataFrame) -> None:
+        """Queue a batch of rows for background scoring."""
+        if not batch.empty and not self._closed:
+            self._queue.put(batch.copy())
+
+    def close(self) -> None:
+        """Stop the worker thread once the queued batches are scored; safe to call twice."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+
+    def _run(self) -> None:
+        track_thread()
+        if self._use_model:
+            try:
+                _get_model(self._model_name)
+            except Exception:
+                self._use_model = False
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            try:
+                self._score_batch(batch)
+            except Exception:
+                continue  # Unscored rows are picked up again by finish()
+
+    def _score_batch(self, batch: pd.DataFrame) -> None:
+        rows = batch.to_dict(orient="records")
+        titles = _titles(batch)
+        scores = _score_titles(self.query, titles, self._model_name, self._use_model, self._workers)
+        with self._lock:
+            for row, title, score in zip(rows, titles, scores):
+                self._scores[(row_key(row), title)] = _clean_score(score)
+
+    def finish(self, df: pd.DataFrame, threshold: float = 0.0, top_k: int = 0) -> pd.DataFrame:
+        """Wait for queued batches and return *df* ranked like :func:`score_results`.
+
+        The *top_k* rows are picked only here: the merge may still replace a
+        scraped row and document matches raise scores at the end, so a heap
+        kept while batches arrive could hold rows that are no longer the best.
+        """
+        with span("ranker.wait_background"):
+            self.close()
+
+        df = df.copy()
+        if df.empty:
+            df["ai_score"] = pd.Series(dtype="float64")
+            return df
+
+        keys = [(row_key(row), title) for row, title in zip(df.to_dict(orient="records"), _titles(df))]
+        unique_keys = list(dict.fromkeys(keys))
+        missing = [key for key in unique_keys if key not in self._scores]
+        if missing:
+            scores = _score_titles(
+                self.query,
+                [title for _, title in missing],
+                self._model_name,
+                self._use_model,
+                self._workers,
+            )
+            self._scores.update(zip(missing, scores))
+        inc("ranker_pipelined_rows_total", len(unique_keys) - len(missing), result="background")
+        inc("ranker_pipelined_rows_total", len(missing), result="finish")
+        scores = [self._scores[key] for key in keys]
+        scores = _with_document_scores(
+            df, scores, self.query, self._model_name, self._use_model, self._workers
+        )
+        return _apply_scores(df, scores, threshold, top_k)
@@ -0,0 +1,301 @@
+"""Persistent semantic index over every purchase title ever scraped.
+
+Vectors are appended to a raw float32 file and memory-mapped for search, so
+adding new rows never rewrites the archive. Queries use an HNSW graph when
+``hnswlib`` is installed and the archive is large enough for it to pay off;
+otherwise an exact NumPy cosine scan is used.
+
+Each encoder gets its own sub-directory, so switching the AI mode never mixes
+embeddings of different dimensions or spaces. The UI, the API and the
+scheduler share the archive, so every read-modify-write of its files holds a
+lock file (:func:`core.file_lock.file_lock`), and an instance reloads the
+archive when another process has appended to it.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.ai_ranker import DEFAULT_MODE, _resolve_model, encode_texts, resolve_encoder
+from core.file_lock import file_lock
+from core.merge import row_key
+from core.settings import OUTPUT_DIR
+
+ARCHIVE_DIR = OUTPUT_DIR / "archive"
+HNSW_MIN_ITEMS = 20_000
+
+# Columns stored alongside each vector and returned by ``search``
+ITEM_COLUMNS = ["purchase_number", "title", "url", "price", "publish_date", "source"]
+
+
+def _jsonable(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, dict)):
+        return value
+    if pd.isna(value):
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class ArchiveIndex:
+    """Approximate nearest-neighbour index over archived purchase titles.
+
+    Args:
+        path: Root directory of the archive (defaults to ``output/archive``).
+        mode: Ranking profile used to pick the encoder, as in ``score_results``.
+        model_name: Optional direct model override.
+        allow_model_download: Allow downloading model weights if absent locally.
+            When the model is unavailable the offline hashing encoder is used.
+    """
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        mode: str = DEFAULT_MODE,
+        model_name: str | None = None,
+        allow_model_download: bool = False,
+    ) -> None:
+        self.encoder = resolve_encoder(
+            _resolve_model(mode=mode, model_name=model_name),
+            allow_model_download=allow_model_download,
+        )
+        root = Path(path) if path else ARCHIVE_DIR
+        self.path = root / re.sub(r"[^\w.-]+", "_", self.encoder)
+        self._lock = threading.Lock()
+        self._dim: int | None = None
+        self._items: list[dict] = []
+        self._keys: set[str] = set()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._hnsw = None
+        self._items_size = 0  # Size of items.jsonl as of the last load or append
+        with file_lock(self._lock_path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.path / "meta.json"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def _items_path(self) -> Path:
+        return self.path / "items.jsonl"
+
+    @property
+    def _hnsw_path(self) -> Path:
+        return self.path / "hnsw.bin"
+
+    @property
+    def _lock_path(self) -> Path:
+        return self.path / ".lock"
+
+    def _file_size(self, path: Path) -> int:
+        return path.stat().st_size if path.exists() else 0
+
+    def _load(self) -> None:
+        """(Re)read the archive from disk; the caller holds the file lock."""
+        self._dim = None
+        self._items = []
+        self._keys = set()
+        self._hnsw = None
+        self._items_size = 0
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+        self._dim = int(meta["dim"])
+
+        items_dirty = False
+        if self._items_path.exists():
+            with self._items_path.open(encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        self._items.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        items_dirty = True  # Truncated tail after an interrupted write
+                        break
+        stored_rows = 0
+        if self._vectors_path.exists():
+            stored_rows = self._vectors_path.stat().st_size // (4 * self._dim)
+
+        # Drop items whose vectors never made it to disk (and vice versa) so
+        # that later appends stay aligned.
+        count = min(len(self._items), stored_rows)
+        recovered = len(self._items) > count or items_dirty
+        if recovered:
+            self._items = self._items[:count]
+            with self._items_path.open("w", encoding="utf-8") as fh:
+                for item in self._items:
+                    fh.write(json.dumps(item, ensure_ascii=False) + "\n")
+        expected_size = count * 4 * self._dim
+        if self._vectors_path.exists() and self._vectors_path.stat().st_size != expected_size:
+            with self._vectors_path.open("r+b") as fh:
+                fh.truncate(expected_size)
+            recovered = True
+        if recovered:
+            # The graph may index rows that were just dropped; rebuild it on next use
+            self._hnsw_path.unlink(missing_ok=True)
+        self._keys = {item["key"] for item in self._items}
+        self._items_size = self._file_size(self._items_path)
+        self._map_vectors()
+
+    def _sync(self) -> None:
+        """Reload if another process appended to the archive; the caller holds the file lock."""
+        if self._file_size(self._items_path) != self._items_size:
+            self._load()
+
+    def _map_vectors(self) -> None:
+        if self._dim and self._vectors_path.exists() and self._vectors_path.stat().st_size:
+            flat = np.memmap(self._vectors_path, dtype=np.float32, mode="r")
+            rows = flat.size // self._dim
+            self._vectors = flat[: rows * self._dim].reshape(rows, self._dim)[: len(self._items)]
+        else:
+            self._vectors = np.zeros((0, self._dim or 0), dtype=np.float32)
+
+    def _hnsw_index(self):
+        """Return the HNSW graph, building or loading it on first use; the caller holds the file lock."""
+        if self._hnsw is not None or len(self) < HNSW_MIN_ITEMS:
+            return self._hnsw
+        try:
+            import hnswlib
+        except ImportError:
+            return None
+
+        index = hnswlib.Index(space="cosine", dim=self._dim)
+        loaded = False
+        if self._hnsw_path.exists():
+            try:
+                index.load_index(str(self._hnsw_path), max_elements=len(self) * 2)
+                loaded = index.get_current_count() <= len(self)
+            except RuntimeError:
+                pass
+            if not loaded:
+                # Written before a truncation recovery: labels past the end would not resolve
+                index = hnswlib.Index(space="cosine", dim=self._dim)
+                self._hnsw_path.unlink(missing_ok=True)
+        if not loaded:
+            index.init_index(max_elements=len(self) * 2, ef_construction=200, M=16)
+        indexed = index.get_current_count()
+        if indexed < len(self):
+            index.add_items(
+                np.asarray(self._vectors[indexed:]),
+                np.arange(indexed, len(self)),
+            )
+            index.save_index(str(self._hnsw_path))
+        index.set_ef(64)
+        self._hnsw = index
+        return index
+
+    def add(self, df: pd.DataFrame) -> int:
+        """Append rows of *df* that are not yet archived.
+
+        Rows are keyed by ``purchase_number`` (or ``url`` when it is empty);
+        rows without a title are skipped.
+
+        Returns:
+            Number of rows added.
+        """
+        records: list[dict] = []
+        with self._lock:
+            seen = set(self._keys)
+        for row in df.to_dict(orient="records"):
+            key = row_key(row)
+            title = str(row.get("title") or "").strip()
+            if not key or not title or key in seen:
+                continue
+            seen.add(key)
+            item = {"key": key}
+            item.update({col: _jsonable(row.get(col)) for col in ITEM_COLUMNS})
+            records.append(item)
+        if not records:
+            return 0
+        # Encode outside the locks: it is the slow part
+        vectors = encode_texts([item["title"] for item in records], self.encoder)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        with self._lock, file_lock(self._lock_path):
+            self._sync()
+            # Another process may have archived some of the rows meanwhile
+            fresh = [pos for pos, item in enumerate(records) if item["key"] not in self._keys]
+            if not fresh:
+                return 0
+            records = [records[pos] for pos in fresh]
+            vectors = vectors[fresh]
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                self.path.mkdir(parents=True, exist_ok=True)
+                self._meta_path.write_text(
+                    json.dumps({"encoder": self.encoder, "dim": self._dim}),
+                    encoding="utf-8",
+                )
+
+            with self._vectors_path.open("ab") as fh:
+                vectors.tofile(fh)
+            with self._items_path.open("a", encoding="utf-8") as fh:
+                for item in records:
+                    fh.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._items_size = self._file_size(self._items_path)
+
+            start = len(self._items)
+            self._items.extend(records)
+            self._keys.update(item["key"] for item in records)
+            self._map_vectors()
+
+            if self._hnsw is not None:
+                if self._hnsw.get_max_elements() < len(self):
+                    self._hnsw.resize_index(len(self) * 2)
+                self._hnsw.add_items(vectors, np.arange(start, len(self)))
+                self._hnsw.save_index(str(self._hnsw_path))
+        return len(records)
+
+    def search(self, query: str, top_k: int = 20) -> pd.DataFrame:
+        """Return the *top_k* archived purchases most similar to *query*.
+
+        Returns:
+            DataFrame with :data:`ITEM_COLUMNS` plus ``similarity`` (float 0–1),
+            sorted by similarity descending.
+        """
+        columns = ITEM_COLUMNS + ["similarity"]
+        if not query.strip():
+            return pd.DataFrame(columns=columns)
+        with self._lock:
+            with file_lock(self._lock_path):
+                self._sync()
+                index = self._hnsw_index()  # May build and save the graph
+            if not len(self):
+                return pd.DataFrame(columns=columns)
+            top_k = max(1, min(int(top_k), len(self)))
+            query_vec = encode_texts([query], self.encoder, role="query")[0]
+
+            if index is not None:
+                labels, distances = index.knn_query(query_vec, k=top_k)
+                ids = labels[0]
+                sims = 1.0 - distances[0]
+            else:
+                all_sims = np.asarray(self._vectors @ query_vec)
+                ids = np.argpartition(-all_sims, top_k - 1)[:top_k]
+                ids = ids[np.argsort(-all_sims[ids], kind="stable")]
+                sims = all_sims[ids]
+
+            rows = []
+            for item_id, sim in zip(ids, sims):
+                row = {col: self._items[int(item_id)].get(col) for col in ITEM_COLUMNS}
+                row["similarity"] = max(0.0, min(1.0, (float(sim) + 1.0) / 2.0))
+                rows.append(row)
+        return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,181 @@
+"""Off-peak warming of the search caches for popular and saved searches.
+
+Interactive users pay the full scrape for every search unless its rows are
+in the source result cache (:mod:`core.search_cache`). :class:`CacheWarmer`
+learns which searches are worth keeping warm: the most frequent ones in the
+request log of the cache, and the saved search profiles
+(:mod:`core.scheduler`). Inside an off-peak window it re-runs those whose
+cached rows are older than ``refresh_after_h``:
+
+* one search at a time, in the ``batch`` admission lane behind interactive
+  searches, through the same egress pool; a tick is cut short as soon as
+  searches of any process (UI, API, scheduler) are waiting for a browser;
+* the run writes the source result cache, and the ranker fills the
+  embedding cache (:mod:`core.embedding_cache`) for searches that rank
+  with a model;
+* change tracking is off, so warming never marks purchases as seen.
+
+The scheduler service (``python -m core.scheduler``) runs the warmer when
+``CACHE_WARM_HOURS`` is set, e.g. ``1-6`` for 01:00–06:00 local time.
+"""
+
+from __future__ import annotations
+
+import datetime
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, replace
+
+from core.admission import CONTROLLER, request_context
+from core.metrics import inc
+from core.pipeline import run_search
+from core.scheduler import ProfileStore
+from core.search_cache import SearchCache, cache_key, get_search_cache
+from core.settings import SearchSettings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = (1, 6)
+DEFAULT_TOP = 20
+DEFAULT_REFRESH_AFTER_H = 6.0
+POPULARITY_DAYS = 14
+TICK_S = 300.0
+WARM_USER = "cache-warmer"
+
+
+def parse_window(spec: str) -> tuple[int, int]:
+    """Parse an hour range such as ``"1-6"`` or ``"22-5"`` (end hour excluded).
+
+    Raises:
+        ValueError: If *spec* is not two hours between 0 and 24.
+    """
+    start, sep, end = spec.partition("-")
+    try:
+        window = int(start), int(end)
+    except ValueError:
+        raise ValueError(f"Invalid hour range: {spec!r}") from None
+    if not sep or not all(0 <= hour <= 24 for hour in window) or window[0] == window[1]:
+        raise ValueError(f"Invalid hour range: {spec!r}")
+    return window
+
+
+def in_window(hour: int, window: tuple[int, int]) -> bool:
+    """Whether *hour* falls into *window*, which may wrap past midnight."""
+    start, end = window
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+@dataclass
+class WarmRun:
+    """Result of warming one search."""
+
+    settings: SearchSettings
+    rows: int
+    errors: list[str] = field(default_factory=list)
+    duration_s: float = 0.0
+
+
+class CacheWarmer:
+    """Refresh the cached rows of popular and saved searches during off-peak hours.
+
+    Args:
+        cache: Source result cache to fill (the process-wide one by default).
+        profiles: Saved searches that are always kept warm.
+        window: Local hours ``(start, end)`` in which warming runs.
+        top: How many of the most requested searches are kept warm.
+        refresh_after_h: Cached rows older than this are refreshed.
+    """
+
+    def __init__(
+        self,
+        cache: SearchCache | None = None,
+        profiles: ProfileStore | None = None,
+        window: tuple[int, int] = DEFAULT_WINDOW,
+        top: int = DEFAULT_TOP,
+        refresh_after_h: float = DEFAULT_REFRESH_AFTER_H,
+    ) -> None:
+        self.cache = cache or get_search_cache()
+        self.profiles = profiles or ProfileStore()
+        self.window = window
+        self.top = top
+        self.refresh_after_h = refresh_after_h
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def candidates(self, now: float | None = None) -> list[SearchSettings]:
+        """Searches to keep warm: the most requested ones first, then the saved profiles."""
+        now = time.time() if now is None else now
+        day = datetime.date.fromtimestamp(now)
+        popular = self.cache.popular(self.top, since=now - POPULARITY_DAYS * 86400, day=day)
+        found = {cache_key(settings): settings for settings, _ in popular}
+        for profile in self.profiles.profiles():
+            settings = profile.settings_on(day)
+            found.setdefault(cache_key(settings), settings)
+        return list(found.values())
+
+    def due(self, now: float | None = None) -> list[SearchSettings]:
+        """Candidates whose cached rows are missing or older than ``refresh_after_h``."""
+        now = time.time() if now is None else now
+        due = []
+        for settings in self.candidates(now):
+            fetched_at = self.cache.fetched_at(settings)
+            if fetched_at is None or now - fetched_at > self.refresh_after_h * 3600:
+                due.append(settings)
+        return due
+
+    def warm(self, settings: SearchSettings) -> WarmRun:
+        """Scrape *settings* into the caches."""
+        # cache_max_age_h=0: always scrape and write, never serve; no change tracking,
+        # so the next real search still sees its new purchases as new
+        warm_settings = replace(
+            settings, use_cache=True, cache_max_age_h=0, track_changes=False, profile=False
+        )
+        started = time.perf_counter()
+        with request_context(WARM_USER, priority="batch"):
+            outcome = run_search(warm_settings, stop=self._stop)
+        inc("cache_warm_runs_total", result="error" if outcome.errors else "ok")
+        return WarmRun(settings, len(outcome.results), list(outcome.errors), time.perf_counter() - started)
+
+    def run_once(self, now: float | None = None, force: bool = False) -> list[WarmRun]:
+        """Warm every due search if the current hour is off-peak (or *force* is set)."""
+        now = time.time() if now is None else now
+        if not force and not in_window(datetime.datetime.fromtimestamp(now).hour, self.window):
+            return []
+        runs = []
+        for settings in self.due(now):
+            if self._stop.is_set():
+                break
+            if CONTROLLER.waiting_everywhere():
+                break  # Searches are queued for a browser: leave the rest to the next tick
+            try:
+                runs.append(self.warm(settings))
+            except Exception as exc:
+                logger.exception("Warming %r failed", settings.query)
+                runs.append(WarmRun(settings, 0, [str(exc)]))
+        return runs
+
+    def _loop(self, tick_s: float) -> None:
+        while not self._stop.is_set():
+            try:
+                runs = self.run_once()
+                if runs:
+                    logger.info("Warmed %d searches", len(runs))
+            except Exception:
+                logger.exception("Cache warmer tick failed")
+            self._stop.wait(tick_s)
+
+    def start(self, tick_s: float = TICK_S) -> None:
+        """Check for searches to warm every *tick_s* seconds on a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(tick_s,), name="cache-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,271 @@
+"""Version history of purchases and new/changed/unchanged classification.
+
+Every scraped row is fingerprinted by a hash of its content columns (title,
+price, publish date and status when present). The URL is left out: it
+depends on which source won the merge, not on the purchase. The hashes are kept in
+SQLite (``output/changes.sqlite``) with a version history per purchase key
+(:func:`core.merge.row_key`, i.e. the normalised purchase number): a new
+version is written whenever the content of a purchase differs from its
+latest version.
+
+"New" and "changed" are relative to a consumer, so classification is done
+per *scope* — a saved search profile, or a query and region searched in the
+UI. A row is ``new`` when the scope has never seen its purchase, ``changed``
+when the scope last saw different content and ``unchanged`` otherwise.
+Downstream stages (ranking, exports, e-mail) then process only
+:attr:`ChangeSet.fresh`.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import numbers
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from core.merge import row_key
+from core.metrics import inc
+from core.settings import OUTPUT_DIR
+
+CHANGES_PATH = OUTPUT_DIR / "changes.sqlite"
+HASH_COLUMNS = ("title", "price", "publish_date", "status")
+CHANGE_STATUSES = ("new", "changed", "unchanged")
+_LOOKUP_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchases (
+    purchase_key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    purchase_key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (purchase_key, version)
+);
+CREATE TABLE IF NOT EXISTS seen (
+    scope TEXT NOT NULL,
+    purchase_key TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (scope, purchase_key)
+);
+"""
+
+
+def _normalize(value):
+    """JSON-safe, formatting-insensitive form of a cell value."""
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return None if pd.isna(value) else value.isoformat()
+    if isinstance(value, numbers.Number):
+        return None if pd.isna(value) else round(float(value), 2)
+    if not isinstance(value, str) and pd.isna(value):
+        return None
+    return " ".join(str(value).split())
+
+
+def _content(row: dict) -> dict:
+    return {column: _normalize(row[column]) for column in HASH_COLUMNS if column in row}
+
+
+def content_hash(row: dict) -> str:
+    """Return the fingerprint of a row's content columns (see :data:`HASH_COLUMNS`)."""
+    payload = json.dumps(_content(row), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ChangeSet:
+    """Rows of one result set split by change status (each keeps a ``change`` column)."""
+
+    new: pd.DataFrame
+    changed: pd.DataFrame
+    unchanged: pd.DataFrame
+
+    @classmethod
+    def split(cls, df: pd.DataFrame, statuses: list[str]) -> "ChangeSet":
+        """Split *df* by *statuses*, one per row (as returned by :meth:`ChangeTracker.classify`)."""
+        labelled = df.assign(change=pd.Categorical(statuses, categories=CHANGE_STATUSES))
+        parts = {
+            status: labelled[labelled["change"] == status].reset_index(drop=True)
+            for status in CHANGE_STATUSES
+        }
+        return cls(parts["new"], parts["changed"], parts["unchanged"])
+
+    @property
+    def fresh(self) -> pd.DataFrame:
+        """New and changed rows, the ones downstream stages have to process."""
+        if self.changed.empty:
+            return self.new
+        if self.new.empty:
+            return self.changed
+        return pd.concat([self.new, self.changed], ignore_index=True)
+
+    def counts(self) -> dict[str, int]:
+        return {"new": len(self.new), "changed": len(self.changed), "unchanged": len(self.unchanged)}
+
+
+class ChangeTracker:
+    """Purchase version history and per-scope change detection in SQLite.
+
+    Safe to share between threads and processes: every operation opens its
+    own connection and runs in a single transaction; :meth:`record` takes
+    the write lock before it reads the latest versions.
+
+    Args:
+        path: Database file (defaults to ``output/changes.sqlite``).
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path) if path is not None else CHANGES_PATH
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """Yield a connection inside one transaction, committed on success.
+
+        With *write*, the transaction starts as ``BEGIN IMMEDIATE``: it holds
+        the database write lock from its first read, so two read-modify-writes
+        cannot both compute the same next version.
+        """
+        with self._lock:
+            if not self._initialized:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with closing(sqlite3.connect(self.path)) as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                self._initialized = True
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as conn:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    @staticmethod
+    def _lookup(conn: sqlite3.Connection, sql: str, keys: list[str], *params) -> dict[str, tuple]:
+        """Run *sql* (with a ``{keys}`` placeholder list) over *keys* in chunks."""
+        found = {}
+        for start in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[start : start + _LOOKUP_CHUNK]
+            query = sql.format(keys=", ".join("?" * len(chunk)))
+            for key, *values in conn.execute(query, (*params, *chunk)):
+                found[key] = tuple(values)
+        return found
+
+    @staticmethod
+    def _statuses(keys: list[str], hashes: list[str], seen: dict[str, tuple]) -> list[str]:
+        statuses = []
+        for key, digest in zip(keys, hashes):
+            if not key or key not in seen:
+                statuses.append("new")  # Rows without a key can never be matched
+            elif seen[key][0] != digest:
+                statuses.append("changed")
+            else:
+                statuses.append("unchanged")
+        return statuses
+
+    def _prepare(self, df: pd.DataFrame) -> tuple[list[dict], list[str], list[str]]:
+        rows = df.to_dict("records")
+        return rows, [row_key(row) for row in rows], [content_hash(row) for row in rows]
+
+    def classify(self, df: pd.DataFrame, scope: str = "") -> list[str]:
+        """Return the change status of every row of *df* for *scope*, without recording it."""
+        if df.empty:
+            return []
+        _, keys, hashes = self._prepare(df)
+        with self._connect() as conn:
+            seen = self._lookup(
+                conn,
+                "SELECT purchase_key, content_hash FROM seen WHERE scope = ? AND purchase_key IN ({keys})",
+                sorted({key for key in keys if key}),
+                scope,
+            )
+        return self._statuses(keys, hashes, seen)
+
+    def record(self, df: pd.DataFrame, scope: str = "", seen_at: float | None = None) -> ChangeSet:
+        """Classify *df* for *scope*, then store it as the scope's latest view.
+
+        Purchases whose content differs from their latest stored version get
+        a new version in the history.
+        """
+        if df.empty:
+            return ChangeSet.split(df, [])
+        seen_at = time.time() if seen_at is None else seen_at
+        rows, keys, hashes = self._prepare(df)
+        unique = sorted({key for key in keys if key})
+        with self._connect(write=True) as conn:
+            seen = self._lookup(
+                conn,
+                "SELECT purchase_key, content_hash FROM seen WHERE scope = ? AND purchase_key IN ({keys})",
+                unique,
+                scope,
+            )
+            latest = self._lookup(
+                conn,
+                "SELECT purchase_key, version, content_hash FROM purchases WHERE purchase_key IN ({keys})",
+                unique,
+            )
+            statuses = self._statuses(keys, hashes, seen)
+
+            versions, purchases = [], {}
+            for row, key, digest in zip(rows, keys, hashes):
+                if not key:
+                    continue
+                version, current = latest.get(key, (0, None))
+                if current != digest:
+                    version += 1
+                    latest[key] = (version, digest)
+                    versions.append(
+                        (key, version, digest, seen_at, json.dumps(_content(row), ensure_ascii=False))
+                    )
+                purchases[key] = (key, version, digest, seen_at, seen_at)
+            conn.executemany("INSERT INTO versions VALUES (?, ?, ?, ?, ?)", versions)
+            conn.executemany(
+                "INSERT INTO purchases VALUES (?, ?, ?, ?, ?) ON CONFLICT(purchase_key) DO UPDATE SET "
+                "version = excluded.version, content_hash = excluded.content_hash, "
+                "last_seen = excluded.last_seen",
+                purchases.values(),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO seen VALUES (?, ?, ?, ?)",
+                [(scope, key, digest, seen_at) for key, _, digest, _, _ in purchases.values()],
+            )
+
+        changes = ChangeSet.split(df, statuses)
+        for status, count in changes.counts().items():
+            inc("change_tracking_rows_total", count, status=status)
+        return changes
+
+    def history(self, purchase_number: str) -> list[dict]:
+        """Return every stored version of a purchase, oldest first."""
+        key = row_key({"purchase_number": purchase_number})
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT version, content_hash, seen_at, data FROM versions "
+                "WHERE purchase_key = ? ORDER BY version",
+                (key,),
+            ).fetchall()
+        return [
+            {"version": version, "content_hash": digest, "seen_at": seen_at, **json.loads(data)}
+            for version, digest, seen_at, data in rows
+        ]
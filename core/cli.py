@@ -0,0 +1,149 @@
+"""Command-line search runner.
+
+Runs the same pipeline as the UI without Streamlit and writes the results
+to a file. ``--network-mode record`` saves the portal traffic to HAR
+archives and ``--network-mode replay`` runs the search from them offline,
+which makes a scrape reproducible for debugging and benchmarking::
+
+    python -m core.cli "поставка бумаги" --network-mode record --har paper
+    python -m core.cli "поставка бумаги" --network-mode replay --har paper
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import sys
+from pathlib import Path
+
+from core.export_cache import EXPORT_FORMATS
+from core.export_excel import write_excel_stream
+from core.pipeline import run_search
+from core.settings import SearchSettings
+from core.sources.browser import NETWORK_MODES
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m core.cli", description="Поиск закупок на zakupki.gov.ru")
+    parser.add_argument("query", help="Поисковый запрос")
+    parser.add_argument("--region", default=SearchSettings.region)
+    parser.add_argument("--date-from", type=datetime.date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--date-to", type=datetime.date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--limit", type=int, default=SearchSettings.limit)
+    parser.add_argument("--no-docsearch", action="store_true", help="Не искать в docSearch")
+    parser.add_argument("--no-extended", action="store_true", help="Не искать в extendedsearch")
+    parser.add_argument(
+        "--near-duplicates", choices=("off", "mark", "collapse"), default=SearchSettings.near_duplicates
+    )
+    parser.add_argument("--ai", action="store_true", help="Включить AI-ранжирование")
+    parser.add_argument(
+        "--ai-top",
+        type=int,
+        default=SearchSettings.ai_top_k,
+        metavar="N",
+        help="Оставить N лучших по AI-оценке (0 — все)",
+    )
+    parser.add_argument(
+        "--ai-workers",
+        type=int,
+        default=SearchSettings.ai_workers,
+        help="Процессов для кодирования названий (по умолчанию AI_WORKERS или 1)",
+    )
+    parser.add_argument(
+        "--track-changes", action="store_true", help="Только новые и изменённые с прошлого поиска"
+    )
+    parser.add_argument(
+        "--documents", action="store_true", help="Скачать и проиндексировать документы закупок docSearch"
+    )
+    parser.add_argument(
+        "--use-cache",
+        type=float,
+        nargs="?",
+        const=SearchSettings.cache_max_age_h,
+        metavar="HOURS",
+        help="Взять результаты из кэша, если они не старше HOURS ч "
+        f"(по умолчанию {SearchSettings.cache_max_age_h:g})",
+    )
+    parser.add_argument("--network-mode", choices=NETWORK_MODES, default=SearchSettings.network_mode)
+    parser.add_argument("--har", default="", help="Набор HAR-архивов: подкаталог output/har")
+    parser.add_argument(
+        "--profile", action="store_true", help="Сохранить профиль поиска в output/profiles"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Файл результатов; формат по расширению: " + ", ".join(EXPORT_FORMATS),
+    )
+    return parser
+
+
+def settings_from_args(args: argparse.Namespace) -> SearchSettings:
+    """Translate parsed command-line arguments into :class:`SearchSettings`."""
+    return SearchSettings(
+        query=args.query,
+        region=args.region,
+        date_from=args.date_from,
+        date_to=args.date_to,
+        doc_search=not args.no_docsearch,
+        extended_search=not args.no_extended,
+        limit=args.limit,
+        near_duplicates=args.near_duplicates,
+        ai_ranking=args.ai,
+        ai_top_k=args.ai_top,
+        ai_workers=args.ai_workers,
+        track_changes=args.track_changes,
+        documents=args.documents,
+        use_cache=args.use_cache is not None,
+        cache_max_age_h=args.use_cache if args.use_cache is not None else SearchSettings.cache_max_age_h,
+        network_mode=args.network_mode,
+        har_path=args.har,
+        profile=args.profile,
+    )
+
+
+def write_results(results, output: Path | None) -> Path:
+    """Write *results* to *output* in the format given by its extension.
+
+    Raises:
+        RuntimeError: If the extension is not a known export format.
+    """
+    if output is None:
+        return write_excel_stream(results)
+    fmt = output.suffix.lstrip(".").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise RuntimeError(f"Неизвестный формат файла: {output.suffix or output.name}")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(EXPORT_FORMATS[fmt].build(results))
+    return output
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    settings = settings_from_args(args)
+    outcome = run_search(settings)
+    for error in outcome.errors:
+        print(f"Ошибка: {error}", file=sys.stderr)
+    if outcome.changes is not None:
+        counts = outcome.changes.counts()
+        print(
+            f"Новых: {counts['new']}, изменённых: {counts['changed']}, "
+            f"без изменений: {counts['unchanged']}"
+        )
+    if outcome.cached_at is not None:
+        print(f"Из кэша: данные от {datetime.datetime.fromtimestamp(outcome.cached_at):%d.%m.%Y %H:%M}")
+    if outcome.documents is not None:
+        stats = outcome.documents
+        print(
+            f"Документы: скачано {stats.downloaded} ({stats.bytes / 2**20:.1f} МБ), "
+            f"уже в индексе {stats.already_indexed}, дубликатов {stats.duplicates}"
+            + (" — лимит загрузки исчерпан" if stats.budget_exhausted else "")
+        )
+    if outcome.profile_path is not None:
+        print(f"Профиль: {outcome.profile_path}")
+    path = write_results(outcome.results, args.output)
+    print(f"Найдено: {len(outcome.results)}. Результаты: {path}")
+    return 1 if outcome.errors and outcome.results.empty else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
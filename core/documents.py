@@ -0,0 +1,537 @@
+"""Attachments of docSearch hits: download, text extraction and full-text index.
+
+docSearch matches purchases by the text of their attached documents, which
+the result cards do not show. :class:`DocumentFetcher` opens the documents
+page of every docSearch hit and downloads the attachments that are not
+indexed yet:
+
+* downloads run on a bounded thread pool through the egress pool
+  (:mod:`core.egress`), under a byte budget per run and a size cap per file;
+* attachments are deduplicated by a SHA-256 of their content, so a contract
+  template attached to a hundred purchases is extracted and stored once;
+* text is extracted from PDF, DOCX and XLSX in a process pool
+  (:func:`extract_text`);
+* everything goes into :class:`DocumentIndex`, an SQLite FTS5 store
+  (``output/documents.sqlite``). An attachment URL that is already indexed
+  is never fetched again.
+
+:func:`attach_document_text` then adds the indexed text of each purchase as
+a ``doc_text`` column, which :func:`core.ai_ranker.score_results` ranks on.
+
+PDF extraction needs ``pypdf``; without it PDFs are indexed as unsupported.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import multiprocessing
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Iterator
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.request import ProxyHandler, Request, build_opener
+from xml.etree import ElementTree
+
+import pandas as pd
+
+from core.egress import get_pool
+from core.merge import row_key
+from core.metrics import inc, span
+from core.profiling import active_profiler
+from core.settings import OUTPUT_DIR
+
+DOCUMENTS_PATH = OUTPUT_DIR / "documents.sqlite"
+DEFAULT_WORKERS = 4
+DEFAULT_EXTRACT_WORKERS = 2
+DEFAULT_MAX_BYTES = 200 * 2**20
+MAX_FILE_BYTES = 25 * 2**20
+MAX_PER_PURCHASE = 10
+MAX_TEXT_CHARS = 200_000  # stored per document
+DOC_TEXT_CHARS = 4_000  # per purchase, handed to the ranker
+REQUEST_TIMEOUT_S = 30
+CHUNK_BYTES = 64 * 1024
+DOC_TEXT_COLUMN = "doc_text"
+_LOOKUP_CHUNK = 500
+_ATTACHMENT_HINTS = ("/download/", "filestore", ".pdf", ".docx", ".xlsx")
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    kind TEXT,
+    size INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    error TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    url TEXT NOT NULL,
+    purchase_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (url, purchase_key)
+);
+CREATE INDEX IF NOT EXISTS attachments_purchase ON attachments (purchase_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    text, content='documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+
+# ---------------------------------------------------------------------------
+# Text extraction (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+
+def _docx_text(data: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as docx:
+        root = ElementTree.fromstring(docx.read("word/document.xml"))
+    paragraphs = ("".join(node.text or "" for node in p.iter(f"{_WORD_NS}t")) for p in root.iter(f"{_WORD_NS}p"))
+    return "\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def _xlsx_text(data: bytes) -> str:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    lines = []
+    try:
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows(values_only=True):
+                cells = [str(value) for value in row if value is not None]
+                if cells:
+                    lines.append(" ".join(cells))
+    finally:
+        workbook.close()
+    return "\n".join(lines)
+
+
+def _pdf_text(data: bytes) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("для PDF нужен пакет pypdf") from None
+    reader = PdfReader(io.BytesIO(data))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+_EXTRACTORS = {"pdf": _pdf_text, "docx": _docx_text, "xlsx": _xlsx_text}
+
+
+def document_kind(data: bytes) -> str | None:
+    """Detect ``pdf``, ``docx`` or ``xlsx`` from the file content (``None`` otherwise)."""
+    if data.startswith(b"%PDF"):
+        return "pdf"
+    if data.startswith(b"PK"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return None
+        if "word/document.xml" in names:
+            return "docx"
+        if "xl/workbook.xml" in names:
+            return "xlsx"
+    return None
+
+
+def extract_text(data: bytes) -> tuple[str | None, str, str | None]:
+    """Return ``(kind, text, error)`` for one document.
+
+    The text has its whitespace collapsed and is cut to :data:`MAX_TEXT_CHARS`.
+    Unsupported or broken files give an empty text and an error message.
+    """
+    kind = document_kind(data)
+    if kind is None:
+        return None, "", "неподдерживаемый формат"
+    try:
+        text = _EXTRACTORS[kind](data)
+    except Exception as exc:
+        return kind, "", f"{type(exc).__name__}: {exc}"
+    return kind, " ".join(text.split())[:MAX_TEXT_CHARS], None
+
+
+# ---------------------------------------------------------------------------
+# Full-text index
+# ---------------------------------------------------------------------------
+
+
+class DocumentIndex:
+    """Extracted attachment texts in SQLite with an FTS5 full-text index.
+
+    Documents are stored once per content hash; attachments map a download
+    URL and the purchase it is attached to onto a document (one URL may be
+    attached to several purchases).
+
+    Args:
+        path: Database file (defaults to ``output/documents.sqlite``).
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = Path(path) if path is not None else DOCUMENTS_PATH
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if not self._initialized:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with closing(sqlite3.connect(self.path)) as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                self._initialized = True
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:  # One transaction: committed on success, rolled back on error
+                yield conn
+
+    def _lookup(self, sql: str, values: list[str]) -> dict[str, str]:
+        """Run *sql* (with a ``{values}`` placeholder list) over *values* in chunks."""
+        found = {}
+        values = sorted(set(values))
+        with self._connect() as conn:
+            for start in range(0, len(values), _LOOKUP_CHUNK):
+                chunk = values[start : start + _LOOKUP_CHUNK]
+                found.update(conn.execute(sql.format(values=", ".join("?" * len(chunk))), chunk))
+        return found
+
+    def known_urls(self, urls: list[str]) -> dict[str, str]:
+        """Return the content hash of every attachment URL that is already indexed."""
+        return self._lookup("SELECT url, content_hash FROM attachments WHERE url IN ({values})", urls)
+
+    def known_hashes(self, hashes: list[str]) -> set[str]:
+        """Return the content hashes that are already indexed."""
+        return set(self._lookup("SELECT content_hash, id FROM documents WHERE content_hash IN ({values})", hashes))
+
+    def store(
+        self,
+        documents: list[tuple[str, str | None, int, str, str | None]],
+        attachments: list[tuple[str, str, str, str]],
+    ) -> None:
+        """Add documents ``(hash, kind, size, text, error)`` and attachments ``(url, key, name, hash)``."""
+        now = time.time()
+        with self._connect() as conn:
+            for content_hash, kind, size, text, error in documents:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO documents (content_hash, kind, size, text, error, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (content_hash, kind, size, text, error, now),
+                )
+                if cursor.rowcount:
+                    conn.execute("INSERT INTO documents_fts (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+            conn.executemany(
+                "INSERT OR REPLACE INTO attachments VALUES (?, ?, ?, ?, ?)",
+                [(*attachment, now) for attachment in attachments],
+            )
+
+    def texts(self, purchase_keys: list[str], max_chars: int = DOC_TEXT_CHARS) -> dict[str, tuple[int, str]]:
+        """Return ``(documents, text)`` per purchase key, the text cut to *max_chars*."""
+        keys = sorted({key for key in purchase_keys if key})
+        found: dict[str, tuple[int, list[str]]] = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start : start + _LOOKUP_CHUNK]
+                rows = conn.execute(
+                    "SELECT a.purchase_key, d.text FROM attachments a "
+                    "JOIN documents d ON d.content_hash = a.content_hash "
+                    f"WHERE a.purchase_key IN ({', '.join('?' * len(chunk))}) ORDER BY a.purchase_key, a.name",
+                    chunk,
+                )
+                for key, text in rows:
+                    count, parts = found.setdefault(key, (0, []))
+                    if text:
+                        parts.append(text)
+                    found[key] = (count + 1, parts)
+        return {key: (count, " ".join(parts)[:max_chars]) for key, (count, parts) in found.items()}
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        """Full-text search: attachments whose text contains every word of *query*."""
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " ".join(f'"{word}"' for word in words)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT a.purchase_key, a.name, a.url, "
+                "snippet(documents_fts, 0, '[', ']', '…', 12), bm25(documents_fts) AS rank "
+                "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                "JOIN attachments a ON a.content_hash = d.content_hash "
+                "WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [
+            {"purchase_key": key, "name": name, "url": url, "snippet": snippet, "rank": rank}
+            for key, name, url, snippet, rank in rows
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Download
+# ---------------------------------------------------------------------------
+
+
+def documents_page_url(purchase_url: str) -> str | None:
+    """URL of the documents tab of a purchase card (``.../view/documents.html?...``)."""
+    parts = urlsplit(purchase_url)
+    if "/view/" not in parts.path:
+        return None
+    path = re.sub(r"/view/[^/]+$", "/view/documents.html", parts.path)
+    return urlunsplit(parts._replace(path=path))
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self, base_url: str) -> None:
+        super().__init__()
+        self.base_url = base_url
+        self.links: dict[str, str] = {}
+        self._href: str | None = None
+        self._text: list[str] = []
+        self._title = ""
+
+    def handle_starttag(self, tag, attrs) -> None:
+        if tag != "a":
+            return
+        attributes = dict(attrs)
+        href = attributes.get("href") or ""
+        if any(hint in href.lower() for hint in _ATTACHMENT_HINTS):
+            self._href = urljoin(self.base_url, href)
+            self._text = []
+            self._title = attributes.get("title") or ""
+
+    def handle_data(self, data) -> None:
+        if self._href is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag) -> None:
+        if tag == "a" and self._href is not None:
+            name = self._title or " ".join(" ".join(self._text).split()) or self._href.rsplit("/", 1)[-1]
+            self.links.setdefault(self._href, name[:200])
+            self._href = None
+
+
+def attachment_links(html: str, page_url: str) -> list[tuple[str, str]]:
+    """Return ``(url, name)`` of the attachment links on a documents page."""
+    parser = _LinkParser(page_url)
+    parser.feed(html)
+    return list(parser.links.items())
+
+
+class _Budget:
+    """Bytes left for the downloads of one run, shared by the download threads."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.remaining = max_bytes
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def take(self, size: int) -> bool:
+        with self._lock:
+            if size > self.remaining:
+                self.exhausted = True
+                return False
+            self.remaining -= size
+            return True
+
+
+class _Skipped(Exception):
+    """A download given up on purpose (budget, size cap or stop)."""
+
+
+@dataclass
+class DocumentStats:
+    """What one :meth:`DocumentFetcher.fetch` call did."""
+
+    purchases: int = 0
+    attachments: int = 0
+    already_indexed: int = 0
+    downloaded: int = 0
+    bytes: int = 0
+    duplicates: int = 0
+    extracted: int = 0
+    failed: int = 0
+    budget_exhausted: bool = False
+
+
+class DocumentFetcher:
+    """Download, extract and index the attachments of docSearch hits.
+
+    Args:
+        index: Where texts are stored (the default ``output/documents.sqlite``).
+        workers: Concurrent HTTP requests.
+        extract_workers: Text extraction processes (``1`` extracts in-process).
+        max_bytes: Download budget of one :meth:`fetch` call.
+        max_file_bytes: Larger attachments are skipped.
+        max_per_purchase: Attachments taken from one documents page.
+        timeout_s: Timeout of each HTTP request.
+    """
+
+    def __init__(
+        self,
+        index: DocumentIndex | None = None,
+        workers: int = DEFAULT_WORKERS,
+        extract_workers: int = DEFAULT_EXTRACT_WORKERS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_file_bytes: int = MAX_FILE_BYTES,
+        max_per_purchase: int = MAX_PER_PURCHASE,
+        timeout_s: float = REQUEST_TIMEOUT_S,
+    ) -> None:
+        self.index = index or DocumentIndex()
+        self.workers = max(1, workers)
+        self.extract_workers = extract_workers
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.max_per_purchase = max_per_purchase
+        self.timeout_s = timeout_s
+
+    def _get(
+        self, url: str, stop: threading.Event | None, budget: _Budget | None = None, limit: int | None = None
+    ) -> bytes:
+        """GET *url* through a leased egress endpoint, enforcing *limit* and *budget*."""
+        with get_pool().lease(stop) as lease:
+            proxy = lease.endpoint.proxy
+            opener = build_opener(ProxyHandler({"http": proxy, "https": proxy} if proxy else {}))
+            request = Request(
+                url, headers={"User-Agent": lease.fingerprint.user_agent, "Accept-Language": lease.fingerprint.locale}
+            )
+            started = time.perf_counter()
+            try:
+                response = opener.open(request, timeout=self.timeout_s)
+            except HTTPError as exc:
+                lease.record_response(exc.code, time.perf_counter() - started)
+                raise
+            except OSError:
+                lease.record(False)
+                raise
+            with response:
+                lease.record_response(response.status, time.perf_counter() - started)
+                length = response.headers.get("Content-Length")
+                if limit is not None and length and int(length) > limit:
+                    raise _Skipped("file too large")
+                chunks, size = [], 0
+                while chunk := response.read(CHUNK_BYTES):
+                    size += len(chunk)
+                    if limit is not None and size > limit:
+                        raise _Skipped("file too large")
+                    if budget is not None and not budget.take(len(chunk)):
+                        raise _Skipped("budget exhausted")
+                    if stop is not None and stop.is_set():
+                        raise _Skipped("stopped")
+                    chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _links(self, page_url: str, stop: threading.Event | None) -> list[tuple[str, str]] | None:
+        try:
+            html = self._get(page_url, stop).decode("utf-8", errors="replace")
+        except Exception:
+            return None
+        return attachment_links(html, page_url)[: self.max_per_purchase]
+
+    def _download(self, url: str, budget: _Budget, stop: threading.Event | None) -> bytes | None:
+        if budget.exhausted or (stop is not None and stop.is_set()):
+            return None
+        try:
+            return self._get(url, stop, budget=budget, limit=self.max_file_bytes)
+        except Exception:
+            return None
+
+    def _extract(self, blobs: dict[str, bytes]) -> dict[str, tuple[str | None, str, str | None]]:
+        items = list(blobs.items())
+        with span("documents.extract"):
+            if self.extract_workers <= 1 or len(items) < 2:
+                results = [extract_text(data) for _, data in items]
+            else:
+                # spawn: the caller runs threads (sources, ranker), which fork does not mix with
+                context = multiprocessing.get_context("spawn")
+                workers = min(self.extract_workers, len(items))
+                try:
+                    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                        results = list(pool.map(extract_text, [data for _, data in items]))
+                except BrokenProcessPool:
+                    results = [extract_text(data) for _, data in items]
+        return {content_hash: result for (content_hash, _), result in zip(items, results)}
+
+    def fetch(self, df: pd.DataFrame, stop: threading.Event | None = None) -> DocumentStats:
+        """Index the attachments of the docSearch rows of *df* that are not indexed yet."""
+        stats = DocumentStats()
+        pages = {}
+        for row in df.to_dict("records"):
+            if "docSearch" not in str(row.get("source") or ""):
+                continue
+            key, page_url = row_key(row), documents_page_url(str(row.get("url") or ""))
+            if key and page_url:
+                pages[key] = page_url
+        stats.purchases = len(pages)
+        if not pages:
+            return stats
+
+        profiler = active_profiler()
+        with span("documents.fetch"), ThreadPoolExecutor(
+            self.workers,
+            thread_name_prefix="documents",
+            initializer=profiler.add_thread if profiler is not None else None,
+        ) as pool:
+            found = list(pool.map(lambda page_url: self._links(page_url, stop), pages.values()))
+            stats.failed += sum(links is None for links in found)
+            links = [
+                (url, key, name) for key, page_links in zip(pages, found) for url, name in page_links or []
+            ]
+            stats.attachments = len(links)
+            known = self.index.known_urls([url for url, _, _ in links])
+            stats.already_indexed = sum(url in known for url, _, _ in links)
+            # An attachment shared by several purchases is downloaded once
+            urls = list(dict.fromkeys(url for url, _, _ in links if url not in known))
+            budget = _Budget(self.max_bytes)
+            payloads = dict(zip(urls, pool.map(lambda url: self._download(url, budget, stop), urls)))
+        stats.budget_exhausted = budget.exhausted
+
+        downloaded = {url: data for url, data in payloads.items() if data is not None}
+        stats.downloaded = len(downloaded)
+        stats.failed += len(urls) - len(downloaded)
+        stats.bytes = sum(len(data) for data in downloaded.values())
+        hashes = {url: hashlib.sha256(data).hexdigest() for url, data in downloaded.items()}
+        indexed = self.index.known_hashes(list(hashes.values()))
+        new: dict[str, bytes] = {}
+        for url, content_hash in hashes.items():
+            if content_hash in indexed or content_hash in new:
+                stats.duplicates += 1
+            else:
+                new[content_hash] = downloaded[url]
+
+        extracted = self._extract(new)
+        stats.extracted = sum(error is None for _, _, error in extracted.values())
+        hashes.update(known)
+        self.index.store(
+            [
+                (content_hash, kind, len(new[content_hash]), text, error)
+                for content_hash, (kind, text, error) in extracted.items()
+            ],
+            [(url, key, name, hashes[url]) for url, key, name in links if url in hashes],
+        )
+        inc("documents_downloaded_total", stats.downloaded)
+        inc("documents_bytes_total", stats.bytes)
+        inc("documents_duplicates_total", stats.duplicates)
+        return stats
+
+
+def attach_document_text(df: pd.DataFrame, index: DocumentIndex | None = None) -> pd.DataFrame:
+    """Add ``documents`` (indexed attachments) and ``doc_text`` columns to *df*."""
+    index = index or DocumentIndex()
+    keys = [row_key(row) for row in df.to_dict("records")]
+    texts = index.texts(keys)
+    return df.assign(
+        documents=[texts.get(key, (0, ""))[0] for key in keys],
+        **{DOC_TEXT_COLUMN: [texts.get(key, (0, ""))[1] for key in keys]},
+    )
@@ -0,0 +1,321 @@
+"""Pool of egress endpoints (proxies) and browser fingerprints.
+
+Each browser context is leased an :class:`Endpoint` — a proxy, or the
+direct connection — plus a :class:`Fingerprint` (user agent, locale, time
+zone, viewport). A proxy serves at most ``max_concurrency`` contexts at
+once; the direct connection is left uncapped, so the number of contexts on
+it is bounded by admission control (:mod:`core.admission`) alone. Among the
+endpoints with room, the one with the best health score is chosen. A lease
+that has to wait reports its place in the line through ``on_wait``, like an
+admission slot does.
+
+Health is tracked per endpoint from every response of the contexts it
+serves: a moving average of latency and of the error rate, where failed
+requests and throttling replies (403, 429, 5xx) count as errors. An
+endpoint whose error rate crosses the threshold is taken out of rotation
+for a cool-down period and then tried again. When every endpoint is
+cooling down the least bad one is used rather than stopping the search.
+
+The pool is configured from the environment (see :func:`pool_from_env`):
+
+* ``EGRESS_PROXIES`` — comma-separated proxy URLs, ``direct`` for no proxy
+  (default: ``direct``);
+* ``EGRESS_USER_AGENTS`` — user agents separated by ``|``;
+* ``EGRESS_MAX_CONCURRENCY`` — contexts per proxy (default 2).
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+from urllib.parse import unquote, urlsplit
+
+from core.metrics import inc
+
+DEFAULT_USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
+)
+DEFAULT_VIEWPORTS = ((1366, 768), (1920, 1080), (1536, 864))
+DEFAULT_MAX_CONCURRENCY = 2
+ERROR_THRESHOLD = 0.5
+MIN_SAMPLES = 5
+COOLDOWN_S = 60.0
+EWMA_ALPHA = 0.2
+WAIT_POLL_S = 0.25
+THROTTLE_STATUSES = (403, 429)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Browser context identity presented to the portal."""
+
+    user_agent: str
+    locale: str = "ru-RU"
+    timezone_id: str = "Europe/Moscow"
+    viewport: tuple[int, int] = (1366, 768)
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """One egress route: a proxy URL, or ``None`` for the direct connection."""
+
+    name: str
+    proxy: str | None = None
+    max_concurrency: int | None = DEFAULT_MAX_CONCURRENCY  # None: uncapped
+
+    def proxy_options(self) -> dict | None:
+        """Return the Playwright ``proxy`` option (credentials taken from the URL)."""
+        if self.proxy is None:
+            return None
+        parts = urlsplit(self.proxy)
+        server = f"{parts.scheme}://{parts.hostname}"
+        if parts.port:
+            server += f":{parts.port}"
+        options = {"server": server}
+        if parts.username:
+            options["username"] = unquote(parts.username)
+            options["password"] = unquote(parts.password or "")
+        return options
+
+
+@dataclass
+class EndpointHealth:
+    """Moving health statistics of one endpoint."""
+
+    in_flight: int = 0
+    samples: int = 0
+    errors: int = 0
+    error_rate: float = 0.0  # moving average, 0..1
+    latency_s: float = 0.0  # moving average of time to first byte
+    cooldown_until: float = 0.0
+
+    def score(self) -> float:
+        """Lower is better: slow, failing and busy endpoints score higher."""
+        return (self.latency_s + 0.05) * (1 + 4 * self.error_rate) * (1 + self.in_flight)
+
+
+@dataclass
+class Lease:
+    """An endpoint and fingerprint assigned to one browser context."""
+
+    pool: "EgressPool"
+    endpoint: Endpoint
+    fingerprint: Fingerprint
+
+    def context_options(self) -> dict:
+        """Keyword arguments for ``browser.new_context``."""
+        width, height = self.fingerprint.viewport
+        options = {
+            "user_agent": self.fingerprint.user_agent,
+            "locale": self.fingerprint.locale,
+            "timezone_id": self.fingerprint.timezone_id,
+            "viewport": {"width": width, "height": height},
+        }
+        proxy = self.endpoint.proxy_options()
+        if proxy is not None:
+            options["proxy"] = proxy
+        elif self.pool.uses_proxies:
+            # The browser is launched with a placeholder proxy (see
+            # core.sources.browser); direct contexts must opt out of it explicitly
+            options["proxy"] = {"server": "direct://"}
+        return options
+
+    def record(self, ok: bool, latency_s: float | None = None) -> None:
+        self.pool.record(self.endpoint.name, ok, latency_s)
+
+    def record_response(self, status: int, latency_s: float | None = None) -> None:
+        """Record an HTTP response; throttling and server errors count as failures."""
+        self.record(status not in THROTTLE_STATUSES and status < 500, latency_s)
+
+
+class EgressPool:
+    """Assigns browser contexts to endpoints under per-endpoint caps.
+
+    Args:
+        endpoints: Available egress routes (at least one).
+        fingerprints: Context identities, handed out in rotation.
+        error_threshold: Error rate above which an endpoint is cooled down.
+        min_samples: Responses needed before an endpoint can be cooled down.
+        cooldown_s: How long a failing endpoint is left out of rotation.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        fingerprints: list[Fingerprint] | None = None,
+        error_threshold: float = ERROR_THRESHOLD,
+        min_samples: int = MIN_SAMPLES,
+        cooldown_s: float = COOLDOWN_S,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("EgressPool needs at least one endpoint")
+        self.endpoints = {endpoint.name: endpoint for endpoint in endpoints}
+        self.fingerprints = list(fingerprints or [Fingerprint(DEFAULT_USER_AGENTS[0])])
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.cooldown_s = cooldown_s
+        self._health = {name: EndpointHealth() for name in self.endpoints}
+        self._rotation = itertools.cycle(self.fingerprints)
+        self._cond = threading.Condition()
+        self._waiting: set[int] = set()
+        self._seq = itertools.count()
+
+    @property
+    def uses_proxies(self) -> bool:
+        return any(endpoint.proxy for endpoint in self.endpoints.values())
+
+    def _pick(self, now: float) -> Endpoint | None:
+        """Best endpoint with free capacity, preferring ones not cooling down (lock held)."""
+        free = [
+            name
+            for name, endpoint in self.endpoints.items()
+            if endpoint.max_concurrency is None or self._health[name].in_flight < endpoint.max_concurrency
+        ]
+        if not free:
+            return None
+        healthy = [name for name in free if self._health[name].cooldown_until <= now]
+        if healthy:
+            best = min(healthy, key=lambda name: self._health[name].score())
+        elif all(self._health[name].cooldown_until > now for name in self.endpoints):
+            # Everything is cooling down: degrade to the least failing route
+            best = min(free, key=lambda name: (self._health[name].error_rate, self._health[name].score()))
+        else:
+            return None  # A healthy endpoint exists but is busy; wait for it
+        return self.endpoints[best]
+
+    @contextmanager
+    def lease(
+        self,
+        stop: threading.Event | None = None,
+        on_wait: Callable[[int | None], None] | None = None,
+    ) -> Iterator[Lease]:
+        """Hold an endpoint and fingerprint for one browser context.
+
+        Args:
+            stop: Optional event that abandons the wait when set.
+            on_wait: Called with the place among the waiting leases while
+                every endpoint is busy and with ``None`` once one is granted.
+
+        Raises:
+            RuntimeError: If *stop* is set while every endpoint is busy.
+        """
+        ticket = next(self._seq)
+        with self._cond:
+            try:
+                while True:
+                    endpoint = self._pick(time.monotonic())
+                    if endpoint is not None:
+                        break
+                    if stop is not None and stop.is_set():
+                        raise RuntimeError("Поиск остановлен в ожидании свободного прокси.")
+                    self._waiting.add(ticket)
+                    if on_wait is not None:
+                        on_wait(1 + sum(1 for other in self._waiting if other < ticket))
+                    self._cond.wait(WAIT_POLL_S)
+            finally:
+                waited = ticket in self._waiting
+                self._waiting.discard(ticket)
+            self._health[endpoint.name].in_flight += 1
+            fingerprint = next(self._rotation)
+        if waited:
+            inc("egress_waits_total", endpoint=endpoint.name)
+            if on_wait is not None:
+                on_wait(None)
+        inc("egress_leases_total", endpoint=endpoint.name)
+        try:
+            yield Lease(self, endpoint, fingerprint)
+        finally:
+            with self._cond:
+                self._health[endpoint.name].in_flight -= 1
+                self._cond.notify_all()
+
+    def record(self, name: str, ok: bool, latency_s: float | None = None) -> None:
+        """Update the health of endpoint *name* with one request outcome."""
+        with self._cond:
+            health = self._health[name]
+            health.samples += 1
+            health.errors += int(not ok)
+            health.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - health.error_rate)
+            if latency_s is not None:
+                health.latency_s = (
+                    latency_s
+                    if health.samples == 1
+                    else health.latency_s + EWMA_ALPHA * (latency_s - health.latency_s)
+                )
+            now = time.monotonic()
+            if (
+                health.samples >= self.min_samples
+                and health.error_rate > self.error_threshold
+                and health.cooldown_until <= now
+            ):
+                health.cooldown_until = now + self.cooldown_s
+                # Start the next probe from the threshold, so one success is not enough
+                health.error_rate = self.error_threshold
+                inc("egress_ejections_total", endpoint=name)
+            self._cond.notify_all()
+        if not ok:
+            inc("egress_errors_total", endpoint=name)
+
+    def health(self) -> list[dict]:
+        """Return per-endpoint statistics for status pages."""
+        now = time.monotonic()
+        with self._cond:
+            return [
+                {
+                    "endpoint": name,
+                    "proxy": endpoint.proxy_options()["server"] if endpoint.proxy else "direct",
+                    "in_flight": self._health[name].in_flight,
+                    "max_concurrency": endpoint.max_concurrency,
+                    "samples": self._health[name].samples,
+                    "errors": self._health[name].errors,
+                    "error_rate": round(self._health[name].error_rate, 3),
+                    "latency_s": round(self._health[name].latency_s, 3),
+                    "cooling_down_s": round(max(0.0, self._health[name].cooldown_until - now), 1),
+                }
+                for name, endpoint in self.endpoints.items()
+            ]
+
+
+def pool_from_env(environ: dict | None = None) -> EgressPool:
+    """Build the pool from ``EGRESS_*`` variables (see the module docstring)."""
+    environ = os.environ if environ is None else environ
+    concurrency = int(environ.get("EGRESS_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+    proxies = [item.strip() for item in environ.get("EGRESS_PROXIES", "direct").split(",") if item.strip()]
+    endpoints = [
+        Endpoint(
+            name="direct" if proxy == "direct" else f"proxy{index}",
+            proxy=None if proxy == "direct" else proxy,
+            max_concurrency=None if proxy == "direct" else concurrency,
+        )
+        for index, proxy in enumerate(proxies or ["direct"], start=1)
+    ]
+    agents = [item.strip() for item in environ.get("EGRESS_USER_AGENTS", "").split("|") if item.strip()]
+    agents = agents or list(DEFAULT_USER_AGENTS)
+    fingerprints = [
+        Fingerprint(user_agent=agent, viewport=DEFAULT_VIEWPORTS[index % len(DEFAULT_VIEWPORTS)])
+        for index, agent in enumerate(agents)
+    ]
+    return EgressPool(endpoints, fingerprints)
+
+
+_pool: EgressPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> EgressPool:
+    """Return the process-wide pool, built from the environment on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool_from_env()
+        return _pool
@@ -2,20 +2,217 @@
 
 Credentials are accepted at call-time and are never persisted to disk.
 
-TODO: If you need to extend this module consider:
-  - Reading SMTP_LOGIN / SMTP_PASSWORD from environment variables via python-dotenv
-    as a fallback when no credentials are passed explicitly.
-  - Adding retry logic and proper error reporting back to the Streamlit UI.
+Messages can also be queued for background delivery over a reused
+connection, see :mod:`core.mail_queue`.
+
+The MIME message is written straight to a spooled temporary file, the
+attachments base64-encoded chunk by chunk, and streamed to the server, so a
+large export is never held in memory as one encoded string.
+
+Unattended runs (see :mod:`core.scheduler`) read ``SMTP_LOGIN`` /
+``SMTP_PASSWORD`` from the environment or a ``.env`` file instead.
 """
 
+from __future__ import annotations
+
+import base64
+import os
+import re
 import smtplib
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import tempfile
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email import policy
+from email.message import EmailMessage
+from typing import BinaryIO, Iterator, Sequence
 
 SMTP_HOST = "smtp.mail.ru"
 SMTP_PORT = 587
+SMTP_TIMEOUT_S = 30
+SPOOL_MAX_MEMORY = 1024 * 1024  # larger messages spill to a temporary file
+_B64_CHUNK = 57 * 1024  # raw bytes per chunk: a whole number of 76-character lines
+_SEND_CHUNK = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Attachment:
+    """A file attached to an outgoing e-mail."""
+
+    filename: str
+    data: bytes
+
+
+def parse_recipients(value: str | list[str]) -> list[str]:
+    """Split a comma/semicolon/space separated list of addresses."""
+    if isinstance(value, str):
+        value = re.split(r"[,;\s]+", value)
+    return [address.strip() for address in value if address and address.strip()]
+
+
+def smtp_credentials_from_env() -> tuple[str, str]:
+    """Return ``(login, password)`` from ``SMTP_LOGIN`` / ``SMTP_PASSWORD``.
+
+    A ``.env`` file in the working directory is loaded first when
+    python-dotenv is installed; variables already set take precedence.
+    """
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        pass
+    else:
+        load_dotenv()
+    return os.environ.get("SMTP_LOGIN", ""), os.environ.get("SMTP_PASSWORD", "")
+
+
+def _header_block(headers: list[tuple[str, str]]) -> bytes:
+    """Return RFC 5322-encoded header lines followed by the blank separator line."""
+    message = EmailMessage(policy=policy.SMTP)
+    for name, value in headers:
+        message[name] = value
+    # Folded one by one: flattening a multipart without parts would add a body
+    folded = [policy.SMTP.fold_binary(name, value) for name, value in message.items()]
+    return b"".join(folded) + b"\r\n"
+
+
+def _attachment_headers(filename: str) -> bytes:
+    message = EmailMessage(policy=policy.SMTP)
+    message["Content-Type"] = "application/octet-stream"
+    message.set_param("name", filename)
+    message["Content-Transfer-Encoding"] = "base64"
+    message.add_header("Content-Disposition", "attachment", filename=filename)
+    return _header_block(list(message.items()))
+
+
+def spool_message_body(
+    body: str, attachments: Sequence[Attachment] = ()
+) -> tuple[BinaryIO, str]:
+    """Write the multipart body of a message to a spooled temporary file.
+
+    Args:
+        body: Plain-text part of the message.
+        attachments: Files to attach.
+
+    Returns:
+        ``(spool, content_type)``: the CRLF-terminated body, rewound, and the
+        ``Content-Type`` header value (with boundary) that goes with it.
+    """
+    boundary = f"=_{uuid.uuid4().hex}"
+    delimiter = f"--{boundary}\r\n".encode("ascii")
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+
+    text = EmailMessage(policy=policy.SMTP)
+    text.set_content(body, cte="base64")
+    del text["MIME-Version"]
+    spool.write(delimiter)
+    spool.write(text.as_bytes())
+
+    for attachment in attachments:
+        spool.write(b"\r\n" + delimiter)
+        spool.write(_attachment_headers(attachment.filename))
+        view = memoryview(attachment.data)
+        for start in range(0, len(view), _B64_CHUNK):
+            spool.write(base64.encodebytes(view[start:start + _B64_CHUNK]).replace(b"\n", b"\r\n"))
+
+    spool.write(f"\r\n--{boundary}--\r\n".encode("ascii"))
+    spool.seek(0)
+    return spool, f'multipart/mixed; boundary="{boundary}"'
+
+
+def message_headers(
+    sender: str, recipients: list[str], subject: str, content_type: str
+) -> bytes:
+    """Return the top-level headers of a message built by :func:`spool_message_body`."""
+    return _header_block(
+        [
+            ("From", sender),
+            ("To", ", ".join(recipients)),
+            ("Subject", subject),
+            ("MIME-Version", "1.0"),
+            ("Content-Type", content_type),
+        ]
+    )
+
+
+def send_spooled(
+    server: smtplib.SMTP,
+    sender: str,
+    recipients: list[str],
+    headers: bytes,
+    body: BinaryIO,
+) -> dict[str, tuple[int, bytes]]:
+    """Send *headers* plus the spooled *body* without loading the body whole.
+
+    Mirrors :meth:`smtplib.SMTP.sendmail` but streams the ``DATA`` section
+    (with dot-stuffing) in fixed-size chunks. *body* is rewound first, so one
+    spool can be sent to several recipients.
+
+    Returns:
+        Recipients refused by the server, as in ``sendmail``.
+
+    Raises:
+        smtplib.SMTPException: On any SMTP-level error.
+    """
+    server.ehlo_or_helo_if_needed()
+    code, reply = server.mail(sender)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, reply, sender)
+
+    refused = {}
+    for recipient in recipients:
+        code, reply = server.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, reply)
+    if len(refused) == len(recipients):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, reply = server.docmd("DATA")
+    if code != 354:
+        server.rset()  # Leave the session ready for the next message on this connection
+        raise smtplib.SMTPDataError(code, reply)
+
+    body.seek(0)
+    buffer = bytearray(headers)
+    for line in body:
+        if line.startswith(b"."):
+            buffer += b"."
+        buffer += line
+        if len(buffer) >= _SEND_CHUNK:
+            server.send(bytes(buffer))
+            buffer.clear()
+    if not buffer.endswith(b"\r\n"):
+        buffer += b"\r\n"
+    server.send(bytes(buffer) + b".\r\n")
+
+    code, reply = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, reply)
+    return refused
+
+
+@contextmanager
+def smtp_connection(
+    smtp_login: str,
+    smtp_password: str,
+    host: str = SMTP_HOST,
+    port: int = SMTP_PORT,
+    starttls: bool = True,
+) -> Iterator[smtplib.SMTP]:
+    """Open an (optionally STARTTLS-secured) authenticated SMTP connection.
+
+    Login is skipped when no credentials are given, which is useful for local
+    SMTP stand-ins.
+    """
+    with smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT_S) as server:
+        server.ehlo()
+        if starttls:
+            server.starttls()
+            server.ehlo()
+        if smtp_login and smtp_password:
+            server.login(smtp_login, smtp_password)
+        yield server
 
 
 def send_email(
@@ -30,7 +227,7 @@ def send_email(
     """Send an e-mail with an Excel attachment via mail.ru SMTP.
 
     Args:
-        recipient: Destination e-mail address.
+        recipient: Destination e-mail address (several may be separated by commas).
         subject: E-mail subject line.
         body: Plain-text body of the message.
         attachment_bytes: Raw bytes of the file to attach.
@@ -41,25 +238,10 @@ def send_email(
     Raises:
         smtplib.SMTPException: On any SMTP-level error.
     """
-    msg = MIMEMultipart()
-    msg["From"] = smtp_login
-    msg["To"] = recipient
-    msg["Subject"] = subject
-
-    msg.attach(MIMEText(body, "plain", "utf-8"))
-
-    part = MIMEBase("application", "octet-stream")
-    part.set_payload(attachment_bytes)
-    encoders.encode_base64(part)
-    part.add_header(
-        "Content-Disposition",
-        f'attachment; filename="{attachment_filename}"',
+    recipients = parse_recipients(recipient)
+    spool, content_type = spool_message_body(
+        body, [Attachment(attachment_filename, attachment_bytes)]
     )
-    msg.attach(part)
-
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.ehlo()
-        server.starttls()
-        server.ehlo()
-        server.login(smtp_login, smtp_password)
-        server.sendmail(smtp_login, recipient, msg.as_string())
+    with spool, smtp_connection(smtp_login, smtp_password) as server:
+        headers = message_headers(smtp_login, recipients, subject, content_type)
+        send_spooled(server, smtp_login, recipients, headers, spool)
@@ -0,0 +1,146 @@
+"""Persistent cache of text embeddings, with an in-memory LRU in front.
+
+Encoding titles with a sentence-transformers model is the slow part of
+ranking, and popular searches rank the same titles again and again.
+:class:`EmbeddingCache` keeps every vector in SQLite
+(``output/embeddings.sqlite``), keyed by a hash of the encoder, the role
+(``query``/``passage``) and the text, so it survives restarts and is shared
+by the UI, the API and the scheduler (whose cache warmer fills it, see
+:mod:`core.cache_warmer`). The most recently used vectors are also kept in
+memory.
+
+:func:`core.ai_ranker.encode_cached` is the entry point used by the ranker.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from core.metrics import inc
+from core.settings import OUTPUT_DIR
+
+EMBEDDINGS_PATH = OUTPUT_DIR / "embeddings.sqlite"
+MEMORY_ENTRIES = 20_000
+MAX_ROWS = 500_000
+_LOOKUP_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    encoder TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created_at);
+"""
+
+
+class EmbeddingCache:
+    """Embeddings in SQLite behind a bounded in-memory LRU; safe to share between threads.
+
+    Args:
+        path: Database file (defaults to ``output/embeddings.sqlite``).
+        memory_entries: Vectors kept in memory.
+        max_rows: Vectors kept on disk; the oldest are dropped beyond it.
+    """
+
+    def __init__(
+        self, path: Path | None = None, memory_entries: int = MEMORY_ENTRIES, max_rows: int = MAX_ROWS
+    ) -> None:
+        self.path = Path(path) if path is not None else EMBEDDINGS_PATH
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if not self._initialized:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with closing(sqlite3.connect(self.path)) as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                self._initialized = True
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:  # One transaction: committed on success, rolled back on error
+                yield conn
+
+    @staticmethod
+    def _key(encoder: str, role: str, text: str) -> str:
+        return hashlib.sha1(f"{encoder}\0{role}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, encoder: str, role: str, texts: list[str]) -> dict[str, np.ndarray]:
+        """Return the cached vectors of *texts*, keyed by text (missing texts are left out)."""
+        keys = {self._key(encoder, role, text): text for text in set(texts)}
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for key, text in keys.items():
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[text] = vector
+        missing = [key for key, text in keys.items() if text not in found]
+        if missing:
+            with self._connect() as conn:
+                for start in range(0, len(missing), _LOOKUP_CHUNK):
+                    chunk = missing[start : start + _LOOKUP_CHUNK]
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[keys[key]] = vector
+                        self._remember(key, vector)
+        inc("embedding_cache_lookups_total", len(found), result="hit")
+        inc("embedding_cache_lookups_total", len(keys) - len(found), result="miss")
+        return found
+
+    def put_many(self, encoder: str, role: str, texts: list[str], vectors: np.ndarray) -> None:
+        """Store the vectors of *texts* (one row of *vectors* per text)."""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            key = self._key(encoder, role, text)
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((key, encoder, vector.tobytes(), now))
+            self._remember(key, vector)
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_rows:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY created_at LIMIT ?)",
+                    (count - self.max_rows,),
+                )
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,119 @@
+"""On-demand export generation memoised by a content hash of the results.
+
+The UI used to build every export format on each Streamlit rerun. Instead,
+each format is built only when requested and kept in a small per-session
+cache. Entries belong to one results fingerprint; when the results change
+the old entries are dropped, and the total cached size is bounded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+import pandas as pd
+
+from core.export_excel import (
+    to_arrow_bytes,
+    to_csv_bytes,
+    to_excel_bytes,
+    to_json_bytes,
+    to_ndjson_bytes,
+    to_parquet_bytes,
+    to_txt_bytes,
+)
+from core.metrics import inc
+
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    """How to build and offer one download format."""
+
+    label: str
+    file_name: str
+    mime: str
+    build: Callable[[pd.DataFrame], bytes]
+
+
+EXPORT_FORMATS: dict[str, ExportFormat] = {
+    "xlsx": ExportFormat(
+        label="Excel",
+        file_name="results.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        build=to_excel_bytes,
+    ),
+    "csv": ExportFormat("CSV", "results.csv", "text/csv", to_csv_bytes),
+    "txt": ExportFormat("TXT", "results.txt", "text/plain", to_txt_bytes),
+    "json": ExportFormat("JSON", "results.json", "application/json", to_json_bytes),
+    "ndjson": ExportFormat("NDJSON", "results.ndjson", "application/x-ndjson", to_ndjson_bytes),
+    "parquet": ExportFormat(
+        "Parquet", "results.parquet", "application/vnd.apache.parquet", to_parquet_bytes
+    ),
+    "arrow": ExportFormat(
+        "Arrow IPC", "results.arrow", "application/vnd.apache.arrow.file", to_arrow_bytes
+    ),
+}
+
+
+def results_fingerprint(df: pd.DataFrame) -> str:
+    """Return a content hash of *df* (values and column names)."""
+    digest = hashlib.sha1()
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """Bounded memo of export bytes for the current results.
+
+    Args:
+        max_bytes: Upper bound on the total size of cached exports; the least
+            recently used formats are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._fingerprint: str | None = None
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _switch(self, fingerprint: str) -> None:
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+    def peek(self, fingerprint: str, fmt: str) -> bytes | None:
+        """Return cached bytes for *fmt* without building them."""
+        with self._lock:
+            if fingerprint != self._fingerprint or fmt not in self._entries:
+                return None
+            self._entries.move_to_end(fmt)
+            return self._entries[fmt]
+
+    def get(self, df: pd.DataFrame, fmt: str, fingerprint: str | None = None) -> bytes:
+        """Return export bytes for *fmt*, building and caching them if needed.
+
+        Args:
+            df: The results to export.
+            fmt: Key of :data:`EXPORT_FORMATS`.
+            fingerprint: Precomputed :func:`results_fingerprint` of *df*.
+        """
+        fingerprint = fingerprint or results_fingerprint(df)
+        cached = self.peek(fingerprint, fmt)
+        inc("cache_requests_total", cache="export", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+        data = EXPORT_FORMATS[fmt].build(df)
+        with self._lock:
+            self._switch(fingerprint)
+            self._entries[fmt] = data
+            while len(self._entries) > 1 and sum(map(len, self._entries.values())) > self.max_bytes:
+                self._entries.popitem(last=False)
+        return data
@@ -1,9 +1,232 @@
-"""Export a DataFrame to an Excel file (XLSX) as bytes."""
+"""Export a DataFrame to an Excel file (XLSX) and other formats as bytes.
 
+Besides XLSX, results can be written as CSV, TXT, JSON, NDJSON, Parquet and
+Arrow IPC. The writers consume row chunks, so export memory stays bounded by
+the chunk size instead of growing with the number of rows. Text formats can
+be gzip- or zstd-compressed on the fly.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime
+import gzip
 import io
-import json
+import pickle
+import queue
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
 
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from pandas.api.types import is_datetime64_any_dtype
+
+from core.metrics import inc, timed
+from core.schema import arrow_schema, to_schema
+from core.settings import OUTPUT_DIR
+
+SHEET_NAME = "Результаты"
+CHUNK_ROWS = 10_000
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+# Column widths (in characters) and number formats applied to known columns
+COLUMN_WIDTHS = {
+    "purchase_number": 22,
+    "title": 80,
+    "url": 50,
+    "price": 18,
+    "publish_date": 14,
+    "source": 16,
+    "ai_score": 10,
+    "documents": 12,
+}
+DEFAULT_COLUMN_WIDTH = 16
+NUMBER_FORMATS = {
+    "price": "#,##0.00",
+    "publish_date": "DD.MM.YYYY",
+    "ai_score": "0.000",
+}
+
+
+def iter_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield consecutive row slices of *df* (views, not copies)."""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _as_chunks(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    chunk_rows: int,
+) -> Iterable[pd.DataFrame]:
+    if isinstance(chunks, pd.DataFrame):
+        return iter_chunks(chunks, chunk_rows) if len(chunks) else iter([chunks])
+    return chunks
+
+
+def _resolve_target(target: str | Path | BinaryIO | None, extension: str) -> Path | BinaryIO:
+    """Turn *target* into a path (creating parents) or return the stream as is."""
+    if target is None:
+        # The random suffix keeps exports started within the same second apart
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        target = OUTPUT_DIR / f"results_{stamp}_{uuid.uuid4().hex[:8]}.{extension}"
+    if isinstance(target, (str, Path)):
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+    return target
+
+
+class _KeepOpen:
+    """Write-through proxy whose ``close`` leaves the caller's stream open."""
+
+    closed = False
+
+    def __init__(self, raw: BinaryIO) -> None:
+        self._raw = raw
+
+    def write(self, data) -> int:
+        return self._raw.write(data)
+
+    def flush(self) -> None:
+        self._raw.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+
+@contextlib.contextmanager
+def _open_output(target: Path | BinaryIO, compression: str = "none") -> Iterator[BinaryIO]:
+    """Open *target* for binary writing, compressing with gzip or zstd."""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Неизвестное сжатие: {compression}. Доступно: {', '.join(COMPRESSIONS)}")
+    with contextlib.ExitStack() as stack:
+        raw = stack.enter_context(target.open("wb")) if isinstance(target, Path) else target
+        if compression == "gzip":
+            yield stack.enter_context(gzip.GzipFile(fileobj=raw, mode="wb"))
+        elif compression == "zstd":
+            import pyarrow as pa
+
+            stream = pa.CompressedOutputStream(pa.PythonFile(_KeepOpen(raw), mode="w"), "zstd")
+            try:
+                yield stream
+            finally:
+                stream.close()  # Writes the final zstd frame
+        else:
+            yield raw
+
+
+def _cell_columns(chunk: pd.DataFrame) -> list[list]:
+    """Convert *chunk* to per-column Python values accepted by openpyxl."""
+    columns = []
+    for name in chunk.columns:
+        series = chunk[name]
+        if is_datetime64_any_dtype(series.dtype):
+            values = [
+                None if pd.isna(value) else value.to_pydatetime()
+                for value in series
+            ]
+        else:
+            values = series.astype("object").where(series.notna(), None).tolist()
+        columns.append(values)
+    return columns
+
+
+def _compression_suffix(compression: str) -> str:
+    return {"gzip": ".gz", "zstd": ".zst"}.get(compression, "")
+
+
+def _text_column(series: pd.Series) -> pd.Series:
+    if is_datetime64_any_dtype(series.dtype):
+        return series.dt.strftime("%Y-%m-%d").astype("object").fillna("").astype(str)
+    return series.astype("object").where(series.notna(), "").astype(str)
+
+
+def _arrow_batches(chunks: Iterable[pd.DataFrame]):
+    """Yield ``(schema, table)`` pairs with the schema fixed by the first chunk.
+
+    The schema comes from :func:`core.schema.arrow_schema`, so known columns
+    keep their type even when they are all empty in the first chunk. Without
+    any chunk, a single empty table with the schema columns is yielded, so
+    the writers still produce a valid file.
+    """
+    import pyarrow as pa
+
+    schema = None
+    for chunk in chunks:
+        # Categories differ between chunks, so write them as plain strings
+        chunk = chunk.astype(
+            {name: "string" for name, dtype in chunk.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+        )
+        if schema is None:
+            schema = arrow_schema(chunk)
+        yield schema, pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+    if schema is None:
+        schema = arrow_schema(to_schema(pd.DataFrame()))
+        yield schema, schema.empty_table()
+
+
+def _to_bytes(writer, df: pd.DataFrame, fmt: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    writer(df, buffer, **kwargs)
+    inc("export_bytes_total", buffer.tell(), format=fmt)
+    return buffer.getvalue()
+
+
+@timed("export.write", format="xlsx")
+def write_excel_stream(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    target: str | Path | BinaryIO | None = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Path | BinaryIO:
+    """Write result rows to an XLSX workbook in constant memory.
+
+    Rows are appended chunk by chunk to a write-only openpyxl worksheet, so
+    memory use does not grow with the number of rows.
+
+    Args:
+        chunks: A DataFrame (written in slices of *chunk_rows*) or any
+            iterable of DataFrames with the same columns.
+        target: File path, writable binary stream, or ``None`` to create a
+            uniquely named file under ``output/``.
+        chunk_rows: Slice size used when *chunks* is a single DataFrame.
+
+    Returns:
+        The path written to, or *target* itself when it is a stream.
+    """
+    chunks = _as_chunks(chunks, chunk_rows)
+    target = _resolve_target(target, "xlsx")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(SHEET_NAME)
+    header: list[str] | None = None
+
+    for chunk in chunks:
+        if header is None:
+            header = [str(column) for column in chunk.columns]
+            for index, name in enumerate(header):
+                sheet.column_dimensions[get_column_letter(index + 1)].width = COLUMN_WIDTHS.get(
+                    name, DEFAULT_COLUMN_WIDTH
+                )
+            sheet.append(header)
+        formats = [NUMBER_FORMATS.get(name) for name in header]
+        columns = _cell_columns(chunk)
+        for values in zip(*columns):
+            row = []
+            for value, number_format in zip(values, formats):
+                if number_format and value is not None:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.number_format = number_format
+                    row.append(cell)
+                else:
+                    row.append(value)
+            sheet.append(row)
+
+    workbook.save(target)
+    return target
 
 
 def to_excel_bytes(df: pd.DataFrame) -> bytes:
@@ -16,25 +239,326 @@ def to_excel_bytes(df: pd.DataFrame) -> bytes:
         XLSX file content as :class:`bytes`, suitable for writing to disk or
         attaching to an e-mail.
     """
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Результаты")
-    return buffer.getvalue()
+    return _to_bytes(write_excel_stream, df, "xlsx")
+
+
+@timed("export.write", format="csv")
+def write_csv(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    target: str | Path | BinaryIO | None = None,
+    compression: str = "none",
+    chunk_rows: int = CHUNK_ROWS,
+) -> Path | BinaryIO:
+    """Write rows as CSV (UTF-8 with BOM), serialising chunk by chunk."""
+    target = _resolve_target(target, "csv" + _compression_suffix(compression))
+    with _open_output(target, compression) as out:
+        out.write("\ufeff".encode("utf-8"))
+        header = True
+        for chunk in _as_chunks(chunks, chunk_rows):
+            out.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+            header = False
+    return target
+
+
+@timed("export.write", format="json")
+def write_json(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    target: str | Path | BinaryIO | None = None,
+    compression: str = "none",
+    chunk_rows: int = CHUNK_ROWS,
+) -> Path | BinaryIO:
+    """Write rows as one JSON array, serialising chunk by chunk.
+
+    Arguments are as in :func:`write_excel_stream`; *compression* is one of
+    :data:`COMPRESSIONS`.
+    """
+    target = _resolve_target(target, "json" + _compression_suffix(compression))
+    with _open_output(target, compression) as out:
+        out.write(b"[")
+        first = True
+        for chunk in _as_chunks(chunks, chunk_rows):
+            if chunk.empty:
+                continue
+            records = chunk.to_json(
+                orient="records", force_ascii=False, date_format="iso", indent=2
+            ).strip()[1:-1].strip()
+            out.write(("\n  " if first else ",\n  ").encode("utf-8"))
+            out.write(records.encode("utf-8"))
+            first = False
+        out.write(b"]" if first else b"\n]")
+    return target
+
+
+@timed("export.write", format="ndjson")
+def write_ndjson(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    target: str | Path | BinaryIO | None = None,
+    compression: str = "none",
+    chunk_rows: int = CHUNK_ROWS,
+) -> Path | BinaryIO:
+    """Write rows as newline-delimited JSON (one object per line)."""
+    target = _resolve_target(target, "ndjson" + _compression_suffix(compression))
+    with _open_output(target, compression) as out:
+        for chunk in _as_chunks(chunks, chunk_rows):
+            if chunk.empty:
+                continue
+            lines = chunk.to_json(
+                orient="records", lines=True, force_ascii=False, date_format="iso"
+            )
+            out.write(lines.encode("utf-8"))
+            if not lines.endswith("\n"):
+                out.write(b"\n")
+    return target
+
+
+@contextlib.contextmanager
+def _two_passes(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    chunk_rows: int,
+) -> Iterator[tuple[Iterable[pd.DataFrame], Iterable[pd.DataFrame]]]:
+    """Yield two iterables over the same chunks, for writers that read them twice.
+
+    One-shot iterators are spooled chunk by chunk to a temporary file during
+    the first pass and read back from it in the second.
+    """
+    if isinstance(chunks, pd.DataFrame) or iter(chunks) is not chunks:
+        yield _as_chunks(chunks, chunk_rows), _as_chunks(chunks, chunk_rows)
+        return
+    with tempfile.TemporaryFile() as spool:
+
+        def first() -> Iterator[pd.DataFrame]:
+            for chunk in chunks:
+                pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                yield chunk
+
+        def second() -> Iterator[pd.DataFrame]:
+            spool.seek(0)
+            while True:
+                try:
+                    yield pickle.load(spool)
+                except EOFError:
+                    return
+
+        yield first(), second()
+
+
+@timed("export.write", format="txt")
+def write_txt(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    target: str | Path | BinaryIO | None = None,
+    compression: str = "none",
+    chunk_rows: int = CHUNK_ROWS,
+) -> Path | BinaryIO:
+    """Write rows as a right-aligned plain-text table, chunk by chunk.
+
+    A first pass over the chunks computes the column widths and a second one
+    formats and writes them, so only one chunk at a time is held as text.
+    """
+    target = _resolve_target(target, "txt" + _compression_suffix(compression))
+    with _two_passes(chunks, chunk_rows) as (first, second), _open_output(target, compression) as out:
+        widths: dict = {}
+        for chunk in first:
+            for column in chunk.columns:
+                lengths = _text_column(chunk[column]).str.len()
+                longest = int(lengths.max()) if len(lengths) else 0
+                widths[column] = max(widths.get(column, len(str(column))), longest)
+        if not widths:
+            return target
+        columns = list(widths)
+        out.write(" ".join(str(column).rjust(widths[column]) for column in columns).encode("utf-8"))
+        for chunk in second:
+            if chunk.empty:
+                continue
+            padded = [_text_column(chunk[column]).str.rjust(widths[column]) for column in columns]
+            lines = padded[0].str.cat(padded[1:], sep=" ") if len(padded) > 1 else padded[0]
+            out.write(("\n" + "\n".join(lines.tolist())).encode("utf-8"))
+    return target
+
+
+@timed("export.write", format="parquet")
+def write_parquet(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    target: str | Path | BinaryIO | None = None,
+    compression: str = "zstd",
+    chunk_rows: int = CHUNK_ROWS,
+) -> Path | BinaryIO:
+    """Write rows to a Parquet file, one row group per chunk (requires pyarrow)."""
+    import pyarrow.parquet as pq
+
+    target = _resolve_target(target, "parquet")
+    writer = None
+    try:
+        for schema, table in _arrow_batches(_as_chunks(chunks, chunk_rows)):
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    str(target) if isinstance(target, Path) else target,
+                    schema,
+                    compression=compression,
+                )
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return target
+
+
+@timed("export.write", format="arrow")
+def write_arrow_ipc(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    target: str | Path | BinaryIO | None = None,
+    compression: str = "zstd",
+    chunk_rows: int = CHUNK_ROWS,
+) -> Path | BinaryIO:
+    """Write rows to an Arrow IPC file, one record batch per chunk.
+
+    Arrow IPC compresses buffers itself and only supports ``zstd`` (or
+    ``none``) here.
+    """
+    import pyarrow as pa
+
+    if compression not in ("none", "zstd"):
+        raise ValueError("Arrow IPC поддерживает только сжатие zstd")
+    target = _resolve_target(target, "arrow")
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+    with _open_output(target) as out:
+        writer = None
+        try:
+            for schema, table in _arrow_batches(_as_chunks(chunks, chunk_rows)):
+                if writer is None:
+                    writer = pa.ipc.new_file(out, schema, options=options)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    return target
 
 
 def to_csv_bytes(df: pd.DataFrame) -> bytes:
     """Serialize *df* to CSV (UTF-8 with BOM) and return bytes."""
-    csv_text = df.to_csv(index=False)
-    return csv_text.encode("utf-8-sig")
+    return _to_bytes(write_csv, df, "csv")
 
 
 def to_txt_bytes(df: pd.DataFrame) -> bytes:
     """Serialize *df* to plain text table and return bytes."""
-    txt = df.to_string(index=False)
-    return txt.encode("utf-8")
+    return _to_bytes(write_txt, df, "txt")
 
 
 def to_json_bytes(df: pd.DataFrame) -> bytes:
     """Serialize *df* to JSON and return bytes."""
-    payload = df.to_dict(orient="records")
-    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+    return _to_bytes(write_json, df, "json")
+
+
+def to_ndjson_bytes(df: pd.DataFrame, compression: str = "none") -> bytes:
+    """Serialize *df* to newline-delimited JSON and return bytes."""
+    return _to_bytes(write_ndjson, df, "ndjson", compression=compression)
+
+
+def to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    """Serialize *df* to zstd-compressed Parquet and return bytes."""
+    return _to_bytes(write_parquet, df, "parquet")
+
+
+def to_arrow_bytes(df: pd.DataFrame) -> bytes:
+    """Serialize *df* to a zstd-compressed Arrow IPC file and return bytes."""
+    return _to_bytes(write_arrow_ipc, df, "arrow")
+
+
+# Formats that can be written from a stream of chunks (TXT spools the chunks
+# to disk for its two passes, so it streams too)
+STREAM_WRITERS = {
+    "xlsx": write_excel_stream,
+    "csv": write_csv,
+    "txt": write_txt,
+    "json": write_json,
+    "ndjson": write_ndjson,
+    "parquet": write_parquet,
+    "arrow": write_arrow_ipc,
+}
+STREAM_BLOCK_BYTES = 256 * 1024
+
+
+class _Pipe:
+    """Write-only file handing blocks of output to a bounded queue."""
+
+    closed = False
+
+    def __init__(self, blocks: queue.Queue, cancelled: threading.Event) -> None:
+        self._blocks = blocks
+        self._cancelled = cancelled
+        self._buffer = bytearray()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self.size += len(data)
+        if len(self._buffer) >= STREAM_BLOCK_BYTES:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def put(self, item) -> None:
+        while True:
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancelled.is_set():
+                    raise BrokenPipeError("export stream closed by the reader")
+
+
+def stream_export(
+    chunks: pd.DataFrame | Iterable[pd.DataFrame],
+    fmt: str,
+    chunk_rows: int = CHUNK_ROWS,
+    max_blocks: int = 8,
+) -> Iterator[bytes]:
+    """Yield an export in blocks while it is being written.
+
+    The writer of *fmt* runs on a helper thread and at most *max_blocks*
+    blocks of :data:`STREAM_BLOCK_BYTES` are buffered, so a download can
+    start before the export is complete and memory stays bounded. Closing
+    the generator early stops the writer.
+
+    Raises:
+        KeyError: If *fmt* is not in :data:`STREAM_WRITERS`.
+    """
+    writer = STREAM_WRITERS[fmt]
+    blocks: queue.Queue = queue.Queue(maxsize=max_blocks)
+    cancelled = threading.Event()
+    pipe = _Pipe(blocks, cancelled)
+    done = object()
+    errors: list[BaseException] = []
+
+    def produce() -> None:
+        try:
+            writer(_as_chunks(chunks, chunk_rows), pipe)
+            pipe.flush()
+            inc("export_bytes_total", pipe.size, format=fmt)
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            try:
+                pipe.put(done)
+            except BrokenPipeError:
+                pass
+
+    thread = threading.Thread(target=produce, name=f"export-{fmt}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            block = blocks.get()
+            if block is done:
+                break
+            yield block
+    finally:
+        cancelled.set()
+        thread.join()
+    if errors and not isinstance(errors[0], BrokenPipeError):
+        raise errors[0]
@@ -0,0 +1,79 @@
+"""Advisory lock files for stores shared by several processes.
+
+The UI, the API and the scheduler run as separate processes (separate
+containers in ``docker-compose.yml``) on the same ``output/`` volume. Stores
+that append to or rewrite plain files there hold :func:`file_lock` around
+every read-modify-write. The lock is per open file, so it also serialises
+threads of one process, but it is not reentrant: never nest it for the same
+path.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path: Path | str) -> Iterator[None]:
+    """Hold an exclusive lock on *path* (created if missing) for the duration of the block."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def try_lock(path: Path | str) -> BinaryIO | None:
+    """Lock *path* (created if missing) without waiting.
+
+    Returns the open file that holds the lock, to be passed to :func:`unlock`,
+    or ``None`` if someone else holds it. The operating system drops the lock
+    when the holding process dies, so a crash never leaves it taken.
+
+    Raises:
+        OSError: If the lock file cannot be created or opened.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fh = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+
+def unlock(fh: BinaryIO) -> None:
+    """Release a lock taken with :func:`try_lock`."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        fh.close()
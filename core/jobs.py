@@ -0,0 +1,231 @@
+"""Search runs as background jobs with progress, cancellation and deadlines.
+
+The UI used to run the whole pipeline inline in the Streamlit script, so a
+long scrape could neither be interrupted nor survive a widget change.
+:class:`JobManager` runs :func:`core.pipeline.run_search` on a small thread
+pool and hands out a job id; the UI polls :meth:`JobManager.status` for
+the current stage and the number of pages and rows scraped.
+
+Each job owns a stop event. :meth:`JobManager.cancel` sets it, and so does
+the job's deadline: the browser then aborts its pending requests, the
+sources return what they have, and the partial rows are merged and ranked
+as usual. A job stopped by its deadline ends as ``timed_out`` with those
+partial results.
+
+Given a :class:`~core.result_store.ResultStore`, the manager writes each
+job's rows to it and keeps only the run id (:attr:`SearchJob.run_id`), so
+finished jobs hold no result rows in memory.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+
+from core.admission import request_context
+from core.pipeline import SearchOutcome, SearchProgress, run_search
+from core.result_store import ResultStore
+from core.settings import SearchSettings
+from core.sources.browser import keep_browser_warm
+
+DEFAULT_WORKERS = 2
+DEFAULT_DEADLINE_S = 300.0
+MAX_FINISHED_JOBS = 20
+
+
+@dataclass
+class SearchJob:
+    """Status of one background search."""
+
+    job_id: str
+    query: str
+    user: str = ""
+    priority: str = "interactive"  # admission lane, see core.admission
+    status: str = "queued"  # "queued" | "running" | "done" | "cancelled" | "timed_out" | "failed"
+    progress: SearchProgress = field(default_factory=SearchProgress)
+    outcome: SearchOutcome | None = None
+    run_id: str | None = None  # set when the manager has a result store
+    error: str = ""
+    deadline_s: float | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "timed_out", "failed")
+
+    @property
+    def elapsed_s(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+@dataclass
+class _Entry:
+    job: SearchJob
+    settings: SearchSettings | None
+    stop: threading.Event = field(default_factory=threading.Event)
+    done: threading.Event = field(default_factory=threading.Event)
+    timed_out: bool = False
+    future: Future | None = None
+
+
+class JobManager:
+    """Runs searches on a bounded pool of background threads.
+
+    Args:
+        workers: Maximum number of searches running at the same time.
+        deadline_s: Default time limit of a running job (``None`` for none).
+        max_finished: How many finished jobs (with their results) are kept.
+        warm_browsers: Keep one Chromium process per worker thread between
+            jobs instead of launching a browser for every search.
+        result_store: Where finished results are written (kept in memory
+            in :attr:`SearchJob.outcome` when ``None``).
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        deadline_s: float | None = DEFAULT_DEADLINE_S,
+        max_finished: int = MAX_FINISHED_JOBS,
+        warm_browsers: bool = True,
+        result_store: ResultStore | None = None,
+    ) -> None:
+        self.deadline_s = deadline_s
+        self.max_finished = max_finished
+        self.result_store = result_store
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, workers),
+            thread_name_prefix="search",
+            initializer=keep_browser_warm if warm_browsers else None,
+        )
+        self._entries: dict[str, _Entry] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        settings: SearchSettings,
+        deadline_s: float | None = None,
+        user: str = "",
+        priority: str = "interactive",
+    ) -> str:
+        """Queue a search and return its job id.
+
+        Args:
+            settings: Parameters of the search.
+            deadline_s: Time limit for this job; defaults to the manager's.
+            user: Who runs the search, for the per-user browser limit.
+            priority: ``"interactive"`` or ``"batch"`` admission lane.
+        """
+        job = SearchJob(
+            job_id=f"search-{next(self._ids)}",
+            query=settings.query,
+            user=user,
+            priority=priority,
+            deadline_s=deadline_s if deadline_s is not None else self.deadline_s,
+        )
+        entry = _Entry(job, settings)
+        with self._lock:
+            self._prune()
+            self._entries[job.job_id] = entry
+        entry.future = self._pool.submit(self._run, entry)
+        return job.job_id
+
+    def status(self, job_id: str) -> SearchJob:
+        """Return a snapshot of the job's status and progress."""
+        with self._lock:
+            job = self._entries[job_id].job
+            return replace(job, progress=replace(job.progress))
+
+    def wait(self, job_id: str, timeout: float | None = None) -> SearchJob:
+        """Block until the job finishes (or *timeout* expires) and return its status."""
+        self._entries[job_id].done.wait(timeout)
+        return self.status(job_id)
+
+    def forget(self, job_id: str) -> None:
+        """Drop a finished job and its results once the caller has collected them."""
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is not None and entry.job.finished:
+                del self._entries[job_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop the job; returns ``False`` if it had already finished."""
+        entry = self._entries[job_id]
+        if entry.job.finished:
+            return False
+        entry.stop.set()
+        if entry.future is not None and entry.future.cancel():
+            self._finish(entry, "cancelled")
+        return True
+
+    def close(self) -> None:
+        """Cancel every unfinished job and release the worker threads."""
+        for job_id in list(self._entries):
+            self.cancel(job_id)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self) -> None:
+        finished = [entry for entry in self._entries.values() if entry.job.finished]
+        finished.sort(key=lambda entry: entry.job.finished_at or 0.0)
+        for entry in finished[: max(0, len(finished) - self.max_finished + 1)]:
+            del self._entries[entry.job.job_id]
+
+    def _update(self, job: SearchJob, **changes) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+
+    def _finish(self, entry: _Entry, status: str, **changes) -> None:
+        self._update(entry.job, status=status, finished_at=time.time(), **changes)
+        entry.settings = None  # Drops the SMTP credentials carried in the settings
+        entry.done.set()
+
+    def _queue_position(self, job: SearchJob):
+        def report(position: int | None) -> None:
+            self._update(job.progress, queue_position=position)
+
+        return report
+
+    def _expire(self, entry: _Entry) -> None:
+        if not entry.job.finished:
+            entry.timed_out = True
+            entry.stop.set()
+
+    def _run(self, entry: _Entry) -> None:
+        job = entry.job
+        if entry.stop.is_set():
+            self._finish(entry, "cancelled")
+            return
+        self._update(job, status="running", started_at=time.time())
+        timer = None
+        if job.deadline_s:
+            timer = threading.Timer(job.deadline_s, self._expire, args=(entry,))
+            timer.daemon = True
+            timer.start()
+        run_id = None
+        try:
+            with request_context(job.user, job.priority, on_wait=self._queue_position(job)):
+                outcome = run_search(entry.settings, stop=entry.stop, progress=job.progress)
+            if self.result_store is not None:
+                run_id = self.result_store.save(outcome.results, query=job.query)
+                outcome = replace(outcome, results=outcome.results.iloc[0:0])
+        except Exception as exc:
+            self._finish(entry, "failed", error=str(exc))
+            return
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if entry.timed_out:
+            status = "timed_out"
+        elif entry.stop.is_set():
+            status = "cancelled"
+        else:
+            status = "done"
+        self._finish(entry, status, outcome=outcome, run_id=run_id)
@@ -0,0 +1,132 @@
+"""Choose how to attach exported results so the e-mail fits mailbox limits.
+
+Base64 inflates an attachment by about a third, and mail.ru rejects
+messages above 25 MB. :func:`package_results` tries, in order:
+
+1. ``as_is`` — the export unchanged;
+2. ``zip`` — a CSV or TXT export in a maximally compressed ZIP archive.
+   XLSX is skipped: it already is a deflated ZIP and barely shrinks again;
+3. ``split`` — that archive (or the XLSX itself) cut into numbered parts
+   (``results.zip.001`` …), each sent in its own message;
+4. ``summary`` — the first rows as a small XLSX, with the full export
+   written to ``output/``. The message body says so without naming the
+   server path, which only the sender gets (:attr:`AttachmentPlan.saved_path`).
+"""
+
+from __future__ import annotations
+
+import io
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from core.email_mailru import Attachment
+from core.export_excel import to_csv_bytes, to_excel_bytes, to_txt_bytes, write_excel_stream
+
+MAX_MESSAGE_BYTES = 25 * 1024 * 1024
+# Room for base64 growth (4/3) plus headers and the text part
+MAX_ATTACHMENT_BYTES = MAX_MESSAGE_BYTES * 3 // 4 - 256 * 1024
+MAX_PARTS = 5
+SUMMARY_ROWS = 500
+# Text exports shrink several times in a ZIP; XLSX is compressed already
+ZIP_SUFFIXES = (".csv", ".txt")
+_BYTES = {".csv": to_csv_bytes, ".txt": to_txt_bytes}
+
+
+@dataclass
+class AttachmentPlan:
+    """Attachments chosen for one e-mailed result set.
+
+    Attributes:
+        strategy: ``"as_is"``, ``"zip"``, ``"split"`` or ``"summary"``.
+        attachments: Files to send.
+        one_per_message: Send every attachment in a separate e-mail.
+        note: Text to append to the message body (empty if nothing to add).
+        saved_path: Where the full export was written for ``"summary"``.
+    """
+
+    strategy: str
+    attachments: list[Attachment] = field(default_factory=list)
+    one_per_message: bool = False
+    note: str = ""
+    saved_path: Path | None = None
+
+
+def _zip(data: bytes, filename: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+        archive.writestr(filename, data)
+    return buffer.getvalue()
+
+
+def package_results(
+    df: pd.DataFrame,
+    xlsx_bytes: bytes | None = None,
+    filename: str = "results.xlsx",
+    max_bytes: int = MAX_ATTACHMENT_BYTES,
+    max_parts: int = MAX_PARTS,
+    summary_rows: int = SUMMARY_ROWS,
+) -> AttachmentPlan:
+    """Pick the cheapest packaging of *df* whose attachments fit *max_bytes*.
+
+    Args:
+        df: Results to send.
+        xlsx_bytes: Already built export of *df* in the format of
+            *filename*, if available.
+        filename: Name of the attachment; its extension picks the format
+            (``.xlsx``, ``.csv`` or ``.txt``).
+        max_bytes: Largest raw (pre-base64) size of a single attachment.
+        max_parts: Largest number of parts worth splitting the archive into.
+        summary_rows: Rows kept in the summary attachment.
+
+    Returns:
+        An :class:`AttachmentPlan`.
+    """
+    suffix = Path(filename).suffix.lower()
+    data = xlsx_bytes if xlsx_bytes is not None else _BYTES.get(suffix, to_excel_bytes)(df)
+    if len(data) <= max_bytes:
+        return AttachmentPlan("as_is", [Attachment(filename, data)])
+
+    archive_name, archive = filename, data
+    if suffix in ZIP_SUFFIXES:
+        archive_name = f"{Path(filename).stem}.zip"
+        archive = _zip(data, filename)
+        if len(archive) <= max_bytes:
+            return AttachmentPlan(
+                "zip",
+                [Attachment(archive_name, archive)],
+                note=f"Файл {filename} упакован в ZIP-архив {archive_name}.",
+            )
+
+    part_count = -(-len(archive) // max_bytes)
+    if part_count <= max_parts:
+        parts = [
+            Attachment(f"{archive_name}.{index + 1:03d}", archive[start:start + max_bytes])
+            for index, start in enumerate(range(0, len(archive), max_bytes))
+        ]
+        return AttachmentPlan(
+            "split",
+            parts,
+            one_per_message=True,
+            note=(
+                f"Файл {archive_name} разделён на {part_count} частей, отправленных "
+                f"отдельными письмами. Соберите части в один файл "
+                f"(например, «cat {archive_name}.* > {archive_name}») "
+                "или объедините их в 7-Zip командой «Объединить файлы»."
+            ),
+        )
+
+    saved_path = write_excel_stream(df)
+    summary = to_excel_bytes(df.head(summary_rows))
+    return AttachmentPlan(
+        "summary",
+        [Attachment(f"{Path(filename).stem}_top{summary_rows}.xlsx", summary)],
+        note=(
+            f"Выгрузка слишком велика для письма: приложены первые {min(summary_rows, len(df))} "
+            f"из {len(df)} записей. Полная выгрузка сохранена на сервере, "
+            "её можно запросить у отправителя."
+        ),
+        saved_path=saved_path,
+    )
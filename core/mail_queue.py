@@ -0,0 +1,288 @@
+"""Background e-mail delivery with SMTP connection reuse.
+
+Sending used to block the Streamlit button handler for a whole
+connect → STARTTLS → login → send round-trip. :class:`MailQueue` accepts
+jobs instantly and delivers them on a worker thread: every recipient gets
+their own message (or messages, for attachments split into parts), all
+sent over one authenticated connection per job. Message bodies are spooled
+once per job and streamed to the server for each recipient.
+Transient failures (dropped connections, ``4xx`` replies) reconnect and
+resume after an exponential backoff. A permanent reply to one message fails
+only its recipient; a permanent failure of the connection itself fails the
+remaining ones. Job status can be polled by the UI; the statuses of the
+latest :data:`MAX_FINISHED_JOBS` finished jobs are kept.
+
+Credentials travel with the queued job only and are never stored in the
+status objects or persisted anywhere.
+"""
+
+from __future__ import annotations
+
+import itertools
+import queue
+import smtplib
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import BinaryIO, Sequence
+
+from core.email_mailru import (
+    SMTP_HOST,
+    SMTP_PORT,
+    Attachment,
+    message_headers,
+    parse_recipients,
+    send_spooled,
+    smtp_connection,
+    spool_message_body,
+)
+
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_S = 2.0
+MAX_FINISHED_JOBS = 50
+
+
+@dataclass
+class MailJob:
+    """Delivery status of one queued e-mail job."""
+
+    job_id: str
+    recipients: list[str]
+    status: str = "queued"  # "queued" | "sending" | "done" | "partial" | "failed"
+    sent: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "partial", "failed")
+
+
+@dataclass
+class _Payload:
+    job: MailJob
+    subject: str
+    body: str
+    attachments: Sequence[Attachment]
+    one_per_message: bool
+    smtp_login: str
+    smtp_password: str
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Return ``True`` for failures worth retrying on a fresh connection."""
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPException):
+        return False
+    return isinstance(exc, OSError)
+
+
+class MailQueue:
+    """Outbound mail queue served by a single background worker.
+
+    Args:
+        host: SMTP server host.
+        port: SMTP server port.
+        starttls: Upgrade the connection with STARTTLS before login.
+        retries: How many times a job may reconnect after transient errors.
+        backoff_s: Delay before the first retry; doubled on each further one.
+        max_finished: How many finished jobs are kept for :meth:`status`.
+    """
+
+    def __init__(
+        self,
+        host: str = SMTP_HOST,
+        port: int = SMTP_PORT,
+        starttls: bool = True,
+        retries: int = RETRY_ATTEMPTS,
+        backoff_s: float = RETRY_BACKOFF_S,
+        max_finished: int = MAX_FINISHED_JOBS,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_finished = max_finished
+        self._queue: queue.Queue[_Payload | None] = queue.Queue()
+        self._payloads: dict[str, _Payload] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+
+    def submit(
+        self,
+        recipients: str | list[str],
+        subject: str,
+        body: str,
+        attachments: Sequence[Attachment] = (),
+        one_per_message: bool = False,
+        smtp_login: str = "",
+        smtp_password: str = "",
+    ) -> str:
+        """Queue a message for every recipient and return the job id.
+
+        Args:
+            recipients: Addresses, as a list or a comma-separated string.
+            subject: E-mail subject line.
+            body: Plain-text body of the message.
+            attachments: Files to attach.
+            one_per_message: Send each attachment in its own e-mail (for
+                archives split into parts); subjects get a part number.
+            smtp_login: SMTP login, also used as the sender address.
+            smtp_password: SMTP password.
+
+        Raises:
+            RuntimeError: If no recipient address is given.
+        """
+        addresses = parse_recipients(recipients)
+        if not addresses:
+            raise RuntimeError("Не указан ни один получатель.")
+        job = MailJob(job_id=f"mail-{next(self._ids)}", recipients=addresses)
+        payload = _Payload(
+            job, subject, body, list(attachments), one_per_message, smtp_login, smtp_password
+        )
+        with self._lock:
+            self._prune()
+            self._payloads[job.job_id] = payload
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+                self._worker.start()
+        self._queue.put(payload)
+        return job.job_id
+
+    def status(self, job_id: str) -> MailJob:
+        """Return a snapshot of the job's delivery status.
+
+        Raises:
+            KeyError: If the job is unknown or was pruned long after finishing.
+        """
+        with self._lock:
+            job = self._payloads[job_id].job
+            return replace(
+                job, recipients=list(job.recipients), sent=list(job.sent), failed=dict(job.failed)
+            )
+
+    def wait(self, job_id: str, timeout: float | None = None) -> MailJob:
+        """Block until the job finishes (or *timeout* expires) and return its status."""
+        self._payloads[job_id].done.wait(timeout)
+        return self.status(job_id)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Stop the worker after the jobs already queued."""
+        self._queue.put(None)
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            payload = self._queue.get()
+            if payload is None:
+                return
+            try:
+                self._deliver(payload)
+            finally:
+                # Drop the credentials and attachment once the job is over
+                payload.smtp_password = ""
+                payload.attachments = ()
+                payload.done.set()
+
+    def _prune(self) -> None:
+        finished = [payload for payload in self._payloads.values() if payload.done.is_set()]
+        finished.sort(key=lambda payload: payload.job.finished_at or 0.0)
+        for payload in finished[: max(0, len(finished) - self.max_finished + 1)]:
+            del self._payloads[payload.job.job_id]
+
+    def _update(self, job: MailJob, **changes) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+
+    def _spool_messages(self, payload: _Payload) -> list[tuple[str, BinaryIO, str]]:
+        """Return ``(subject, body_spool, content_type)`` for every message of a job."""
+        if not payload.one_per_message or len(payload.attachments) < 2:
+            return [(payload.subject, *spool_message_body(payload.body, payload.attachments))]
+        total = len(payload.attachments)
+        return [
+            (
+                f"{payload.subject} (часть {index} из {total})",
+                *spool_message_body(payload.body, [attachment]),
+            )
+            for index, attachment in enumerate(payload.attachments, start=1)
+        ]
+
+    def _deliver(self, payload: _Payload) -> None:
+        job = payload.job
+        sender = payload.smtp_login or f"noreply@{self.host}"
+        self._update(job, status="sending")
+        messages = self._spool_messages(payload)
+        try:
+            self._send_all(payload, sender, messages)
+        finally:
+            for _, spool, _ in messages:
+                spool.close()
+
+    def _send_all(
+        self, payload: _Payload, sender: str, messages: list[tuple[str, BinaryIO, str]]
+    ) -> None:
+        job = payload.job
+        # (recipient, message index) pairs still to send, in order
+        pending = [
+            (recipient, index) for recipient in job.recipients for index in range(len(messages))
+        ]
+
+        while pending:
+            self._update(job, attempts=job.attempts + 1)
+            try:
+                with smtp_connection(
+                    payload.smtp_login,
+                    payload.smtp_password,
+                    host=self.host,
+                    port=self.port,
+                    starttls=self.starttls,
+                ) as server:
+                    while pending:
+                        recipient, index = pending[0]
+                        subject, spool, content_type = messages[index]
+                        headers = message_headers(sender, [recipient], subject, content_type)
+                        try:
+                            send_spooled(server, sender, [recipient], headers, spool)
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as exc:
+                            if isinstance(exc, smtplib.SMTPResponseException) and _is_transient(exc):
+                                raise
+                            # Refused for this message only: the session is ready for the next one
+                            if isinstance(exc, smtplib.SMTPRecipientsRefused):
+                                error = str(exc.recipients.get(recipient, exc))
+                            else:
+                                error = str(exc)
+                            with self._lock:
+                                job.failed[recipient] = error
+                            pending = [item for item in pending if item[0] != recipient]
+                            continue
+                        pending.pop(0)
+                        if index == len(messages) - 1:
+                            with self._lock:
+                                job.sent.append(recipient)
+            except Exception as exc:
+                if _is_transient(exc) and job.attempts <= self.retries:
+                    time.sleep(self.backoff_s * 2 ** (job.attempts - 1))
+                    continue
+                with self._lock:
+                    for recipient, _ in pending:
+                        job.failed.setdefault(recipient, str(exc))
+                pending.clear()
+
+        if not job.failed:
+            status = "done"
+        elif job.sent:
+            status = "partial"
+        else:
+            status = "failed"
+        self._update(job, status=status, finished_at=time.time())
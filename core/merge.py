@@ -1,7 +1,136 @@
 """Merge and deduplicate results from multiple search sources."""
 
+from __future__ import annotations
+
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
 import pandas as pd
 
+from core.metrics import inc, timed
+from core.schema import COLUMNS, to_schema
+
+# Earlier sources win ties between equally complete duplicate rows
+SOURCE_PRIORITY = ("docSearch", "extendedsearch")
+
+PORTAL_HOST = "zakupki.gov.ru"
+
+# Query parameters that never identify a purchase
+_IGNORED_QUERY_PARAMS = re.compile(r"^(utm_\w+|_|sessionid|jsessionid)$", re.IGNORECASE)
+
+
+def normalize_purchase_number(value) -> str:
+    """Keep only the digits of a purchase number (``'№ 0373…'`` → ``'0373…'``)."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return re.sub(r"\D", "", str(value))
+
+
+def canonicalize_url(url) -> str:
+    """Normalise a purchase URL so different shapes of one link compare equal.
+
+    Relative links are resolved against the portal, the scheme is forced to
+    https, the host is lower-cased without ``www.``, trailing slashes,
+    fragments, empty and tracking parameters are dropped and the remaining
+    query parameters are sorted.
+    """
+    if url is None or (not isinstance(url, str) and pd.isna(url)):
+        return ""
+    text = str(url).strip()
+    if not text:
+        return ""
+    if text.startswith("/"):
+        text = f"https://{PORTAL_HOST}{text}"
+    parts = urlsplit(text)
+    host = parts.netloc.lower().removeprefix("www.")
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    params = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=False)
+        if not _IGNORED_QUERY_PARAMS.match(name)
+    )
+    return urlunsplit(("https", host, path, urlencode(params), ""))
+
+
+def row_key(row: dict) -> str:
+    """Return the identity of a result row.
+
+    The normalised purchase number when present, else the canonical url.
+    An empty string means the row cannot be matched against other rows.
+    """
+    number = normalize_purchase_number(row.get("purchase_number"))
+    if number:
+        return number
+    return canonicalize_url(row.get("url"))
+
+
+def _is_filled(value) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return bool(value.strip())
+    return not pd.isna(value)
+
+
+class StreamingMerger:
+    """Deduplicate result batches incrementally using a hash index of row keys.
+
+    Each :meth:`add` is O(batch size): rows are looked up by :func:`row_key`
+    and the winning row for every key is kept in place, so nothing is ever
+    re-concatenated. Among duplicates the most complete row wins (most
+    filled-in schema columns), then the row from the source listed earlier in
+    *source_priority*, then the row seen first. Rows without any key are
+    always kept.
+    """
+
+    def __init__(self, source_priority: tuple[str, ...] = SOURCE_PRIORITY) -> None:
+        self._priority = {source: rank for rank, source in enumerate(source_priority)}
+        self._rows: list[dict] = []
+        self._ranks: list[tuple[int, int]] = []
+        self._index: dict[str, int] = {}
+        self._columns: dict[str, None] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _rank(self, row: dict) -> tuple[int, int]:
+        completeness = sum(_is_filled(row.get(column)) for column in COLUMNS)
+        priority = self._priority.get(str(row.get("source")), len(self._priority))
+        return (-completeness, priority)
+
+    @timed("merge.add")
+    def add(self, df: pd.DataFrame) -> int:
+        """Merge a batch of rows; returns the number of previously unseen rows."""
+        self._columns.update(dict.fromkeys(df.columns))
+        added = 0
+        for row in df.to_dict(orient="records"):
+            key = row_key(row)
+            rank = self._rank(row)
+            slot = self._index.get(key) if key else None
+            if slot is None:
+                if key:
+                    self._index[key] = len(self._rows)
+                self._rows.append(row)
+                self._ranks.append(rank)
+                added += 1
+            elif rank < self._ranks[slot]:
+                self._rows[slot] = row
+                self._ranks[slot] = rank
+        inc("merge_rows_total", len(df), result="input")
+        inc("merge_rows_total", added, result="new")
+        return added
+
+    @timed("merge.result")
+    def result(self) -> pd.DataFrame:
+        """Return the deduplicated rows sorted by publish_date descending."""
+        if not self._columns:
+            return pd.DataFrame()
+        combined = to_schema(pd.DataFrame(self._rows, columns=list(self._columns)))
+        combined = combined.sort_values(
+            "publish_date", ascending=False, kind="stable", na_position="last"
+        )
+        return combined.reset_index(drop=True)
+
 
 def merge_results(dfs: list[pd.DataFrame]) -> pd.DataFrame:
     """Concatenate DataFrames and deduplicate by purchase_number or url.
@@ -11,20 +140,10 @@ def merge_results(dfs: list[pd.DataFrame]) -> pd.DataFrame:
              Each must contain at least a ``purchase_number`` or ``url`` column.
 
     Returns:
-        A single deduplicated DataFrame sorted by publish_date descending.
+        A single deduplicated DataFrame in the :mod:`core.schema` layout,
+        sorted by publish_date descending.
     """
-    if not dfs:
-        return pd.DataFrame()
-
-    combined = pd.concat(dfs, ignore_index=True)
-
-    # Deduplicate: prefer rows where purchase_number is non-empty/non-null.
-    if "purchase_number" in combined.columns:
-        combined = combined.drop_duplicates(subset=["purchase_number"], keep="first")
-    elif "url" in combined.columns:
-        combined = combined.drop_duplicates(subset=["url"], keep="first")
-
-    if "publish_date" in combined.columns:
-        combined = combined.sort_values("publish_date", ascending=False)
-
-    return combined.reset_index(drop=True)
+    merger = StreamingMerger()
+    for df in dfs:
+        merger.add(df)
+    return merger.result()
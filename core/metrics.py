@@ -0,0 +1,285 @@
+"""Lightweight in-process metrics: timing spans, histograms and counters.
+
+Stages of a search are wrapped in :func:`span`, which records the duration
+into a latency histogram and counts failures. Sources, merging, ranking and
+the exporters also bump plain counters (pages, rows, bytes, cache hits).
+
+Everything lives in one process-wide :data:`REGISTRY` and can be exported
+as Prometheus text (:meth:`MetricsRegistry.to_prometheus`) or JSON
+(:meth:`MetricsRegistry.to_dict`), optionally over HTTP with
+:func:`start_http_server` (``/metrics`` and ``/metrics.json``).
+
+:func:`collect_spans` additionally captures the spans of one run (across
+threads that copy the context) for a per-run timing breakdown.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+METRIC_PREFIX = "zakupki_"
+LATENCY_BUCKETS_S = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+_Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class SpanRecord:
+    """One finished span captured by :func:`collect_spans`."""
+
+    name: str
+    labels: dict[str, str]
+    start: float  # seconds since the collection started
+    duration_s: float
+    error: bool = False
+
+
+@dataclass
+class _Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> list[int]:
+        running, result = 0, []
+        for count in self.counts:
+            running += count
+            result.append(running)
+        return result
+
+
+_collector: contextvars.ContextVar[tuple[float, list[SpanRecord]] | None] = contextvars.ContextVar(
+    "metrics_collector", default=None
+)
+
+
+def _label_key(labels: dict) -> _Labels:
+    return tuple(sorted((str(name), str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: _Labels, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms."""
+
+    def __init__(self) -> None:
+        self._counters: dict[tuple[str, _Labels], float] = {}
+        self._histograms: dict[tuple[str, _Labels], _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Add *value* to the counter *name* with *labels*."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS_S, **labels) -> None:
+        """Record *value* in the histogram *name* with *labels*."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(tuple(buckets))
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[None]:
+        """Time the enclosed block as stage *name*.
+
+        The duration goes to the ``span_seconds`` histogram; an exception
+        also increments ``errors_total`` and is re-raised.
+        """
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            self.inc("errors_total", span=name, **labels)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self.observe("span_seconds", duration, span=name, **labels)
+            collected = _collector.get()
+            if collected is not None:
+                origin, records = collected
+                records.append(
+                    SpanRecord(
+                        name,
+                        {key: str(value) for key, value in labels.items()},
+                        started - origin,
+                        duration,
+                        error,
+                    )
+                )
+
+    def timed(self, name: str, **labels):
+        """Decorator form of :meth:`span`."""
+
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def counter(self, name: str, **labels) -> float:
+        """Return the current value of a counter (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_dict(self) -> dict:
+        """Return all metrics as JSON-serialisable data."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "buckets": {
+                        str(bound): count
+                        for bound, count in zip(
+                            (*histogram.buckets, "+Inf"), histogram.cumulative()
+                        )
+                    },
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            typed: set[str] = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                bounds = [f"{bound:g}" for bound in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.cumulative()):
+                    lines.append(f"{metric}_bucket{_format_labels(labels, (('le', bound),))} {count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.total:g}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+span = REGISTRY.span
+timed = REGISTRY.timed
+
+
+@contextmanager
+def collect_spans() -> Iterator[list[SpanRecord]]:
+    """Capture the spans finished inside the block (and in copied contexts).
+
+    Threads only report into the collection when started through
+    ``contextvars.copy_context().run``.
+    """
+    records: list[SpanRecord] = []
+    token = _collector.set((time.perf_counter(), records))
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+def summarize_spans(records: list[SpanRecord]) -> list[dict]:
+    """Aggregate *records* per stage: calls, total and max seconds, errors."""
+    summary: dict[str, dict] = {}
+    for record in records:
+        stage = record.name
+        if "source" in record.labels:
+            stage = f"{stage} [{record.labels['source']}]"
+        row = summary.setdefault(
+            stage, {"stage": stage, "calls": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0}
+        )
+        row["calls"] += 1
+        row["total_s"] += record.duration_s
+        row["max_s"] = max(row["max_s"], record.duration_s)
+        row["errors"] += int(record.error)
+    return sorted(summary.values(), key=lambda row: -row["total_s"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] == "/metrics":
+            body = self.registry.to_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body = json.dumps(self.registry.to_dict(), ensure_ascii=False).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:  # noqa: A002 - silence access logs
+        pass
+
+
+def start_http_server(
+    port: int, host: str = "0.0.0.0", registry: MetricsRegistry = REGISTRY
+) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` and ``/metrics.json`` on a daemon thread."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
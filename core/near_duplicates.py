@@ -0,0 +1,206 @@
+"""Near-duplicate detection across sources with MinHash-LSH.
+
+Exact-key deduplication in :mod:`core.merge` misses the same purchase found
+under different URL shapes or republished under a new number. This stage
+groups rows whose normalised titles have similar character shingles and
+whose price and publish date are close.
+
+Signatures, candidate pairs and pair verification are all vectorised NumPy
+operations. Candidates come only from rows that share an LSH band. Inside a
+bucket of up to :data:`MAX_EXHAUSTIVE_BUCKET` rows every pair is compared;
+a larger bucket (hundreds of copies of one boilerplate title) contributes
+only a number of pairs linear in its size, so the cost grows roughly
+linearly with the number of rows instead of comparing every pair.
+"""
+
+from __future__ import annotations
+
+import re
+
+import numpy as np
+import pandas as pd
+
+NUM_PERM = 64
+BANDS = 16  # 4 rows per band: pairs above ~0.5 Jaccard become candidates
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+PRICE_TOLERANCE = 0.05  # relative price difference still considered equal
+DATE_WINDOW_DAYS = 30
+MAX_EXHAUSTIVE_BUCKET = 16  # LSH buckets up to this size compare every pair
+_CHUNK_ROWS = 1_000
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+_MAX_HASH = np.uint64((1 << 64) - 1)
+_SHIFT = np.uint64(32)
+_rng = np.random.default_rng(20240501)
+# Odd 64-bit multipliers for multiply-shift hashing (32-bit outputs)
+_PERM_A = _rng.integers(1, 1 << 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+_SHINGLE_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SHINGLE_POWERS = np.uint64(1_000_003) ** np.arange(SHINGLE_SIZE, dtype=np.uint64)
+_BAND_COEFFS = _rng.integers(1, 1 << 63, size=NUM_PERM // BANDS, dtype=np.uint64)
+
+
+def _normalize_titles(titles: list[str]) -> list[str]:
+    # Python's re (not pandas/Arrow string ops) so \W stays Unicode-aware
+    return [_NON_WORD.sub(" ", str(title or "").lower()).strip() for title in titles]
+
+
+def _shingle_hashes(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Hash every character shingle of *texts* at once.
+
+    Texts are concatenated into one code-point array and a polynomial rolling
+    hash is taken over every window; windows that cross a text boundary are
+    skipped. Texts shorter than a shingle are padded so they yield one.
+
+    Returns:
+        ``(hashes, owners)``: 32-bit shingle hashes and the index of the text
+        each one belongs to (non-decreasing).
+    """
+    padded = [text.ljust(SHINGLE_SIZE) if text else "" for text in texts]
+    lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+    counts = np.maximum(lengths - SHINGLE_SIZE + 1, 0)
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+
+    codepoints = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32)
+    windows = np.lib.stride_tricks.sliding_window_view(codepoints.astype(np.uint64), SHINGLE_SIZE)
+    owners = np.repeat(np.arange(len(texts)), counts)
+    text_starts = np.cumsum(lengths) - lengths
+    shingle_starts = np.cumsum(counts) - counts
+    positions = text_starts[owners] + np.arange(total) - shingle_starts[owners]
+    hashes = ((windows[positions] * _SHINGLE_POWERS).sum(axis=1) * _SHINGLE_MIX) >> _SHIFT
+    return hashes, owners
+
+
+def minhash_signatures(titles: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(signatures, has_shingles)`` for *titles*.
+
+    ``signatures`` has shape ``(len(titles), NUM_PERM)``; rows whose title has
+    no shingles are flagged ``False`` in ``has_shingles`` and must be ignored.
+    """
+    texts = _normalize_titles(titles)
+    signatures = np.full((len(texts), NUM_PERM), _MAX_HASH, dtype=np.uint64)
+    has_shingles = np.zeros(len(texts), dtype=bool)
+    for start in range(0, len(texts), _CHUNK_ROWS):
+        hashes, owners = _shingle_hashes(texts[start:start + _CHUNK_ROWS])
+        if not len(hashes):
+            continue
+        # One contiguous row per permutation keeps reduceat cache-friendly
+        permuted = (_PERM_A[:, None] * hashes + _PERM_B[:, None]) >> _SHIFT
+        rows, first = np.unique(owners, return_index=True)
+        signatures[start + rows] = np.minimum.reduceat(permuted, first, axis=1).T
+        has_shingles[start + rows] = True
+    return signatures, has_shingles
+
+
+def _candidate_pairs(signatures: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Return unique ``(i, j)`` row pairs, ``i < j``, that share an LSH band.
+
+    Buckets of up to :data:`MAX_EXHAUSTIVE_BUCKET` rows yield all their
+    pairs. In a larger bucket each member is only paired with the bucket's
+    first member and with its predecessor, which keeps the number of pairs
+    linear in the bucket size; other pairs there are joined only through
+    union-find chains, which a failed price or date check can break, so
+    such buckets trade some recall for bounded cost.
+    """
+    rows_per_band = NUM_PERM // BANDS
+    pairs: list[np.ndarray] = []
+    for band in range(BANDS):
+        block = signatures[candidates, band * rows_per_band:(band + 1) * rows_per_band]
+        keys = (block * _BAND_COEFFS).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        same_as_prev = np.concatenate(([False], sorted_keys[1:] == sorted_keys[:-1]))
+        if not same_as_prev.any():
+            continue
+        bucket_start = np.maximum.accumulate(np.where(same_as_prev, 0, np.arange(len(order))))
+        members = np.flatnonzero(same_as_prev)
+        rows = candidates[order]
+        pairs.append(np.column_stack((rows[bucket_start[members]], rows[members])))
+        pairs.append(np.column_stack((rows[members - 1], rows[members])))
+        bucket = np.cumsum(~same_as_prev) - 1
+        small = members[np.bincount(bucket)[bucket[members]] <= MAX_EXHAUSTIVE_BUCKET]
+        offsets = small - bucket_start[small]  # place of the member in its bucket
+        for back in range(2, int(offsets.max(initial=0)) + 1):
+            behind = small[offsets >= back]
+            pairs.append(np.column_stack((rows[behind - back], rows[behind])))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    stacked = np.concatenate(pairs)
+    low, high = stacked.min(axis=1), stacked.max(axis=1)
+    codes = np.unique(low[low != high] * len(signatures) + high[low != high])
+    return np.column_stack(np.divmod(codes, len(signatures)))
+
+
+def _find(parent: np.ndarray, node: int) -> int:
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+
+def find_near_duplicates(
+    df: pd.DataFrame,
+    threshold: float = DEFAULT_THRESHOLD,
+    price_tolerance: float = PRICE_TOLERANCE,
+    date_window_days: int = DATE_WINDOW_DAYS,
+    collapse: bool = False,
+) -> pd.DataFrame:
+    """Label near-duplicate rows of *df* with a shared ``dup_group`` id.
+
+    Args:
+        df: Merged search results (``title``, optionally ``price`` and
+            ``publish_date``).
+        threshold: Minimum estimated Jaccard similarity of title shingles.
+        price_tolerance: Maximum relative price difference; rows with an
+            unknown price are not rejected on price.
+        date_window_days: Maximum distance between publish dates; rows with
+            an unknown date are not rejected on date.
+        collapse: Keep only the first row of every group.
+
+    Returns:
+        Copy of *df* with an integer ``dup_group`` column. Groups are numbered
+        in order of first appearance; unique rows get a group of their own.
+    """
+    df = df.copy()
+    if df.empty:
+        df["dup_group"] = pd.Series(dtype="int64")
+        return df
+
+    titles = [str(value) for value in df.get("title", pd.Series([""] * len(df))).tolist()]
+    prices = pd.to_numeric(df.get("price", pd.Series(np.nan, index=df.index)), errors="coerce")
+    prices = prices.to_numpy(dtype="float64", na_value=np.nan)
+    dates = pd.to_datetime(df.get("publish_date", pd.Series(pd.NaT, index=df.index)), errors="coerce")
+    days = dates.to_numpy(dtype="datetime64[D]").astype("float64")
+    days[dates.isna().to_numpy()] = np.nan
+
+    signatures, has_shingles = minhash_signatures(titles)
+    pairs = _candidate_pairs(signatures, np.flatnonzero(has_shingles))
+    left, right = pairs[:, 0], pairs[:, 1]
+
+    similar = (signatures[left] == signatures[right]).mean(axis=1) >= threshold
+    scale = np.maximum(np.maximum(np.abs(prices[left]), np.abs(prices[right])), 1.0)
+    price_gap = np.abs(prices[left] - prices[right]) / scale
+    similar &= ~(price_gap > price_tolerance)  # NaN gaps (unknown price) pass
+    similar &= ~(np.abs(days[left] - days[right]) > date_window_days)
+
+    parent = np.arange(len(df))
+    for a, b in pairs[similar]:
+        root_a, root_b = _find(parent, a), _find(parent, b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    # Pointer jumping flattens every chain to its root without a Python loop
+    roots = parent
+    while True:
+        jumped = roots[roots]
+        if np.array_equal(jumped, roots):
+            break
+        roots = jumped
+    df["dup_group"] = pd.factorize(roots)[0].astype("int64")
+
+    if collapse:
+        df = df.drop_duplicates(subset=["dup_group"], keep="first")
+    return df.reset_index(drop=True)
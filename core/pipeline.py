@@ -0,0 +1,241 @@
+"""Search pipeline shared by the UI and background runners: sources → merge → documents → rank."""
+
+from __future__ import annotations
+
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from core.ai_ranker import PipelinedRanker
+from core.change_tracking import ChangeSet, ChangeTracker
+from core.documents import DOC_TEXT_COLUMN, DocumentFetcher, DocumentStats, attach_document_text
+from core.merge import StreamingMerger
+from core.metrics import SpanRecord, collect_spans, span
+from core.near_duplicates import find_near_duplicates
+from core.profiling import RunProfiler
+from core.search_cache import get_search_cache
+from core.settings import SearchSettings
+from core.sources.browser import stopped
+
+
+@dataclass
+class SearchOutcome:
+    """Merged (and optionally ranked) results of one search run."""
+
+    results: pd.DataFrame
+    errors: list[str] = field(default_factory=list)
+    timings: list[SpanRecord] = field(default_factory=list)
+    changes: ChangeSet | None = None  # set when settings.track_changes is on
+    profile_path: Path | None = None  # set when settings.profile is on
+    documents: DocumentStats | None = None  # set when settings.documents is on
+    cached_at: float | None = None  # scrape time of source rows served from the cache
+
+
+@dataclass
+class SearchProgress:
+    """Live progress of a run, updated by the pipeline while it works."""
+
+    # "cache" | source name | "merge" | "changes" | "near_duplicates" | "documents" | "ranking" | "done"
+    stage: str = "queued"
+    pages: int = 0
+    rows: int = 0  # rows scraped so far, before merging
+    queue_position: int | None = None  # while waiting for a browser slot (core.admission)
+
+
+def change_scope(settings: SearchSettings) -> str:
+    """Scope of change tracking for a search: the same query in the same region."""
+    return f"search:{' '.join(settings.query.lower().split())}|{settings.region}"
+
+
+def _scrape(
+    settings: SearchSettings,
+    on_batch,
+    stop: threading.Event | None,
+    progress: SearchProgress,
+) -> list[str]:
+    """Run the enabled sources, feeding every page to *on_batch*; return their errors."""
+    # Imported lazily so the pipeline can be used without Playwright installed
+    from core.sources.docsearch import search_docsearch
+    from core.sources.orders_search import search_orders
+
+    errors: list[str] = []
+
+    if settings.doc_search and not stopped(stop):
+        progress.stage = "docSearch"
+        try:
+            with span("source.search", source="docSearch"):
+                search_docsearch(settings, on_batch=on_batch, stop=stop)
+        except Exception as exc:
+            errors.append(f"docSearch: {exc}")
+
+    if settings.extended_search and not stopped(stop):
+        progress.stage = "extendedsearch"
+        try:
+            with span("source.search", source="extendedsearch"):
+                search_orders(settings, on_batch=on_batch, stop=stop)
+        except Exception as exc:
+            errors.append(f"extendedsearch: {exc}")
+
+    return errors
+
+
+def _run_search(
+    settings: SearchSettings,
+    stop: threading.Event | None = None,
+    progress: SearchProgress | None = None,
+) -> SearchOutcome:
+    progress = progress if progress is not None else SearchProgress()
+    merger = StreamingMerger()
+    tracker = ChangeTracker() if settings.track_changes else None
+    scope = change_scope(settings)
+    ranker = None
+    if settings.ai_ranking:
+        ranker = PipelinedRanker(
+            query=settings.query,
+            mode=settings.ai_mode,
+            model_name=settings.ai_model or None,
+            allow_model_download=settings.ai_allow_download,
+            workers=settings.ai_workers,
+        )
+
+    def on_batch(batch: pd.DataFrame) -> None:
+        progress.pages += 1
+        progress.rows += len(batch)
+        merger.add(batch)
+        if ranker is not None:
+            if tracker is not None:
+                # Unchanged purchases are dropped after the merge, so they are never scored
+                statuses = tracker.classify(batch, scope)
+                batch = batch[[status != "unchanged" for status in statuses]]
+            ranker.submit(batch)
+
+    try:
+        cache = get_search_cache() if settings.use_cache else None
+        cached = None
+        if cache is not None and settings.cache_max_age_h > 0:
+            # Searches that may be served from the cache are what the cache warmer learns from
+            cache.note_request(settings)
+            with span("search_cache.get"):
+                cached = cache.get(settings, max_age_s=settings.cache_max_age_h * 3600)
+
+        if cached is not None:
+            progress.stage = "cache"
+            progress.rows = len(cached.results)
+            errors: list[str] = []
+            combined = cached.results
+        else:
+            errors = _scrape(settings, on_batch, stop, progress)
+            progress.stage = "merge"
+            combined = merger.result()
+            # Only complete scrapes are cached
+            if cache is not None and not errors and not stopped(stop):
+                try:
+                    cache.put(settings, combined)
+                except Exception as exc:
+                    errors.append(f"кэш: {exc}")
+
+        changes = None
+        if tracker is not None:
+            progress.stage = "changes"
+            with span("change_tracking.record"):
+                changes = tracker.record(combined, scope)
+            combined = changes.fresh
+
+        if settings.near_duplicates != "off":
+            progress.stage = "near_duplicates"
+            with span("near_duplicates"):
+                combined = find_near_duplicates(
+                    combined, collapse=settings.near_duplicates == "collapse"
+                )
+
+        documents = None
+        if settings.documents and not combined.empty and not stopped(stop):
+            progress.stage = "documents"
+            try:
+                fetcher = DocumentFetcher(max_bytes=settings.documents_budget_mb * 2**20)
+                documents = fetcher.fetch(combined, stop=stop)
+                combined = attach_document_text(combined, fetcher.index)
+            except Exception as exc:
+                errors.append(f"документы: {exc}")
+
+        if ranker is not None:
+            progress.stage = "ranking"
+            with span("ranker.finish"):
+                combined = ranker.finish(
+                    combined, threshold=settings.ai_threshold, top_k=settings.ai_top_k
+                )
+        # The text only feeds the ranker; exports keep the number of documents
+        combined = combined.drop(columns=DOC_TEXT_COLUMN, errors="ignore")
+
+        progress.stage = "done"
+        return SearchOutcome(
+            results=combined,
+            errors=errors,
+            changes=changes,
+            documents=documents,
+            cached_at=cached.fetched_at if cached is not None else None,
+        )
+    finally:
+        if ranker is not None:
+            ranker.close()  # Also when a stage before finish() raised
+
+
+def run_search(
+    settings: SearchSettings,
+    stop: threading.Event | None = None,
+    progress: SearchProgress | None = None,
+) -> SearchOutcome:
+    """Run every enabled source, merge their rows and rank them.
+
+    Each results page is merged by a :class:`~core.merge.StreamingMerger` as
+    soon as it is scraped and, when AI ranking is enabled, handed to a
+    :class:`~core.ai_ranker.PipelinedRanker`, so encoding overlaps with the
+    network waits of the sources.
+
+    Source failures are collected in :attr:`SearchOutcome.errors` instead of
+    aborting the whole run; pages scraped before the failure are kept. The
+    timing spans of the run are returned in :attr:`SearchOutcome.timings`.
+
+    With ``settings.track_changes`` the merged rows are recorded in the
+    :class:`~core.change_tracking.ChangeTracker` under :func:`change_scope`
+    and only new and changed purchases go on to near-duplicate detection,
+    ranking and the results; the full split is in
+    :attr:`SearchOutcome.changes`.
+
+    With ``settings.use_cache`` the source rows of the same search scraped
+    within ``settings.cache_max_age_h`` hours are taken from the
+    :class:`~core.search_cache.SearchCache` instead of scraping; their scrape
+    time is in :attr:`SearchOutcome.cached_at`. Complete scrapes refresh it.
+
+    With ``settings.documents`` the attachments of docSearch hits are
+    downloaded and indexed by a :class:`~core.documents.DocumentFetcher`
+    before ranking, so the ranker also scores their text; the results get a
+    ``documents`` column and the download summary is in
+    :attr:`SearchOutcome.documents`.
+
+    With ``settings.profile`` the run is wrapped in a
+    :class:`~core.profiling.RunProfiler`; the bundle path is returned in
+    :attr:`SearchOutcome.profile_path`.
+
+    Args:
+        settings: Runtime search parameters.
+        stop: Optional event; once set, the sources stop scraping and the
+            rows collected so far are merged and ranked as usual.
+        progress: Optional object updated with the current stage and the
+            number of pages and rows scraped (see :mod:`core.jobs`).
+    """
+    profiler = RunProfiler(settings.query) if settings.profile else None
+    with profiler or nullcontext(), collect_spans() as timings, span("pipeline.run"):
+        if profiler is not None:
+            profiler.attach_spans(timings)
+        outcome = _run_search(settings, stop=stop, progress=progress)
+    outcome.timings = timings
+    if profiler is not None:
+        if profiler.error:
+            outcome.errors.append(profiler.error)
+        else:
+            outcome.profile_path = profiler.path
+    return outcome
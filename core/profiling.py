@@ -0,0 +1,325 @@
+"""Opt-in profiling of one search run, exported in Chrome trace-event format.
+
+While a :class:`RunProfiler` is active it
+
+* samples the Python stacks of the run's threads (``sys._current_frames``)
+  and turns consecutive identical frames into duration events — a flame
+  chart per thread. The thread that enters the profiler is sampled; worker
+  threads of the run join with :func:`track_thread` (or
+  :meth:`RunProfiler.add_thread` as a pool ``initializer``), so the threads
+  of other searches served by the same process stay out of the trace;
+* samples the resident memory of the Python process and of its child
+  processes (the Playwright driver and Chromium) as counter events. Memory
+  is not attributed per run: with concurrent searches the figures include
+  theirs, which ``summary.json`` states in ``memory_scope``;
+* records the stage spans of the run (:func:`core.metrics.collect_spans`);
+* has :func:`core.sources.browser.open_page` record a Playwright trace
+  (``context.tracing``) of every browser context.
+
+Everything is bundled into one zip under ``output/profiles/``: ``trace.json``
+opens in Perfetto (https://ui.perfetto.dev) or ``chrome://tracing``, the
+``playwright/*.zip`` traces in ``playwright show-trace`` or
+https://trace.playwright.dev, and ``summary.json`` holds peak memory and the
+hottest functions.
+
+Child-process memory uses ``psutil`` when installed and ``/proc`` on Linux
+otherwise; elsewhere only the Python process is measured.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import datetime
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from pathlib import Path
+
+from core.metrics import SpanRecord
+from core.settings import OUTPUT_DIR
+
+PROFILES_DIR = OUTPUT_DIR / "profiles"
+SAMPLE_INTERVAL_S = 0.01
+MEMORY_INTERVAL_S = 0.25
+MAX_STACK_DEPTH = 64
+TOP_FUNCTIONS = 25
+_STAGES_TID = 0
+
+_active: contextvars.ContextVar[RunProfiler | None] = contextvars.ContextVar("run_profiler", default=None)
+
+
+def active_profiler() -> RunProfiler | None:
+    """Return the profiler of the current run, if profiling is on."""
+    return _active.get()
+
+
+def track_thread() -> None:
+    """Sample the calling thread too, if it runs in the context of a profiled run."""
+    profiler = _active.get()
+    if profiler is not None:
+        profiler.add_thread()
+
+
+def _proc_rss(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii", errors="replace") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _proc_children(pid: int) -> list[int]:
+    """Descendants of *pid* from ``/proc`` (empty where ``/proc`` is missing)."""
+    parents: dict[int, list[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii", errors="replace") as stat:
+                # The command name may contain spaces; fields after it are fixed
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    found, pending = [], [pid]
+    while pending:
+        children = parents.get(pending.pop(), [])
+        found.extend(children)
+        pending.extend(children)
+    return found
+
+
+def memory_usage() -> tuple[int | None, int]:
+    """Return resident bytes of this process and the sum over its child processes."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        process = psutil.Process()
+        children = 0
+        for child in process.children(recursive=True):
+            try:
+                children += child.memory_info().rss
+            except psutil.Error:
+                continue  # Exited between listing and reading
+        return process.memory_info().rss, children
+    own = _proc_rss(os.getpid())
+    return own, sum(_proc_rss(pid) or 0 for pid in _proc_children(os.getpid()))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> list[str]:
+    """Labels of *frame* and its callers, outermost first."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class RunProfiler:
+    """Profile the enclosed block and write a trace bundle when it ends.
+
+    Use as a context manager; the bundle path is :attr:`path`.
+
+    Args:
+        label: Name of the run, used in the file name (e.g. the query).
+        directory: Where bundles go (defaults to ``output/profiles``).
+        interval_s: Period of Python stack sampling.
+    """
+
+    def __init__(self, label: str, directory: Path | None = None, interval_s: float = SAMPLE_INTERVAL_S) -> None:
+        directory = Path(directory) if directory is not None else PROFILES_DIR
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        slug = re.sub(r"[^\w-]+", "_", label).strip("_")[:40] or "search"
+        self.path = directory / f"{stamp}_{slug}.zip"
+        self.label = label
+        self.interval_s = interval_s
+        self.summary: dict = {}
+        self.error: str | None = None  # Set when the bundle could not be written
+        self._pid = os.getpid()
+        self._events: list[dict] = []
+        self._leaves: Counter[str] = Counter()
+        self._samples = 0
+        self._open: dict[int, list[tuple[str, float]]] = {}  # tid -> open frames (label, start µs)
+        self._thread_names: dict[int, str] = {}
+        self._threads: set[int] = set()  # idents of the run's threads
+        self._peak_python = 0
+        self._peak_children = 0
+        self._spans: list[SpanRecord] = []
+        self._playwright_traces: list[Path] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._workdir: Path | None = None
+        self._token = None
+        self._t0 = 0.0
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._t0) * 1e6
+
+    def __enter__(self) -> "RunProfiler":
+        self._workdir = Path(tempfile.mkdtemp(prefix="profile_"))
+        self._t0 = time.perf_counter()
+        self._token = _active.set(self)
+        self.add_thread()
+        self._sampler = threading.Thread(target=self._sample_loop, name="run-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._sampler.join()
+        _active.reset(self._token)
+        try:
+            self._write_bundle()
+        except OSError as exc:
+            self.error = f"профиль не сохранён: {exc}"
+        finally:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+
+    def add_thread(self) -> None:
+        """Include the calling thread in the stack samples."""
+        with self._lock:
+            self._threads.add(threading.get_ident())
+
+    def attach_spans(self, records: list[SpanRecord]) -> None:
+        """Include the stage spans of a :func:`~core.metrics.collect_spans` block.
+
+        The collection must start right after the profiler, as span times are
+        taken relative to its start.
+        """
+        self._spans = records
+
+    def save_playwright_trace(self, tracing, source: str) -> None:
+        """Stop Playwright *tracing* (started by the caller) into the bundle."""
+        with self._lock:
+            path = self._workdir / f"{source}-{len(self._playwright_traces) + 1}.zip"
+            self._playwright_traces.append(path)
+        tracing.stop(path=str(path))
+
+    # -- sampling ---------------------------------------------------------
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        next_memory = 0.0
+        while not self._stop.is_set():
+            now = self._now_us()
+            self._sample_stacks(now, own)
+            if now >= next_memory:
+                self._sample_memory(now)
+                next_memory = now + MEMORY_INTERVAL_S * 1e6
+            self._stop.wait(self.interval_s)
+        end = self._now_us()
+        for tid in list(self._open):
+            self._close_frames(tid, 0, end)
+        self._sample_memory(end)
+
+    def _sample_stacks(self, now: float, own: int) -> None:
+        current = sys._current_frames()
+        with self._lock:
+            # Forget finished threads, so a reused ident is not sampled
+            self._threads &= set(current)
+            frames = {tid: current[tid] for tid in self._threads if tid != own}
+        for thread in threading.enumerate():
+            if thread.ident in frames:
+                self._thread_names.setdefault(thread.ident, thread.name)
+        for tid, frame in frames.items():
+            stack = _stack(frame)
+            self._samples += 1
+            if stack:
+                self._leaves[stack[-1]] += 1
+            opened = self._open.setdefault(tid, [])
+            common = 0
+            while common < min(len(opened), len(stack)) and opened[common][0] == stack[common]:
+                common += 1
+            self._close_frames(tid, common, now)
+            opened.extend((label, now) for label in stack[common:])
+        for tid in set(self._open) - set(frames):  # Threads that finished
+            self._close_frames(tid, 0, now)
+            del self._open[tid]
+
+    def _close_frames(self, tid: int, keep: int, now: float) -> None:
+        opened = self._open[tid]
+        while len(opened) > keep:
+            label, start = opened.pop()
+            self._events.append(
+                {"ph": "X", "cat": "python", "name": label, "pid": self._pid, "tid": tid,
+                 "ts": round(start, 1), "dur": round(max(now - start, 1.0), 1)}
+            )
+
+    def _sample_memory(self, now: float) -> None:
+        python, children = memory_usage()
+        python = python or 0
+        self._peak_python = max(self._peak_python, python)
+        self._peak_children = max(self._peak_children, children)
+        self._events.append(
+            {"ph": "C", "name": "memory_mb", "pid": self._pid, "ts": round(now, 1),
+             "args": {"python": round(python / 2**20, 1), "browser": round(children / 2**20, 1)}}
+        )
+
+    # -- output -----------------------------------------------------------
+
+    def _trace_events(self) -> list[dict]:
+        events = [
+            {"ph": "M", "name": "process_name", "pid": self._pid, "args": {"name": f"search: {self.label}"}},
+            {"ph": "M", "name": "thread_name", "pid": self._pid, "tid": _STAGES_TID, "args": {"name": "stages"}},
+            {"ph": "M", "name": "thread_sort_index", "pid": self._pid, "tid": _STAGES_TID, "args": {"sort_index": -1}},
+        ]
+        for tid in {event["tid"] for event in self._events if "tid" in event}:
+            name = self._thread_names.get(tid, str(tid))
+            events.append({"ph": "M", "name": "thread_name", "pid": self._pid, "tid": tid, "args": {"name": name}})
+        for record in self._spans:
+            events.append(
+                {"ph": "X", "cat": "stage", "name": record.name, "pid": self._pid, "tid": _STAGES_TID,
+                 "ts": round(record.start * 1e6, 1), "dur": round(record.duration_s * 1e6, 1),
+                 "args": {**record.labels, "error": record.error}}
+            )
+        return events + self._events
+
+    def _write_bundle(self) -> None:
+        elapsed_s = time.perf_counter() - self._t0
+        self.summary = {
+            "label": self.label,
+            "duration_s": round(elapsed_s, 3),
+            "python_peak_rss_mb": round(self._peak_python / 2**20, 1),
+            "browser_peak_rss_mb": round(self._peak_children / 2**20, 1),
+            "memory_scope": "whole process and all of its child processes, including concurrent runs",
+            "stack_samples": self._samples,
+            "sample_interval_s": self.interval_s,
+            "top_functions": [
+                {"function": label, "samples": count}
+                for label, count in self._leaves.most_common(TOP_FUNCTIONS)
+            ],
+            "playwright_traces": [f"playwright/{path.name}" for path in self._playwright_traces if path.exists()],
+        }
+        trace = {"traceEvents": self._trace_events(), "displayTimeUnit": "ms", "otherData": self.summary}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".zip.tmp")
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+            bundle.writestr("trace.json", json.dumps(trace, ensure_ascii=False))
+            bundle.writestr("summary.json", json.dumps(self.summary, ensure_ascii=False, indent=2))
+            for path in self._playwright_traces:
+                if path.exists():
+                    bundle.write(path, f"playwright/{path.name}")
+        os.replace(tmp, self.path)
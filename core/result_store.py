@@ -0,0 +1,272 @@
+"""Shared on-disk store of search results, queried one page at a time.
+
+Every finished search is written once to ``output/results/<run_id>.parquet``
+and listed in ``manifest.json``. Sessions keep only the run id; the UI asks
+:meth:`ResultStore.query` for the page it displays, with the text filter,
+source filter and sort pushed down to the columnar file. DuckDB runs the
+query when it is installed; otherwise :mod:`pyarrow.dataset` filters the
+file and only the requested slice is converted to pandas.
+
+Only the most recent :data:`MAX_RUNS` runs are kept. The UI, the API and
+the scheduler share the store, so the manifest is only rewritten under a
+:func:`~core.file_lock.file_lock`.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import math
+import os
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from core.export_excel import CHUNK_ROWS
+from core.file_lock import file_lock
+from core.schema import to_schema
+from core.settings import OUTPUT_DIR
+
+RESULTS_DIR = OUTPUT_DIR / "results"
+PAGE_SIZE = 100
+MAX_RUNS = 50
+BACKENDS = ("auto", "duckdb", "arrow")
+
+
+@dataclass
+class RunInfo:
+    """Manifest entry of one stored run."""
+
+    run_id: str
+    rows: int
+    query: str = ""
+    created_at: str = ""
+    columns: list[str] = field(default_factory=list)
+    sources: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ResultPage:
+    """One page of a (filtered, sorted) stored run."""
+
+    rows: pd.DataFrame
+    total: int  # rows matching the filter
+    page: int
+    page_size: int
+
+    @property
+    def pages(self) -> int:
+        return max(1, math.ceil(self.total / self.page_size))
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    return duckdb
+
+
+class ResultStore:
+    """Parquet files keyed by run id, plus a JSON manifest.
+
+    Args:
+        root: Directory of the store (defaults to ``output/results``).
+        max_runs: How many of the most recent runs are kept.
+        backend: ``"duckdb"``, ``"arrow"`` or ``"auto"`` (DuckDB if installed).
+    """
+
+    def __init__(self, root: Path | str | None = None, max_runs: int = MAX_RUNS, backend: str = "auto") -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend!r}")
+        self.root = Path(root) if root is not None else RESULTS_DIR
+        self.max_runs = max_runs
+        if backend == "auto":
+            backend = "duckdb" if _duckdb() is not None else "arrow"
+        self.backend = backend
+        self._lock = threading.Lock()
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    @property
+    def _lock_path(self) -> Path:
+        return self.root / "manifest.lock"
+
+    def _read_manifest(self) -> dict[str, RunInfo]:
+        if not self._manifest_path.exists():
+            return {}
+        raw = json.loads(self._manifest_path.read_text(encoding="utf-8"))
+        return {item["run_id"]: RunInfo(**item) for item in raw}
+
+    def _write_manifest(self, runs: dict[str, RunInfo]) -> None:
+        tmp = self._manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(
+            json.dumps([asdict(info) for info in runs.values()], ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self._manifest_path)
+
+    def path(self, run_id: str) -> Path:
+        return self.root / f"{run_id}.parquet"
+
+    def save(self, df: pd.DataFrame, query: str = "") -> str:
+        """Store *df* as a new run and return its id (oldest runs beyond the limit are dropped)."""
+        run_id = f"{datetime.datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.path(run_id).with_suffix(".parquet.tmp")
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path(run_id))
+        sources = sorted(df["source"].dropna().astype(str).unique()) if "source" in df else []
+        info = RunInfo(
+            run_id=run_id,
+            rows=len(df),
+            query=query,
+            created_at=datetime.datetime.now().isoformat(timespec="seconds"),
+            columns=[str(column) for column in df.columns],
+            sources=sources,
+        )
+        with self._lock, file_lock(self._lock_path):
+            runs = self._read_manifest()
+            runs[run_id] = info
+            for old in list(runs)[: max(0, len(runs) - self.max_runs)]:
+                del runs[old]
+                self.path(old).unlink(missing_ok=True)
+            self._write_manifest(runs)
+        return run_id
+
+    def info(self, run_id: str) -> RunInfo:
+        """Return the manifest entry of a run.
+
+        Raises:
+            KeyError: If the run is unknown or was already removed.
+        """
+        with self._lock:
+            return self._read_manifest()[run_id]
+
+    def load(self, run_id: str) -> pd.DataFrame:
+        """Return the whole run (for exports and e-mail)."""
+        self.info(run_id)
+        return to_schema(pd.read_parquet(self.path(run_id)))
+
+    def iter_chunks(self, run_id: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """Yield the run in slices of *chunk_rows* without loading it whole (for streaming exports)."""
+        import pyarrow.parquet as pq
+
+        self.info(run_id)
+        parquet = pq.ParquetFile(self.path(run_id))
+        if parquet.metadata.num_rows == 0:
+            yield to_schema(parquet.schema_arrow.empty_table().to_pandas())
+            return
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            yield to_schema(batch.to_pandas())
+
+    def delete(self, run_id: str) -> None:
+        with self._lock, file_lock(self._lock_path):
+            runs = self._read_manifest()
+            if runs.pop(run_id, None) is not None:
+                self._write_manifest(runs)
+            self.path(run_id).unlink(missing_ok=True)
+
+    def query(
+        self,
+        run_id: str,
+        page: int = 1,
+        page_size: int = PAGE_SIZE,
+        text: str = "",
+        source: str = "",
+        sort_by: str | None = None,
+        descending: bool = False,
+    ) -> ResultPage:
+        """Return one page of a run.
+
+        Args:
+            run_id: Id returned by :meth:`save`.
+            page: 1-based page number; clamped to the existing pages.
+            page_size: Rows per page.
+            text: Case-insensitive substring of the title or purchase number.
+            source: Keep only rows of this source.
+            sort_by: Column to sort by (stored order when ``None``).
+            descending: Sort in descending order.
+
+        Raises:
+            KeyError: If the run is unknown.
+            RuntimeError: If *sort_by* is not a column of the run.
+        """
+        info = self.info(run_id)
+        if sort_by is not None and sort_by not in info.columns:
+            raise RuntimeError(f"Нет колонки для сортировки: {sort_by}")
+        page_size = max(1, page_size)
+        text = text.strip()
+        if self.backend == "duckdb":
+            total, page, rows = self._query_duckdb(run_id, page, page_size, text, source, sort_by, descending)
+        else:
+            total, page, rows = self._query_arrow(run_id, page, page_size, text, source, sort_by, descending)
+        return ResultPage(to_schema(rows), total, page, page_size)
+
+    @staticmethod
+    def _clamp(page: int, page_size: int, total: int) -> int:
+        return min(max(1, page), max(1, math.ceil(total / page_size)))
+
+    def _query_duckdb(self, run_id, page, page_size, text, source, sort_by, descending):
+        where, params = [], []
+        if text:
+            where.append("(contains(lower(title), ?) OR contains(purchase_number, ?))")
+            params += [text.lower(), text]
+        if source:
+            where.append("CAST(source AS VARCHAR) = ?")
+            params.append(source)
+        sql_where = f" WHERE {' AND '.join(where)}" if where else ""
+        location = self.path(run_id).as_posix().replace("'", "''")
+        relation = f"read_parquet('{location}')"
+        connection = _duckdb().connect()
+        try:
+            total = connection.execute(f"SELECT count(*) FROM {relation}{sql_where}", params).fetchone()[0]
+            page = self._clamp(page, page_size, total)
+            order = ""
+            if sort_by is not None:
+                quoted = '"' + sort_by.replace('"', '""') + '"'
+                order = f" ORDER BY {quoted} {'DESC' if descending else 'ASC'} NULLS LAST"
+            rows = connection.execute(
+                f"SELECT * FROM {relation}{sql_where}{order} LIMIT ? OFFSET ?",
+                [*params, page_size, (page - 1) * page_size],
+            ).fetchdf()
+        finally:
+            connection.close()
+        return total, page, rows
+
+    def _query_arrow(self, run_id, page, page_size, text, source, sort_by, descending):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.path(run_id), format="parquet")
+        condition = None
+        if text:
+            condition = pc.match_substring(
+                pc.field("title"), text, ignore_case=True
+            ) | pc.match_substring(pc.field("purchase_number"), text)
+        if source:
+            by_source = pc.field("source").cast("string") == source
+            condition = by_source if condition is None else condition & by_source
+        table = dataset.to_table(filter=condition)
+        total = table.num_rows
+        page = self._clamp(page, page_size, total)
+        if sort_by is not None:
+            column = table.column(sort_by)
+            if pa.types.is_dictionary(column.type):
+                # sort_indices does not support dictionary (category) columns
+                column = column.cast(column.type.value_type)
+            indices = pc.sort_indices(
+                pa.table({sort_by: column}),
+                sort_keys=[(sort_by, "descending" if descending else "ascending")],
+            )
+            table = table.take(indices.slice((page - 1) * page_size, page_size))
+        else:
+            table = table.slice((page - 1) * page_size, page_size)
+        return total, page, table.to_pandas()
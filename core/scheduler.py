@@ -0,0 +1,428 @@
+"""Saved search profiles run on a schedule, with new-results digests.
+
+A profile is a named :class:`~core.settings.SearchSettings` plus a run
+interval. :class:`Scheduler` checks the saved profiles periodically and runs
+the due ones on a bounded thread pool; each run starts after a random delay
+so a batch of profiles does not hit the portal at the same moment.
+
+Every run is diffed against the previous run of the same profile: the
+purchases that were not there before, and the ones whose content changed
+since the profile last saw them (:mod:`core.change_tracking`), are e-mailed
+as one digest per recipient, however many profiles that recipient follows.
+
+A profile saved with a date range ending on the day it was saved keeps a
+rolling window (``days_back``) instead, resolved on the day of every run, so
+its digests keep covering the latest purchases.
+
+Profiles are stored in ``output/profiles.json`` without SMTP credentials;
+unattended runs take them from the environment (see
+:func:`core.email_mailru.smtp_credentials_from_env`). The UI and the
+scheduler both write the file, so every change holds a lock file
+(:func:`core.file_lock.file_lock`).
+
+Run headless with ``python -m core.scheduler``; with ``CACHE_WARM_HOURS``
+set, the same process also runs the :class:`~core.cache_warmer.CacheWarmer`.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields, replace
+from pathlib import Path
+
+import pandas as pd
+
+from core.admission import request_context
+from core.change_tracking import ChangeTracker
+from core.email_mailru import parse_recipients, smtp_credentials_from_env
+from core.file_lock import file_lock
+from core.mail_packaging import package_results
+from core.mail_queue import MailQueue
+from core.merge import row_key
+from core.metrics import start_http_server
+from core.pipeline import run_search
+from core.settings import OUTPUT_DIR, SearchSettings
+
+logger = logging.getLogger(__name__)
+
+PROFILES_PATH = OUTPUT_DIR / "profiles.json"
+SNAPSHOT_DIR = OUTPUT_DIR / "profile_snapshots"
+DEFAULT_WORKERS = 2
+DEFAULT_JITTER_S = 120.0
+TICK_S = 60.0
+_SECRET_FIELDS = ("smtp_login", "smtp_password")
+# Taken from the environment of the process that runs the profile
+_DEPLOYMENT_FIELDS = ("ai_workers",)
+_DATE_FIELDS = ("date_from", "date_to")
+
+
+@dataclass
+class SearchProfile:
+    """A saved search that is re-run every *interval_hours*.
+
+    Digests go to ``settings.email_recipient`` (comma-separated addresses).
+    With ``days_back`` set, the dates of ``settings`` are ignored and every
+    run searches the last ``days_back`` days up to the day it runs.
+    """
+
+    name: str
+    settings: SearchSettings
+    interval_hours: float = 24.0
+    enabled: bool = True
+    last_run: float | None = None  # Unix time of the last finished or failed run
+    days_back: int | None = None
+
+    @classmethod
+    def from_search(
+        cls,
+        name: str,
+        settings: SearchSettings,
+        interval_hours: float = 24.0,
+        today: datetime.date | None = None,
+    ) -> SearchProfile:
+        """Profile of a search; a date range ending *today* is saved as a rolling window."""
+        today = today or datetime.date.today()
+        if settings.date_to == today and settings.date_from is not None:
+            days_back = (today - settings.date_from).days
+            settings = replace(settings, date_from=None, date_to=None)
+            return cls(name, settings, interval_hours=interval_hours, days_back=days_back)
+        return cls(name, settings, interval_hours=interval_hours)
+
+    def settings_on(self, day: datetime.date) -> SearchSettings:
+        """Settings of a run on *day*, with a rolling window resolved to dates."""
+        if self.days_back is None:
+            return self.settings
+        return replace(
+            self.settings, date_from=day - datetime.timedelta(days=self.days_back), date_to=day
+        )
+
+    def is_due(self, now: float) -> bool:
+        if not self.enabled:
+            return False
+        return self.last_run is None or now - self.last_run >= self.interval_hours * 3600
+
+
+@dataclass
+class ProfileRun:
+    """Outcome of one scheduled run of a profile.
+
+    ``new_rows`` holds both new and changed purchases; ``changed`` counts the latter.
+    """
+
+    profile: SearchProfile
+    new_rows: pd.DataFrame
+    total: int
+    errors: list[str] = field(default_factory=list)
+    changed: int = 0
+
+
+def _settings_to_json(settings: SearchSettings) -> dict:
+    data = asdict(settings)
+    for name in _SECRET_FIELDS + _DEPLOYMENT_FIELDS:
+        data.pop(name, None)
+    for name in _DATE_FIELDS:
+        if data[name] is not None:
+            data[name] = data[name].isoformat()
+    return data
+
+
+def _settings_from_json(data: dict) -> SearchSettings:
+    known = {item.name for item in fields(SearchSettings)} - set(_SECRET_FIELDS + _DEPLOYMENT_FIELDS)
+    values = {name: value for name, value in data.items() if name in known}
+    for name in _DATE_FIELDS:
+        if values.get(name):
+            values[name] = datetime.date.fromisoformat(values[name])
+    return SearchSettings(**values)
+
+
+def _write_json(path: Path, data) -> None:
+    """Write *data* atomically so a crash never leaves a truncated file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _digest_key(row: dict) -> str:
+    """Identity used to tell new purchases from ones seen in the previous run."""
+    return row_key(row) or f"title:{str(row.get('title') or '').strip().lower()}"
+
+
+def new_rows(
+    results: pd.DataFrame, previous_keys: set[str] | None, changed_keys: set[str] | None = None
+) -> pd.DataFrame:
+    """Return the rows of *results* whose key is not in *previous_keys* or is in *changed_keys*.
+
+    Every row is new when there is no previous run.
+    """
+    if previous_keys is None or results.empty:
+        return results.reset_index(drop=True)
+    changed_keys = changed_keys or set()
+    keys = [_digest_key(row) for row in results.to_dict("records")]
+    mask = [key not in previous_keys or key in changed_keys for key in keys]
+    return results[mask].reset_index(drop=True)
+
+
+class ProfileStore:
+    """Saved profiles and the row keys of each profile's previous run.
+
+    Args:
+        path: JSON file holding the profiles (defaults to ``output/profiles.json``).
+        snapshot_dir: Directory for per-profile key snapshots.
+    """
+
+    def __init__(self, path: Path | None = None, snapshot_dir: Path | None = None) -> None:
+        self.path = Path(path) if path is not None else PROFILES_PATH
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir is not None else SNAPSHOT_DIR
+        self._lock = threading.Lock()
+        self._lock_path = self.path.with_name(self.path.name + ".lock")
+
+    def _read(self) -> dict[str, SearchProfile]:
+        if not self.path.exists():
+            return {}
+        raw = json.loads(self.path.read_text(encoding="utf-8"))
+        profiles = {}
+        for item in raw:
+            profile = SearchProfile(
+                name=item["name"],
+                settings=_settings_from_json(item["settings"]),
+                interval_hours=float(item.get("interval_hours", 24.0)),
+                enabled=bool(item.get("enabled", True)),
+                last_run=item.get("last_run"),
+                days_back=item.get("days_back"),
+            )
+            profiles[profile.name] = profile
+        return profiles
+
+    def _write(self, profiles: dict[str, SearchProfile]) -> None:
+        _write_json(
+            self.path,
+            [
+                {
+                    "name": profile.name,
+                    "settings": _settings_to_json(profile.settings),
+                    "interval_hours": profile.interval_hours,
+                    "enabled": profile.enabled,
+                    "last_run": profile.last_run,
+                    "days_back": profile.days_back,
+                }
+                for profile in profiles.values()
+            ],
+        )
+
+    def profiles(self) -> list[SearchProfile]:
+        with self._lock:  # The file is replaced atomically, so reading needs no file lock
+            return list(self._read().values())
+
+    def save(self, profile: SearchProfile) -> None:
+        """Add *profile* or replace the one with the same name."""
+        with self._lock, file_lock(self._lock_path):
+            profiles = self._read()
+            profiles[profile.name] = profile
+            self._write(profiles)
+
+    def delete(self, name: str) -> None:
+        with self._lock, file_lock(self._lock_path):
+            profiles = self._read()
+            if profiles.pop(name, None) is not None:
+                self._write(profiles)
+            self._snapshot_path(name).unlink(missing_ok=True)
+
+    def mark_run(self, name: str, finished_at: float) -> None:
+        with self._lock, file_lock(self._lock_path):
+            profiles = self._read()
+            if name in profiles:
+                profiles[name].last_run = finished_at
+                self._write(profiles)
+
+    def _snapshot_path(self, name: str) -> Path:
+        slug = re.sub(r"[^\w-]+", "_", name).strip("_")[:40]
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+        return self.snapshot_dir / f"{slug}_{digest}.json"
+
+    def previous_keys(self, name: str) -> set[str] | None:
+        """Return the row keys of the profile's previous run, or ``None``."""
+        path = self._snapshot_path(name)
+        if not path.exists():
+            return None
+        return set(json.loads(path.read_text(encoding="utf-8")))
+
+    def save_keys(self, name: str, results: pd.DataFrame) -> None:
+        keys = sorted({_digest_key(row) for row in results.to_dict("records")})
+        _write_json(self._snapshot_path(name), keys)
+
+
+class Scheduler:
+    """Runs due profiles on a bounded pool and mails new-results digests.
+
+    Args:
+        store: Where profiles and previous-run keys live.
+        workers: Maximum number of profiles searched at the same time.
+        jitter_s: Upper bound of the random delay before each run.
+        mail_queue: Queue used to send digests (a private one by default).
+        tracker: Change history used to find changed purchases
+            (``output/changes.sqlite`` by default).
+    """
+
+    def __init__(
+        self,
+        store: ProfileStore | None = None,
+        workers: int = DEFAULT_WORKERS,
+        jitter_s: float = DEFAULT_JITTER_S,
+        mail_queue: MailQueue | None = None,
+        tracker: ChangeTracker | None = None,
+    ) -> None:
+        self.store = store or ProfileStore()
+        self.tracker = tracker or ChangeTracker()
+        self.jitter_s = jitter_s
+        self.mail_queue = mail_queue or MailQueue()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="profile")
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_profile(self, profile: SearchProfile) -> ProfileRun:
+        """Search one profile and return the rows new or changed since its previous run."""
+        if self.jitter_s > 0 and self._stop.wait(random.uniform(0, self.jitter_s)):
+            return ProfileRun(profile, pd.DataFrame(), 0, ["остановлено"])
+        # Scheduled runs share one user in the batch lane, behind interactive searches.
+        # The key snapshot needs every row, so the pipeline must not drop unchanged ones.
+        # Digests need fresh rows: scrape, and refresh the result cache on the way.
+        settings = replace(
+            profile.settings_on(datetime.date.today()), track_changes=False, use_cache=True, cache_max_age_h=0
+        )
+        try:
+            with request_context("scheduler", priority="batch"):
+                outcome = run_search(settings)
+            previous = self.store.previous_keys(profile.name)
+            changes = self.tracker.record(outcome.results, scope=f"profile:{profile.name}")
+            changed_keys = {_digest_key(row) for row in changes.changed.to_dict("records")}
+            fresh = new_rows(outcome.results, previous, changed_keys)
+            changed = len(changed_keys & previous) if previous is not None else 0
+            # Keep the old snapshot if every source failed, so nothing is re-sent later
+            if not (outcome.errors and outcome.results.empty):
+                self.store.save_keys(profile.name, outcome.results)
+        finally:
+            # A failed run counts too: a broken profile waits its interval
+            # instead of hitting the portal again on every tick.
+            self.store.mark_run(profile.name, time.time())
+        return ProfileRun(profile, fresh, len(outcome.results), outcome.errors, changed)
+
+    def run_due(self, now: float | None = None) -> list[ProfileRun]:
+        """Run every due profile, send the digests and return the runs."""
+        now = time.time() if now is None else now
+        due = [profile for profile in self.store.profiles() if profile.is_due(now)]
+        runs = []
+        futures = [(profile, self._pool.submit(self.run_profile, profile)) for profile in due]
+        for profile, future in futures:
+            try:
+                runs.append(future.result())
+            except Exception as exc:
+                logger.exception("Profile %r failed", profile.name)
+                runs.append(ProfileRun(profile, pd.DataFrame(), 0, [str(exc)]))
+        if runs:
+            self.send_digests(runs)
+        return runs
+
+    def send_digests(self, runs: list[ProfileRun]) -> list[str]:
+        """Queue one e-mail per recipient with the new rows of all their profiles.
+
+        Returns:
+            Ids of the queued :class:`~core.mail_queue.MailQueue` jobs.
+        """
+        by_recipient: dict[str, list[ProfileRun]] = {}
+        for run in runs:
+            if run.new_rows.empty:
+                continue
+            for recipient in parse_recipients(run.profile.settings.email_recipient):
+                by_recipient.setdefault(recipient, []).append(run)
+
+        smtp_login, smtp_password = smtp_credentials_from_env()
+        job_ids = []
+        for recipient, recipient_runs in by_recipient.items():
+            digest = pd.concat(
+                [run.new_rows.assign(profile=run.profile.name) for run in recipient_runs],
+                ignore_index=True,
+            )
+            digest = digest[["profile", *[c for c in digest.columns if c != "profile"]]]
+            lines = [
+                f"{run.profile.name} («{run.profile.settings.query}»): "
+                f"новых {len(run.new_rows) - run.changed}, изменённых {run.changed} из {run.total}"
+                for run in recipient_runs
+            ]
+            plan = package_results(digest, filename="new_results.xlsx")
+            body = "Новые и изменённые закупки по сохранённым поискам:\n\n" + "\n".join(lines) + "\n"
+            if plan.note:
+                body += f"\n{plan.note}\n"
+            job_ids.append(
+                self.mail_queue.submit(
+                    recipients=[recipient],
+                    subject=f"Новые закупки: {len(digest)}",
+                    body=body,
+                    attachments=plan.attachments,
+                    one_per_message=plan.one_per_message,
+                    smtp_login=smtp_login,
+                    smtp_password=smtp_password,
+                )
+            )
+        return job_ids
+
+    def _loop(self, tick_s: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            self._stop.wait(tick_s)
+
+    def start(self, tick_s: float = TICK_S) -> None:
+        """Check for due profiles every *tick_s* seconds on a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(tick_s,), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if os.environ.get("METRICS_PORT"):
+        start_http_server(int(os.environ["METRICS_PORT"]))
+    scheduler = Scheduler(
+        workers=int(os.environ.get("SCHEDULER_WORKERS", DEFAULT_WORKERS)),
+        jitter_s=float(os.environ.get("SCHEDULER_JITTER_S", DEFAULT_JITTER_S)),
+    )
+    logger.info("Scheduler started with %d profiles", len(scheduler.store.profiles()))
+    scheduler.start(float(os.environ.get("SCHEDULER_TICK_S", TICK_S)))
+    warmer = None
+    if os.environ.get("CACHE_WARM_HOURS"):
+        from core.cache_warmer import CacheWarmer, parse_window
+
+        warmer = CacheWarmer(profiles=scheduler.store, window=parse_window(os.environ["CACHE_WARM_HOURS"]))
+        warmer.start()
+        logger.info("Cache warmer runs at %02d-%02d h", *warmer.window)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+        if warmer is not None:
+            warmer.stop()
+
+
+if __name__ == "__main__":
+    main()
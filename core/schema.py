@@ -0,0 +1,119 @@
+"""Typed column schema shared by sources, merge, ranking and export.
+
+Sources collect raw cell text and convert whole columns at once with
+:func:`to_schema`, instead of parsing prices and dates cell by cell. Typed
+columns make ``publish_date`` sort chronologically and keep memory compact:
+strings use the pandas ``string`` dtype (Arrow-backed when ``pyarrow`` is
+installed) and repeated labels are categorical.
+"""
+
+from __future__ import annotations
+
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+# Columns produced by every source, in display order
+COLUMNS = ["purchase_number", "title", "url", "price", "publish_date", "source"]
+
+STRING_COLUMNS = ("purchase_number", "title", "url")
+CATEGORY_COLUMNS = ("source", "region")
+
+DATE_FORMAT = "%d.%m.%Y"
+
+# Arrow types of the schema columns and of the columns later stages add
+# (pyarrow type aliases), see :func:`arrow_schema`
+ARROW_TYPES = {
+    "purchase_number": "string",
+    "title": "string",
+    "url": "string",
+    "price": "double",
+    "publish_date": "timestamp[ns]",
+    "source": "string",
+    "region": "string",
+    "change": "string",
+    "dup_group": "int64",
+    "documents": "int64",
+    "ai_score": "double",
+}
+
+
+def parse_prices(values: pd.Series) -> pd.Series:
+    """Vectorised price parser for strings like ``'1 234 567,89 руб.'``."""
+    if is_numeric_dtype(values.dtype):
+        return values.astype("float64")
+    cleaned = (
+        values.astype("string")
+        .str.replace(r"[^\d,.]", "", regex=True)
+        .str.replace(",", ".", regex=False)
+        .str.strip(".")
+    )
+    return pd.to_numeric(cleaned, errors="coerce").astype("float64")
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Vectorised date parser for portal dates (``12.03.2024``) and ISO dates."""
+    if is_datetime64_any_dtype(values.dtype):
+        return values.astype("datetime64[ns]")
+    text = values.astype("string").str.strip()
+    portal = text.str.extract(r"(\d{2}\.\d{2}\.\d{4})", expand=False)
+    parsed = pd.to_datetime(portal, format=DATE_FORMAT, errors="coerce")
+    fallback = parsed.isna() & text.fillna("").ne("")
+    if fallback.any():
+        parsed[fallback] = pd.to_datetime(text[fallback], format="ISO8601", errors="coerce")
+    return parsed.astype("datetime64[ns]")
+
+
+def to_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Return *df* with the shared typed schema applied.
+
+    Missing :data:`COLUMNS` are added empty, string columns never hold
+    missing values (empty string instead), ``price`` is ``float64``,
+    ``publish_date`` is ``datetime64[ns]`` and ``source``/``region`` are
+    categorical. Columns that already have the right dtype are not copied,
+    and extra columns are kept after the schema columns.
+    """
+    df = df.copy(deep=False)
+    for column in COLUMNS:
+        if column not in df.columns:
+            df[column] = pd.Series(index=df.index, dtype="object")
+
+    for column in STRING_COLUMNS:
+        if df[column].dtype != "string" or df[column].hasnans:
+            df[column] = df[column].astype("string").fillna("")
+    df["price"] = parse_prices(df["price"])
+    df["publish_date"] = parse_dates(df["publish_date"])
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+
+    extra = [column for column in df.columns if column not in COLUMNS]
+    return df[COLUMNS + extra]
+
+
+def to_record_batch(df: pd.DataFrame):
+    """Convert a schema DataFrame to a ``pyarrow.RecordBatch`` (requires pyarrow)."""
+    import pyarrow as pa
+
+    return pa.RecordBatch.from_pandas(to_schema(df), preserve_index=False)
+
+
+def arrow_schema(df: pd.DataFrame):
+    """Arrow schema for writing chunks with the columns of *df* (requires pyarrow).
+
+    Columns in :data:`ARROW_TYPES` get their fixed type, so a first chunk in
+    which such a column is all empty does not decide its type for the whole
+    file. Other columns are inferred from *df*; those without a value in it
+    are written as strings.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for name in df.columns:
+        if name in ARROW_TYPES:
+            type_ = pa.type_for_alias(ARROW_TYPES[name])
+        else:
+            type_ = pa.Schema.from_pandas(df[[name]], preserve_index=False).field(str(name)).type
+            if pa.types.is_null(type_):
+                type_ = pa.string()
+        fields.append(pa.field(str(name), type_))
+    return pa.schema(fields)
@@ -0,0 +1,231 @@
+"""Cache of scraped source results, with a log of requested searches.
+
+Scraping the portal is most of the latency of a search, and the team runs
+the same searches every day. :class:`SearchCache` keeps the merged source
+rows of a search, before change tracking, near-duplicates, documents and
+ranking, which still run on every search. They are keyed by the
+parameters that decide what the sources return (:data:`KEY_FIELDS`), along
+with the time they were scraped. A search with ``settings.use_cache`` is
+served from an entry younger than ``settings.cache_max_age_h``; the UI
+shows how old the data is.
+
+Rows are stored as Parquet by a :class:`~core.result_store.ResultStore`
+under ``output/search_cache/``. The index of entries and the log of
+requested searches sit next to it in SQLite; the log is what
+:mod:`core.cache_warmer` learns popular searches from. A date range ending
+on the day of the request ("the last 30 days") is logged relative to that
+day, so tomorrow's warm run covers tomorrow's range.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from core.metrics import inc
+from core.result_store import ResultStore
+from core.settings import OUTPUT_DIR, SearchSettings
+
+CACHE_DIR = OUTPUT_DIR / "search_cache"
+MAX_ENTRIES = 200
+REQUEST_LOG_DAYS = 30
+# Parameters that change what the sources return
+KEY_FIELDS = (
+    "query", "region", "date_from", "date_to", "doc_search", "extended_search", "limit", "network_mode",
+)
+# Also remembered per request, so a warm run ranks like the searches it stands in for
+_WARM_FIELDS = ("near_duplicates", "ai_ranking", "ai_mode", "ai_model", "ai_allow_download")
+_DATE_FIELDS = ("date_from", "date_to")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    query TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS requests (
+    pattern_key TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    requested_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS requests_time ON requests (requested_at);
+"""
+
+
+def _value(settings: SearchSettings, name: str):
+    value = getattr(settings, name)
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def cache_key(settings: SearchSettings) -> str:
+    """Key of the cache entry for *settings* (case and spacing of the query do not matter)."""
+    values = {name: _value(settings, name) for name in KEY_FIELDS}
+    values["query"] = " ".join(settings.query.lower().split())
+    payload = json.dumps(values, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _pattern(settings: SearchSettings, day: datetime.date) -> dict:
+    """Request-log form of *settings*; a range ending on *day* is kept relative to it."""
+    values = {name: _value(settings, name) for name in KEY_FIELDS + _WARM_FIELDS}
+    if settings.date_to == day:
+        values["date_to"] = {"days_ago": 0}
+        if settings.date_from is not None:
+            values["date_from"] = {"days_ago": (day - settings.date_from).days}
+    return values
+
+
+def _pattern_key(pattern: dict) -> str:
+    values = {**pattern, "query": " ".join(pattern["query"].lower().split())}
+    payload = json.dumps(values, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _materialize(pattern: dict, day: datetime.date) -> SearchSettings:
+    """Settings of a logged request as they would be asked for on *day*."""
+    values = dict(pattern)
+    for name in _DATE_FIELDS:
+        value = values.get(name)
+        if isinstance(value, dict):
+            values[name] = day - datetime.timedelta(days=value["days_ago"])
+        elif value:
+            values[name] = datetime.date.fromisoformat(value)
+    return SearchSettings(**values)
+
+
+@dataclass
+class CachedResults:
+    """Source rows served from the cache, with the time they were scraped."""
+
+    results: pd.DataFrame
+    fetched_at: float
+
+    @property
+    def age_s(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class SearchCache:
+    """Merged source rows per search in Parquet, indexed in SQLite.
+
+    Args:
+        root: Directory of the cache (defaults to ``output/search_cache``).
+        max_entries: How many cached searches are kept; the oldest are dropped.
+    """
+
+    def __init__(self, root: Path | None = None, max_entries: int = MAX_ENTRIES) -> None:
+        self.root = Path(root) if root is not None else CACHE_DIR
+        self.store = ResultStore(self.root / "runs", max_runs=max_entries)
+        self.path = self.root / "index.sqlite"
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if not self._initialized:
+                self.root.mkdir(parents=True, exist_ok=True)
+                with closing(sqlite3.connect(self.path)) as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                self._initialized = True
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:  # One transaction: committed on success, rolled back on error
+                yield conn
+
+    def fetched_at(self, settings: SearchSettings) -> float | None:
+        """Return when the cached rows of *settings* were scraped (``None`` if not cached)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT fetched_at FROM entries WHERE key = ?", (cache_key(settings),)).fetchone()
+        return row[0] if row else None
+
+    def get(self, settings: SearchSettings, max_age_s: float) -> CachedResults | None:
+        """Return the cached rows of *settings* if they are at most *max_age_s* old."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT run_id, fetched_at FROM entries WHERE key = ?", (cache_key(settings),)
+            ).fetchone()
+        if row is None or time.time() - row[1] > max_age_s:
+            inc("search_cache_lookups_total", result="miss")
+            return None
+        run_id, fetched_at = row
+        try:
+            results = self.store.load(run_id)
+        except (KeyError, FileNotFoundError):
+            inc("search_cache_lookups_total", result="miss")  # Dropped from the store
+            return None
+        inc("search_cache_lookups_total", result="hit")
+        return CachedResults(results, fetched_at)
+
+    def put(self, settings: SearchSettings, results: pd.DataFrame, fetched_at: float | None = None) -> None:
+        """Cache the merged source rows of *settings*, replacing an older entry."""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        key = cache_key(settings)
+        run_id = self.store.save(results, query=settings.query)
+        with self._connect() as conn:
+            previous = conn.execute("SELECT run_id FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, run_id, fetched_at, settings.query),
+            )
+        if previous is not None:
+            self.store.delete(previous[0])
+
+    def note_request(self, settings: SearchSettings, requested_at: float | None = None) -> None:
+        """Log a search a user asked for; the log older than :data:`REQUEST_LOG_DAYS` is dropped."""
+        requested_at = time.time() if requested_at is None else requested_at
+        pattern = _pattern(settings, datetime.date.fromtimestamp(requested_at))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO requests VALUES (?, ?, ?)",
+                (_pattern_key(pattern), json.dumps(pattern, ensure_ascii=False), requested_at),
+            )
+            conn.execute("DELETE FROM requests WHERE requested_at < ?", (requested_at - REQUEST_LOG_DAYS * 86400,))
+
+    def popular(
+        self, limit: int = 10, since: float | None = None, day: datetime.date | None = None
+    ) -> list[tuple[SearchSettings, int]]:
+        """Return the most requested searches since *since*, with their request counts.
+
+        Each search comes with the settings of its latest request, with
+        relative date ranges resolved for *day* (today by default).
+        """
+        since = time.time() - REQUEST_LOG_DAYS * 86400 if since is None else since
+        day = datetime.date.today() if day is None else day
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT pattern_key, pattern FROM requests WHERE requested_at >= ? ORDER BY requested_at",
+                (since,),
+            ).fetchall()
+        counts: dict[str, int] = {}
+        latest: dict[str, tuple[int, str]] = {}
+        for position, (key, pattern) in enumerate(rows):
+            counts[key] = counts.get(key, 0) + 1
+            latest[key] = (position, pattern)
+        # Ties go to the search requested most recently
+        ranked = sorted(counts, key=lambda key: (counts[key], latest[key][0]), reverse=True)[:limit]
+        return [(_materialize(json.loads(latest[key][1]), day), counts[key]) for key in ranked]
+
+
+_cache: SearchCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Return the process-wide search cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache()
+        return _cache
@@ -1,9 +1,14 @@
 """Runtime configuration dataclasses for the search application."""
 
+import os
 from dataclasses import dataclass
 from datetime import date
+from pathlib import Path
 from typing import Optional
 
+# Directory for exports and on-disk state (mounted as a volume in Docker)
+OUTPUT_DIR = Path(os.environ.get("OUTPUT_DIR", "output"))
+
 
 @dataclass
 class SearchSettings:
@@ -16,11 +21,42 @@ class SearchSettings:
     doc_search: bool = True
     extended_search: bool = True
     limit: int = 50
+    near_duplicates: str = "off"  # "off" | "mark" | "collapse"
     ai_ranking: bool = False
     ai_threshold: float = 0.5
+    ai_top_k: int = 0  # keep only the N best-ranked rows; 0 keeps all
     ai_mode: str = "balanced"  # "fast" | "balanced" | "quality"
     ai_model: str = ""
     ai_allow_download: bool = False
+    # Processes encoding large result sets (core.ai_ranker.encode_parallel);
+    # a deployment setting, 1 encodes in the search's own process
+    ai_workers: int = int(os.environ.get("AI_WORKERS", "1"))
+
+    # Keep only purchases that are new or changed since the previous search
+    # with the same query and region (see core.change_tracking)
+    track_changes: bool = False
+
+    # Download the attachments of docSearch hits, index their text and rank
+    # on it (see core.documents); the budget caps the download of one run
+    documents: bool = False
+    documents_budget_mb: int = 200
+
+    # Serve the source rows of the same search scraped within cache_max_age_h
+    # hours from the result cache (see core.search_cache); 0 only refreshes it
+    use_cache: bool = False
+    cache_max_age_h: float = 12.0
+
+    # Semantic archive of every scraped purchase (optional)
+    archive_enabled: bool = False
+
+    # Network access of the Playwright sources: "live" | "record" | "replay".
+    # Record/replay use one HAR archive per source in the set named by
+    # har_path, a sub-directory of OUTPUT_DIR / "har", see core.sources.browser.
+    network_mode: str = "live"
+    har_path: str = ""
+
+    # Write a profiling bundle of the run to OUTPUT_DIR / "profiles" (core.profiling)
+    profile: bool = False
 
     # E-mail delivery (optional)
     email_recipient: str = ""
@@ -0,0 +1,182 @@
+"""Shared Playwright browser session for the portal sources.
+
+Besides normal live scraping, a session can record its traffic to a HAR
+archive or replay a recorded archive instead of touching the network
+(``SearchSettings.network_mode``), so a scrape can be reproduced
+deterministically and offline. Each source uses its own archive,
+``output/har/<har_path>/<source>.har.zip``; ``har_path`` names a set of
+archives and may not point outside ``output/har``, so users of a shared
+deployment cannot make the server read or write files elsewhere.
+
+A session can also be given a stop event (see :mod:`core.jobs`): once it is
+set, every further request of the page is aborted, so waits and navigations
+fail fast and the browser is torn down without running into timeouts.
+
+Long-lived workers (the job manager and the API) call
+:func:`keep_browser_warm` once per thread: that thread then keeps its
+Chromium process between runs and every run only opens a fresh browser
+context, which avoids paying the browser start-up on each search. The
+Playwright sync API is bound to the thread that started it, so warm
+browsers are per thread rather than shared across threads.
+"""
+
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from core.admission import admit, current_on_wait
+from core.egress import Lease, get_pool
+from core.metrics import inc
+from core.profiling import active_profiler
+from core.settings import OUTPUT_DIR, SearchSettings
+
+NETWORK_MODES = ("live", "record", "replay")
+HAR_DIR = OUTPUT_DIR / "har"
+
+
+def har_file(settings: SearchSettings, source: str) -> Path:
+    """Return the HAR archive used by *source* for record/replay.
+
+    Raises:
+        RuntimeError: If ``settings.har_path`` leads outside :data:`HAR_DIR`.
+    """
+    root = HAR_DIR.resolve()
+    directory = (root / settings.har_path).resolve() if settings.har_path else root
+    if not directory.is_relative_to(root):
+        raise RuntimeError(f"Набор HAR-архивов должен находиться внутри {HAR_DIR}: {settings.har_path}")
+    return directory / f"{source}.har.zip"
+
+
+def stopped(stop: threading.Event | None) -> bool:
+    """Return ``True`` once the optional stop event has been set."""
+    return stop is not None and stop.is_set()
+
+
+_local = threading.local()
+
+
+def keep_browser_warm() -> None:
+    """Reuse one Chromium process for all runs on the calling thread.
+
+    Meant as a thread-pool ``initializer``; the browser is started on first
+    use and relaunched if it has crashed.
+    """
+    _local.warm = True
+
+
+def _warm_browser():
+    browser = getattr(_local, "browser", None)
+    if browser is not None and browser.is_connected():
+        return browser
+    if getattr(_local, "playwright", None) is None:
+        from playwright.sync_api import sync_playwright
+
+        _local.playwright = sync_playwright().start()
+    _local.browser = _local.playwright.chromium.launch(**_launch_options())
+    return _local.browser
+
+
+def _launch_options() -> dict:
+    options = {"headless": True}
+    if get_pool().uses_proxies:
+        # Lets every context set its own proxy (required by Chromium on Windows);
+        # contexts on the direct route override it with direct:// (Lease.context_options)
+        options["proxy"] = {"server": "http://per-context"}
+    return options
+
+
+def _on_response(response, source: str, lease: Lease) -> None:
+    """Count transferred bytes and feed the endpoint's health score."""
+    length = response.headers.get("content-length", "")
+    if length.isdigit():
+        inc("bytes_total", int(length), source=source)
+    timing = response.request.timing
+    latency_s = timing["responseStart"] / 1000 if timing.get("responseStart", -1) >= 0 else None
+    lease.record_response(response.status, latency_s)
+
+
+@contextmanager
+def open_page(settings: SearchSettings, source: str, stop: threading.Event | None = None) -> Iterator:
+    """Yield a page of headless Chromium set up for *settings.network_mode*.
+
+    * ``live`` — plain network access;
+    * ``record`` — all traffic is saved to :func:`har_file` when the session ends;
+    * ``replay`` — responses are served from :func:`har_file`; requests that
+      are not in the archive are aborted instead of going to the network.
+
+    With a *stop* event, requests made after it is set are aborted.
+
+    The session first waits for a slot of the admission controller
+    (:mod:`core.admission`), which caps open browser contexts overall and
+    per user, and then leases a proxy and fingerprint from the egress pool
+    (:mod:`core.egress`); both waits are reported to the request's
+    ``on_wait`` callback.
+
+    When the run is profiled (:mod:`core.profiling`), a Playwright trace of the
+    context is added to the profile bundle.
+
+    Raises:
+        RuntimeError: On an unknown mode, a missing archive in ``replay`` or
+            a ``har_path`` outside ``output/har``.
+    """
+    mode = settings.network_mode
+    if mode not in NETWORK_MODES:
+        raise RuntimeError(f"Неизвестный режим сети: {mode!r} (ожидается live, record или replay).")
+    har = har_file(settings, source) if mode != "live" else None
+    if mode == "replay" and not har.exists():
+        raise RuntimeError(f"HAR-архив для {source} не найден: {har}. Сначала выполните поиск в режиме record.")
+
+    har_options = {}
+    if mode == "record":
+        har.parent.mkdir(parents=True, exist_ok=True)
+        har_options = {"record_har_path": str(har), "record_har_mode": "full"}
+
+    replay_har = har if mode == "replay" else None
+    with admit(stop), get_pool().lease(stop, on_wait=current_on_wait()) as lease:
+        context_options = {**lease.context_options(), **har_options}
+        if getattr(_local, "warm", False):
+            with _page_in(_warm_browser(), context_options, replay_har, source, stop, lease) as page:
+                yield page
+            return
+
+        from playwright.sync_api import sync_playwright
+
+        with sync_playwright() as pw:
+            browser = pw.chromium.launch(**_launch_options())
+            try:
+                with _page_in(browser, context_options, replay_har, source, stop, lease) as page:
+                    yield page
+            finally:
+                browser.close()
+
+
+@contextmanager
+def _page_in(
+    browser, context_options: dict, replay_har: Path | None, source: str, stop, lease: Lease
+) -> Iterator:
+    """Open a fresh context and page on *browser*; the context is closed afterwards."""
+    context = browser.new_context(**context_options)
+    profiler = active_profiler()
+    try:
+        if profiler is not None:
+            context.tracing.start(name=source, screenshots=True, snapshots=True)
+        if replay_har is not None:
+            context.route_from_har(str(replay_har), not_found="abort")
+        page = context.new_page()
+        page.on("response", lambda response: _on_response(response, source, lease))
+        # Requests aborted by a stop request are not the endpoint's fault
+        page.on("requestfailed", lambda request: stopped(stop) or lease.record(False))
+        if stop is not None:
+            # Page routes run before the context's HAR route; fallback() hands over to it
+            page.route(
+                "**/*",
+                lambda route: route.abort("aborted") if stop.is_set() else route.fallback(),
+            )
+        yield page
+    finally:
+        if profiler is not None:
+            profiler.save_playwright_trace(context.tracing, source)
+        context.close()  # Writes the HAR archive in record mode
@@ -3,31 +3,23 @@
 from __future__ import annotations
 
 import re
+import threading
 import time
+from typing import Callable
 
 import pandas as pd
 from playwright.sync_api import TimeoutError as PlaywrightTimeout
-from playwright.sync_api import sync_playwright
 
+from core.metrics import inc, span
+from core.schema import COLUMNS, to_schema
 from core.settings import SearchSettings
+from core.sources.browser import open_page, stopped
 
+SOURCE = "extendedsearch"
 BASE_URL = "https://zakupki.gov.ru/epz/order/extendedsearch/results.html"
 PAGE_GOTO_TIMEOUT_MS = 90_000
 PAGE_GOTO_RETRIES = 3
 
-# Columns produced by this source
-COLUMNS = ["purchase_number", "title", "url", "price", "publish_date", "source"]
-
-
-def _parse_price(text: str) -> float | None:
-    """Extract a numeric price from a string like '1 234 567,89 руб.'"""
-    cleaned = re.sub(r"[^\d,.]", "", text.replace("\xa0", "").replace(" ", ""))
-    cleaned = cleaned.replace(",", ".")
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
-
 
 def _set_region(page, region: str) -> None:
     """Open the «Мой регион» modal and select the requested region."""
@@ -121,32 +113,32 @@ def _dismiss_blocking_modal(page) -> None:
         pass
 
 
-def search_orders(settings: SearchSettings) -> pd.DataFrame:
+def search_orders(
+    settings: SearchSettings,
+    on_batch: Callable[[pd.DataFrame], None] | None = None,
+    stop: threading.Event | None = None,
+) -> pd.DataFrame:
     """Scrape search results from the extendedsearch (orders) endpoint.
 
     Args:
         settings: Runtime search parameters.
+        on_batch: Optional callback receiving each results page as a DataFrame
+            as soon as it is extracted (used to overlap ranking with scraping).
+        stop: Optional event; once set, in-flight requests are aborted and
+            the rows scraped so far are returned.
 
     Returns:
-        DataFrame with columns: purchase_number, title, url, price,
-        publish_date, source.
+        DataFrame in the :mod:`core.schema` layout: purchase_number, title,
+        url, price (float), publish_date (datetime), source.
     """
     rows: list[dict] = []
 
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=True)
-        ctx = browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            )
-        )
-        page = ctx.new_page()
-
+    with open_page(settings, SOURCE, stop=stop) as page:
         try:
-            _open_results_page(page)
-            _set_region(page, settings.region)
+            with span("source.open_page", source=SOURCE):
+                _open_results_page(page)
+            with span("source.set_region", source=SOURCE):
+                _set_region(page, settings.region)
 
             # Fill in the search query
             search_input = page.locator(
@@ -173,94 +165,102 @@ def search_orders(settings: SearchSettings) -> pd.DataFrame:
                 except Exception:
                     pass
 
-            _dismiss_blocking_modal(page)
-            search_button = page.locator(
-                "button[type='submit'], input[type='submit'], "
-                "button:has-text('Найти'), .search-btn"
-            ).first
-            try:
-                search_button.click(timeout=10_000)
-            except PlaywrightTimeout:
+            with span("source.submit", source=SOURCE):
                 _dismiss_blocking_modal(page)
-                search_button.click(timeout=10_000, force=True)
-            page.wait_for_load_state("networkidle", timeout=20_000)
-
-            while len(rows) < settings.limit:
-                page.wait_for_selector(
-                    ".search-registry-entry-block, .registry-entry__form, "
-                    "div.search-registry-entry",
-                    timeout=15_000,
-                )
-                cards = page.locator(
-                    ".search-registry-entry-block, .registry-entry__form, "
-                    "div.search-registry-entry"
-                ).all()
-
-                for card in cards:
-                    if len(rows) >= settings.limit:
-                        break
-                    try:
-                        num_el = card.locator(
-                            ".registry-entry__header-mid__number a, "
-                            "a[href*='notice/'], a[href*='purchaseNumber']"
-                        ).first
-                        href = num_el.get_attribute("href") or ""
-                        full_url = (
-                            href if href.startswith("http")
-                            else f"https://zakupki.gov.ru{href}"
-                        )
-                        purchase_number_match = re.search(
-                            r"purchaseNumber=(\d+)|/(\d{19,})", href
-                        )
-                        purchase_number = (
-                            purchase_number_match.group(1) or purchase_number_match.group(2)
-                            if purchase_number_match else ""
-                        )
-
-                        title_el = card.locator(
-                            ".registry-entry__body-value, .lot-name, "
-                            ".search-result__name"
-                        ).first
-                        title = title_el.inner_text().strip()
-
-                        price_el = card.locator(
-                            ".price-block__cost, .registry-entry__body-value:has-text('руб')"
-                        ).first
-                        price_text = price_el.inner_text().strip() if price_el.count() else ""
-                        price = _parse_price(price_text)
-
-                        date_el = card.locator(
-                            ".data-block__value:first-of-type, "
-                            ".registry-entry__body-value:has-text('.')"
-                        ).first
-                        publish_date = date_el.inner_text().strip() if date_el.count() else ""
-
-                        rows.append(
-                            {
-                                "purchase_number": purchase_number,
-                                "title": title,
-                                "url": full_url,
-                                "price": price,
-                                "publish_date": publish_date,
-                                "source": "extendedsearch",
-                            }
-                        )
-                    except Exception:
-                        continue
+                search_button = page.locator(
+                    "button[type='submit'], input[type='submit'], "
+                    "button:has-text('Найти'), .search-btn"
+                ).first
+                try:
+                    search_button.click(timeout=10_000)
+                except PlaywrightTimeout:
+                    _dismiss_blocking_modal(page)
+                    search_button.click(timeout=10_000, force=True)
+                page.wait_for_load_state("networkidle", timeout=20_000)
+
+            while len(rows) < settings.limit and not stopped(stop):
+                with span("source.extract_page", source=SOURCE):
+                    page.wait_for_selector(
+                        ".search-registry-entry-block, .registry-entry__form, "
+                        "div.search-registry-entry",
+                        timeout=15_000,
+                    )
+                    cards = page.locator(
+                        ".search-registry-entry-block, .registry-entry__form, "
+                        "div.search-registry-entry"
+                    ).all()
+
+                    page_start = len(rows)
+                    for card in cards:
+                        if len(rows) >= settings.limit:
+                            break
+                        try:
+                            num_el = card.locator(
+                                ".registry-entry__header-mid__number a, "
+                                "a[href*='notice/'], a[href*='purchaseNumber']"
+                            ).first
+                            href = num_el.get_attribute("href") or ""
+                            full_url = (
+                                href if href.startswith("http")
+                                else f"https://zakupki.gov.ru{href}"
+                            )
+                            purchase_number_match = re.search(
+                                r"purchaseNumber=(\d+)|/(\d{19,})", href
+                            )
+                            purchase_number = (
+                                purchase_number_match.group(1) or purchase_number_match.group(2)
+                                if purchase_number_match else ""
+                            )
+
+                            title_el = card.locator(
+                                ".registry-entry__body-value, .lot-name, "
+                                ".search-result__name"
+                            ).first
+                            title = title_el.inner_text().strip()
+
+                            price_el = card.locator(
+                                ".price-block__cost, .registry-entry__body-value:has-text('руб')"
+                            ).first
+                            price = price_el.inner_text().strip() if price_el.count() else ""
+
+                            date_el = card.locator(
+                                ".data-block__value:first-of-type, "
+                                ".registry-entry__body-value:has-text('.')"
+                            ).first
+                            publish_date = date_el.inner_text().strip() if date_el.count() else ""
+
+                            rows.append(
+                                {
+                                    "purchase_number": purchase_number,
+                                    "title": title,
+                                    "url": full_url,
+                                    "price": price,
+                                    "publish_date": publish_date,
+                                    "source": "extendedsearch",
+                                }
+                            )
+                        except Exception:
+                            continue
+
+                if on_batch is not None and len(rows) > page_start:
+                    on_batch(to_schema(pd.DataFrame(rows[page_start:], columns=COLUMNS)))
+                inc("pages_total", source=SOURCE)
+                inc("rows_total", len(rows) - page_start, source=SOURCE)
 
                 next_btn = page.locator(
                     "a.paginator-button.next, li.next a, a:has-text('Следующая')"
                 ).first
                 if next_btn.count() and next_btn.is_enabled():
-                    next_btn.click()
-                    page.wait_for_load_state("networkidle", timeout=15_000)
+                    with span("source.next_page", source=SOURCE):
+                        next_btn.click()
+                        page.wait_for_load_state("networkidle", timeout=15_000)
                 else:
                     break
 
         except Exception as exc:
-            raise RuntimeError(f"extendedsearch scraping failed: {exc}") from exc
-        finally:
-            browser.close()
+            # A stop request aborts in-flight requests; keep the pages scraped so far
+            if not stopped(stop):
+                raise RuntimeError(f"extendedsearch scraping failed: {exc}") from exc
 
-    df = pd.DataFrame(rows, columns=COLUMNS) if rows else pd.DataFrame(columns=COLUMNS)
-    return df[: settings.limit]
+    # Prices and dates are kept as raw text above and parsed per column here
+    return to_schema(pd.DataFrame(rows[: settings.limit], columns=COLUMNS))
@@ -0,0 +1,132 @@
+"""Tests for core.admission module."""
+
+import threading
+import time
+
+import pytest
+
+from core.admission import AdmissionController
+
+
+def _hold(controller, user, priority, admitted, release, positions=None):
+    def run():
+        on_wait = positions.append if positions is not None else None
+        with controller.slot(user, priority, on_wait=on_wait):
+            admitted.append(user)
+            release.wait(5)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_global_and_per_user_limits():
+    controller = AdmissionController(max_contexts=3, per_user=2)
+    admitted, release = [], threading.Event()
+    threads = [_hold(controller, user, "interactive", admitted, release) for user in ("a", "a", "a", "b", "c")]
+
+    _wait_for(lambda: len(admitted) == 3)
+    time.sleep(0.05)
+    assert sorted(admitted) == ["a", "a", "b"]
+    assert controller.snapshot() == {"active": 3, "max_contexts": 3, "waiting": 2, "by_user": {"a": 2, "b": 1}}
+
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert sorted(admitted) == ["a", "a", "a", "b", "c"]
+    assert controller.snapshot()["active"] == 0
+
+
+def test_interactive_lane_goes_first_and_positions_are_reported():
+    controller = AdmissionController(max_contexts=1, per_user=1)
+    admitted, release = [], threading.Event()
+    batch_positions, interactive_positions = [], []
+    blocker_release = threading.Event()
+    blocker = _hold(controller, "owner", "interactive", admitted, blocker_release)
+    _wait_for(lambda: admitted == ["owner"])
+
+    batch = _hold(controller, "batch-user", "batch", admitted, release, batch_positions)
+    _wait_for(lambda: batch_positions)
+    interactive = _hold(controller, "person", "interactive", admitted, release, interactive_positions)
+    _wait_for(lambda: interactive_positions and batch_positions[-1] == 2)
+
+    assert interactive_positions[-1] == 1
+    blocker_release.set()
+    _wait_for(lambda: len(admitted) == 2)
+    assert admitted[1] == "person"
+    assert interactive_positions[-1] is None
+
+    release.set()
+    for thread in (blocker, batch, interactive):
+        thread.join(2)
+    assert admitted[2] == "batch-user"
+
+
+def test_stop_abandons_the_wait():
+    controller = AdmissionController(max_contexts=1)
+    admitted, release = [], threading.Event()
+    holder = _hold(controller, "a", "interactive", admitted, release)
+    _wait_for(lambda: admitted)
+
+    stop = threading.Event()
+    stop.set()
+    with pytest.raises(RuntimeError, match="очереди"):
+        with controller.slot("b", stop=stop):
+            pass
+    with pytest.raises(ValueError):
+        with controller.slot("b", priority="urgent"):
+            pass
+
+    release.set()
+    holder.join(2)
+    assert controller.snapshot()["waiting"] == 0
+
+
+def test_waiting_requests_are_seen_by_other_processes(tmp_path):
+    shared = tmp_path / "admission"
+    busy = AdmissionController(max_contexts=1, shared=shared)
+    other = AdmissionController(shared=shared)  # Another process on the same volume
+    admitted, release = [], threading.Event()
+    holder = _hold(busy, "a", "interactive", admitted, release)
+    _wait_for(lambda: admitted)
+    assert other.waiting_everywhere() == 0
+
+    waiter = _hold(busy, "b", "interactive", admitted, release)
+    _wait_for(lambda: other.waiting_everywhere() == 1)
+    assert busy.waiting_everywhere() == 1  # Its own requests are not counted twice
+    assert other.waiting_everywhere(max_age_s=-1) == 0  # Rows of silent processes expire
+
+    release.set()
+    for thread in (holder, waiter):
+        thread.join(2)
+    assert other.waiting_everywhere() == 0
+
+
+def test_slots_are_capped_across_processes(tmp_path):
+    # Two controllers on one shared directory stand in for the UI and the API
+    ui = AdmissionController(max_contexts=2, shared=tmp_path)
+    api = AdmissionController(max_contexts=2, shared=tmp_path)
+    admitted, release = [], threading.Event()
+    threads = [
+        _hold(ui, "a", "interactive", admitted, release),
+        _hold(api, "b", "interactive", admitted, release),
+    ]
+    _wait_for(lambda: len(admitted) == 2)
+
+    late = _hold(api, "c", "interactive", admitted, release)
+    _wait_for(lambda: api.waiting_everywhere() == 1)
+    time.sleep(0.3)
+    assert len(admitted) == 2  # The API has room of its own, but the host is full
+
+    release.set()
+    for thread in [*threads, late]:
+        thread.join(2)
+    assert sorted(admitted) == ["a", "b", "c"]
+    assert ui.snapshot()["active"] == api.snapshot()["active"] == 0
@@ -1,8 +1,20 @@
 """Tests for core.ai_ranker module."""
 
+import threading
+
+import numpy as np
 import pandas as pd
+import pytest
 
-from core.ai_ranker import score_results
+import core.pipeline as pipeline_module
+from core.ai_ranker import (
+    FALLBACK_ENCODER,
+    PipelinedRanker,
+    encode_parallel,
+    encode_texts,
+    score_results,
+)
+from core.settings import SearchSettings
 
 
 def _sample_df() -> pd.DataFrame:
@@ -51,3 +63,110 @@ def test_score_results_does_not_modify_original_df():
     df = _sample_df()
     _ = score_results(df, query="ноутбук")
     assert "ai_score" not in df.columns
+
+
+def test_pipelined_ranker_matches_score_results():
+    df = _sample_df()
+    ranker = PipelinedRanker(query="ноутбук")
+    ranker.submit(df.iloc[:2])
+    ranker.submit(df.iloc[2:])
+    result = ranker.finish(df)
+    expected = score_results(df, query="ноутбук")
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_pipelined_ranker_scores_rows_never_submitted():
+    df = _sample_df()
+    ranker = PipelinedRanker(query="сервер")
+    ranker.submit(df.iloc[:1])
+    result = ranker.finish(df, threshold=0.1)
+    assert list(result["purchase_number"]) == ["003"]
+
+
+def test_document_text_lifts_rows_whose_title_does_not_match():
+    df = _sample_df().assign(
+        doc_text=["", "Поставка картриджей для принтеров и серверов", "Техническое задание: сервер стоечный"]
+    )
+    result = score_results(df, query="сервер стоечный").set_index("purchase_number")["ai_score"]
+    titles_only = score_results(df.drop(columns="doc_text"), query="сервер стоечный").set_index("purchase_number")
+    # Both query words are in the documents of 003; only one is in its title
+    assert result["003"] > titles_only.loc["003", "ai_score"]
+    assert result["002"] == titles_only.loc["002", "ai_score"]
+    assert result.idxmax() == "003"
+
+    ranker = PipelinedRanker(query="сервер стоечный")
+    ranker.submit(df)
+    pd.testing.assert_frame_equal(ranker.finish(df), score_results(df, query="сервер стоечный"))
+
+
+def test_document_matches_do_not_outrank_matching_titles():
+    df = _sample_df().assign(
+        doc_text=[
+            "",
+            "Поставка картриджей, тонера, бумаги и ноутбук для бухгалтерии. Срок поставки 10 дней.",
+            "",
+        ]
+    )
+    result = score_results(df, query="ноутбук").set_index("purchase_number")["ai_score"]
+    # A word lost in a long sentence weighs less than the same word in a short title
+    assert result.idxmax() == "001"
+    assert 0.0 < result["002"] < result["001"]
+
+
+def test_top_k_keeps_the_best_rows_in_ranked_order():
+    df = pd.concat([_sample_df()] * 4, ignore_index=True)
+    df["purchase_number"] = [f"{index:03d}" for index in range(len(df))]
+    df["title"] = [f"Ноутбук Dell {'модель ' * (index % 5)}{index}" for index in range(len(df))]
+    ranked = score_results(df, query="ноутбук dell")
+
+    top = score_results(df, query="ноутбук dell", top_k=3)
+    pd.testing.assert_frame_equal(top, ranked.head(3))
+
+    ranker = PipelinedRanker(query="ноутбук dell")
+    ranker.submit(df)
+    pd.testing.assert_frame_equal(ranker.finish(df, top_k=3), ranked.head(3))
+
+
+def test_pipelined_ranker_close_stops_worker_without_finish():
+    with PipelinedRanker(query="принтер") as ranker:
+        ranker.submit(_sample_df())
+        worker = ranker._worker
+    assert not worker.is_alive()
+    ranker.close()  # Idempotent
+
+
+def test_pipeline_closes_ranker_when_a_stage_fails(monkeypatch):
+    def scrape(settings, on_batch, stop, progress):
+        on_batch(_sample_df())
+        return []
+
+    def fail(df, collapse):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(pipeline_module, "_scrape", scrape)
+    monkeypatch.setattr(pipeline_module, "find_near_duplicates", fail)
+    with pytest.raises(RuntimeError):
+        pipeline_module.run_search(SearchSettings(query="принтер", ai_ranking=True, near_duplicates="mark"))
+    assert not [thread for thread in threading.enumerate() if thread.name == "pipelined-ranker"]
+
+
+def test_pipeline_passes_ai_workers_to_the_ranker(monkeypatch):
+    created = []
+
+    class RecordingRanker(PipelinedRanker):
+        def __init__(self, *args, **kwargs):
+            created.append(kwargs["workers"])
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline_module, "_scrape", lambda settings, on_batch, stop, progress: [])
+    monkeypatch.setattr(pipeline_module, "PipelinedRanker", RecordingRanker)
+    pipeline_module.run_search(SearchSettings(query="принтер", ai_ranking=True, ai_workers=3))
+    assert created == [3]
+
+
+def test_encode_parallel_matches_serial_encoding():
+    titles = [f"Поставка товара номер {i}" for i in range(40)]
+    serial = encode_texts(titles, FALLBACK_ENCODER)
+    parallel = encode_parallel(titles, FALLBACK_ENCODER, workers=2, shard_size=8)
+    assert parallel.shape == serial.shape
+    assert np.allclose(parallel, serial)
@@ -0,0 +1,84 @@
+"""Tests for the api module (FastAPI service)."""
+
+import io
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import core.jobs  # noqa: E402
+from api import create_app  # noqa: E402
+from benchmarks.run import synthetic_results  # noqa: E402
+from core.jobs import JobManager  # noqa: E402
+from core.pipeline import SearchOutcome  # noqa: E402
+from core.result_store import ResultStore  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    def fake_search(settings, stop=None, progress=None):
+        progress.pages, progress.rows = 3, settings.limit
+        return SearchOutcome(results=synthetic_results(settings.limit), errors=["extendedsearch: сбой"])
+
+    monkeypatch.setattr(core.jobs, "run_search", fake_search)
+    store = ResultStore(tmp_path)
+    manager = JobManager(warm_browsers=False, result_store=store)
+    with TestClient(create_app(manager, store)) as test_client:
+        yield test_client
+
+
+def _wait(client, job_id: str) -> dict:
+    for _ in range(200):
+        status = client.get(f"/jobs/{job_id}").json()
+        if status["status"] not in ("queued", "running"):
+            return status
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_lifecycle_and_paginated_results(client):
+    response = client.post("/jobs", json={"query": "бумага", "limit": 250})
+    assert response.status_code == 202
+    status = _wait(client, response.json()["job_id"])
+
+    assert status["status"] == "done"
+    assert status["rows"] == 250 and status["errors"] == ["extendedsearch: сбой"]
+    assert status["run_id"]
+
+    page = client.get(
+        f"/jobs/{status['job_id']}/results",
+        params={"page": 2, "page_size": 100, "sort_by": "price", "descending": True},
+    ).json()
+    assert page["total"] == 250 and page["pages"] == 3 and len(page["rows"]) == 100
+    prices = [row["price"] for row in page["rows"]]
+    assert prices == sorted(prices, reverse=True)
+    assert client.get(f"/jobs/{status['job_id']}/results", params={"sort_by": "nope"}).status_code == 400
+
+
+def test_streamed_exports(client):
+    job_id = client.post("/jobs", json={"query": "бумага", "limit": 120}).json()["job_id"]
+    _wait(client, job_id)
+
+    csv = client.get(f"/jobs/{job_id}/export/csv")
+    parquet = client.get(f"/jobs/{job_id}/export/parquet")
+    txt = client.get(f"/jobs/{job_id}/export/txt")
+
+    assert csv.headers["content-disposition"] == 'attachment; filename="results.csv"'
+    assert len(csv.content.decode("utf-8-sig").splitlines()) == 121
+    assert len(pd.read_parquet(io.BytesIO(parquet.content))) == 120
+    assert txt.status_code == 200
+    assert len(txt.content.decode("utf-8").splitlines()) == 121
+    assert client.get(f"/jobs/{job_id}/export/doc").status_code == 404
+
+
+def test_validation_unknown_jobs_and_metrics(client):
+    assert client.post("/jobs", json={"query": ""}).status_code == 422
+    assert client.post("/jobs", json={"query": "x", "network_mode": "offline"}).status_code == 422
+    assert client.get("/jobs/search-404").status_code == 404
+    assert client.get("/jobs/search-404/results").status_code == 404
+    assert client.get("/metrics").status_code == 200
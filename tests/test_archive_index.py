@@ -0,0 +1,107 @@
+"""Tests for core.archive_index module."""
+
+import multiprocessing
+
+import pandas as pd
+
+from core.ai_ranker import FALLBACK_ENCODER
+from core.archive_index import ArchiveIndex
+
+
+def _sample_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "purchase_number": ["001", "002", "003"],
+            "title": ["Поставка ноутбуков", "Ремонт кровли здания", "Закупка серверов"],
+            "url": [
+                "https://example.com/1",
+                "https://example.com/2",
+                "https://example.com/3",
+            ],
+            "price": [50_000.0, None, 300_000.0],
+            "publish_date": ["2024-01-01", "2024-01-02", "2024-01-03"],
+            "source": ["docSearch", "extendedsearch", "docSearch"],
+        }
+    )
+
+
+def test_archive_uses_fallback_encoder_offline(tmp_path):
+    index = ArchiveIndex(path=tmp_path)
+    assert index.encoder == FALLBACK_ENCODER
+
+
+def test_archive_search_returns_most_similar_first(tmp_path):
+    index = ArchiveIndex(path=tmp_path)
+    assert index.add(_sample_df()) == 3
+    result = index.search("ремонт кровли", top_k=2)
+    assert len(result) == 2
+    assert result.iloc[0]["purchase_number"] == "002"
+    assert result["similarity"].between(0.0, 1.0).all()
+
+
+def test_archive_add_skips_known_purchases(tmp_path):
+    index = ArchiveIndex(path=tmp_path)
+    index.add(_sample_df())
+    assert index.add(_sample_df()) == 0
+    assert len(index) == 3
+
+
+def test_archive_persists_between_instances(tmp_path):
+    ArchiveIndex(path=tmp_path).add(_sample_df())
+    reopened = ArchiveIndex(path=tmp_path)
+    assert len(reopened) == 3
+    assert reopened.search("серверы", top_k=1).iloc[0]["purchase_number"] == "003"
+
+
+def test_archive_recovers_from_truncated_write(tmp_path):
+    index = ArchiveIndex(path=tmp_path)
+    index.add(_sample_df())
+    with index._items_path.open("a", encoding="utf-8") as fh:
+        fh.write('{"key": "004", "tit')
+
+    reopened = ArchiveIndex(path=tmp_path)
+    assert len(reopened) == 3
+    extra = _sample_df().assign(purchase_number=["004", "005", "006"])
+    assert reopened.add(extra) == 3
+    assert len(ArchiveIndex(path=tmp_path)) == 6
+
+
+def test_archive_recovery_drops_stale_hnsw_graph(tmp_path):
+    index = ArchiveIndex(path=tmp_path)
+    index.add(_sample_df())
+    index._hnsw_path.write_bytes(b"graph of rows that are about to be dropped")
+    with index._vectors_path.open("r+b") as fh:
+        fh.truncate(index._vectors_path.stat().st_size - 4)
+
+    assert len(ArchiveIndex(path=tmp_path)) == 2
+    assert not index._hnsw_path.exists()
+
+
+def _add_batch(path, start: int) -> None:
+    numbers = [f"{start + offset:05d}" for offset in range(50)]
+    ArchiveIndex(path=path).add(
+        pd.DataFrame({"purchase_number": numbers, "title": [f"Поставка товара {n}" for n in numbers]})
+    )
+
+
+def test_archive_appends_from_several_processes_stay_aligned(tmp_path):
+    index = ArchiveIndex(path=tmp_path)  # Opened before the other processes append
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_add_batch, args=(tmp_path, start)) for start in (0, 1000, 2000)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+
+    assert index.search("Поставка товара 01042", top_k=1).iloc[0]["purchase_number"] == "01042"
+    assert len(index) == 150
+    reopened = ArchiveIndex(path=tmp_path)
+    assert len(reopened) == 150
+    assert reopened._vectors.shape[0] == 150
+
+
+def test_archive_search_empty(tmp_path):
+    result = ArchiveIndex(path=tmp_path).search("что угодно")
+    assert result.empty
+    assert "similarity" in result.columns
@@ -0,0 +1,73 @@
+"""Tests for the benchmarks package (portal stand-in and runner)."""
+
+import urllib.request
+
+import core.jobs
+from benchmarks.load_test import max_sustainable
+from benchmarks.load_test import run as run_load
+from benchmarks.portal_stub import PortalStub, StubConfig
+from benchmarks.run import compare, run, synthetic_results
+
+
+def _get(url: str) -> str:
+    with urllib.request.urlopen(url) as response:
+        return response.read().decode("utf-8")
+
+
+def test_portal_stub_serves_paginated_results():
+    config = StubConfig(pages=2, cards_per_page=3)
+    with PortalStub(config) as stub:
+        landing = _get(stub.url("docSearch"))
+        first = _get(stub.url("docSearch") + "?searchString=x&pageNumber=1")
+        last = _get(stub.url("docSearch") + "?searchString=x&pageNumber=2")
+        overlap = _get(stub.url("extendedsearch") + "?searchString=x&pageNumber=1")
+        assert stub.requests == 4
+
+    assert "search-registry-entry-block" not in landing
+    assert first.count('class="search-registry-entry-block"') == 3
+    assert "paginator-button next" in first
+    assert "paginator-button next" not in last
+    # extendedsearch starts half-way through the docSearch result set
+    assert "purchaseNumber=1000000000000000003" in overlap
+    assert "purchaseNumber=1000000000000000003" in last
+
+
+def test_synthetic_results_follow_schema():
+    df = synthetic_results(50, start=10)
+    assert len(df) == 50
+    assert df["purchase_number"].iloc[0] == "1000000000000000010"
+    assert str(df["publish_date"].dtype) == "datetime64[ns]"
+
+
+def test_run_reports_and_compares():
+    report = run(sizes=(200,), suites=("merge", "score"))
+    names = [item["name"] for item in report["results"]]
+    assert names == ["merge", "score"]
+
+    slower = [dict(item, seconds=item["seconds"] * 2) for item in report["results"]]
+    assert len(compare(slower, report["results"])) == 2
+    assert compare(report["results"], report["results"]) == []
+
+
+def test_load_test_reports_levels_without_browser():
+    report = run_load(levels=(1, 3), iterations=2, pages=2, cards_per_page=5, latency_s=0.01, browser=False)
+    assert core.jobs.run_search.__module__ == "core.pipeline"  # restored afterwards
+    assert [level["concurrency"] for level in report["levels"]] == [1, 3]
+    busy = report["levels"][1]
+    assert busy["completed"] == busy["flows"] == 6 and busy["error_rate"] == 0
+    assert busy["latency_s"]["search"]["count"] == 6
+    assert busy["latency_s"]["export"]["p90"] >= busy["latency_s"]["export"]["p50"] > 0
+    assert busy["memory_peak"]["python_mb"] > 0
+    assert report["max_sustainable_concurrency"] == 3
+
+
+def test_load_test_counts_timeouts_and_stops_growing():
+    report = run_load(levels=(1, 2), iterations=1, pages=5, latency_s=0.2, deadline_s=0.05, browser=False)
+    (level,) = report["levels"]  # The first level already fails, so 2 is not tried
+    assert level["errors"] == {"timed_out": 1}
+    assert report["max_sustainable_concurrency"] is None
+    levels = [
+        {"concurrency": n, "error_rate": 0.0, "latency_s": {"search": {"p90": p90}}}
+        for n, p90 in ((1, 1.0), (2, 3.0))
+    ]
+    assert max_sustainable(levels, 0.05, slo_s=2.0) == 1
@@ -0,0 +1,93 @@
+"""Tests for core.cache_warmer module."""
+
+import datetime
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import core.cache_warmer as warmer_module
+from core.admission import AdmissionController
+from core.cache_warmer import CacheWarmer, in_window, parse_window
+from core.pipeline import SearchOutcome
+from core.scheduler import ProfileStore, SearchProfile
+from core.search_cache import SearchCache
+from core.settings import SearchSettings
+
+
+def test_window_parsing_and_wrapping():
+    assert parse_window("1-6") == (1, 6)
+    assert in_window(1, (1, 6)) and not in_window(6, (1, 6))
+    assert in_window(23, (22, 5)) and in_window(4, (22, 5)) and not in_window(12, (22, 5))
+    for spec in ("6", "a-b", "3-3", "1-25"):
+        with pytest.raises(ValueError):
+            parse_window(spec)
+
+
+def test_run_once_warms_popular_and_saved_searches_off_peak(tmp_path, monkeypatch):
+    cache = SearchCache(tmp_path / "cache")
+    profiles = ProfileStore(tmp_path / "profiles.json", tmp_path / "snapshots")
+    night = datetime.datetime(2024, 3, 10, 3).timestamp()
+    profiles.save(SearchProfile("Ремонт", SearchSettings(query="ремонт", ai_ranking=True), days_back=7))
+    for offset in range(2):
+        cache.note_request(SearchSettings(query="бумага", use_cache=True), requested_at=night - 3600 + offset)
+    cache.note_request(SearchSettings(query="мебель", use_cache=True), requested_at=night - 3600)
+
+    runs = []
+
+    def fake_search(settings, stop=None):
+        # The pipeline caches complete scrapes; stand in for it
+        runs.append(settings)
+        cache.put(settings, pd.DataFrame({"purchase_number": ["1"], "title": [settings.query]}), fetched_at=night)
+        return SearchOutcome(pd.DataFrame({"purchase_number": ["1"]}))
+
+    monkeypatch.setattr(warmer_module, "run_search", fake_search)
+    warmer = CacheWarmer(cache, profiles, window=(1, 6), top=5)
+
+    assert warmer.run_once(now=night + 4 * 3600) == []  # 07:00 is outside the window
+    warmed = warmer.run_once(now=night)
+
+    assert [run.settings.query for run in warmed] == ["бумага", "мебель", "ремонт"]
+    assert all(settings.use_cache and settings.cache_max_age_h == 0 for settings in runs)
+    assert not any(settings.track_changes for settings in runs)
+    assert runs[2].ai_ranking  # Saved profiles keep their ranking settings
+    assert (runs[2].date_from, runs[2].date_to) == (datetime.date(2024, 3, 3), datetime.date(2024, 3, 10))
+    assert cache.fetched_at(SearchSettings(query="бумага")) == night
+    # Everything is fresh now
+    assert warmer.run_once(now=night + 600) == []
+
+
+def test_run_once_backs_off_while_another_process_has_searches_queued(tmp_path, monkeypatch):
+    shared = tmp_path / "admission"
+    ui = AdmissionController(max_contexts=1, shared=shared)  # Stands in for the UI process
+    monkeypatch.setattr(warmer_module, "CONTROLLER", AdmissionController(shared=shared))
+    cache = SearchCache(tmp_path / "cache")
+    night = datetime.datetime(2024, 3, 10, 3).timestamp()
+    cache.note_request(SearchSettings(query="бумага", use_cache=True), requested_at=night - 3600)
+    monkeypatch.setattr(warmer_module, "run_search", lambda settings, stop=None: SearchOutcome(pd.DataFrame()))
+    warmer = CacheWarmer(cache, ProfileStore(tmp_path / "profiles.json", tmp_path / "snapshots"))
+
+    release, queued = threading.Event(), threading.Event()
+
+    def hold():
+        with ui.slot("a"):
+            queued.wait(5)
+            release.wait(5)
+
+    def wait_in_queue():
+        with ui.slot("b", on_wait=lambda position: queued.set()):
+            pass
+
+    threads = [threading.Thread(target=hold), threading.Thread(target=wait_in_queue)]
+    threads[0].start()
+    time.sleep(0.05)
+    threads[1].start()
+    queued.wait(5)
+    try:
+        assert warmer.run_once(now=night) == []
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+    assert [run.settings.query for run in warmer.run_once(now=night)] == ["бумага"]
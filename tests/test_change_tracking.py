@@ -0,0 +1,90 @@
+"""Tests for core.change_tracking module."""
+
+import threading
+
+import pandas as pd
+
+from core.change_tracking import ChangeSet, ChangeTracker, content_hash
+
+
+def _results(prices: dict[str, float]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "purchase_number": list(prices),
+            "title": [f"Поставка бумаги {n}" for n in prices],
+            "url": [f"https://zakupki.gov.ru/{n}" for n in prices],
+            "price": list(prices.values()),
+            "source": "docSearch",
+        }
+    )
+
+
+def test_content_hash_ignores_formatting_and_non_content_columns():
+    row = {"purchase_number": "1", "title": "Поставка  бумаги", "price": 100.0, "source": "docSearch"}
+    same = {"purchase_number": "1", "title": " Поставка бумаги ", "price": 100.001, "source": "extendedsearch"}
+    assert content_hash(row) == content_hash(same)
+    assert content_hash(row) != content_hash({**row, "price": 120.0})
+    # The link depends on the source that won the merge, not on the purchase
+    assert content_hash({**row, "url": "https://zakupki.gov.ru/a"}) == content_hash(
+        {**row, "url": "https://zakupki.gov.ru/b"}
+    )
+
+
+def test_record_splits_new_changed_unchanged_and_keeps_history(tmp_path):
+    tracker = ChangeTracker(tmp_path / "changes.sqlite")
+
+    first = tracker.record(_results({"0001": 100.0, "0002": 200.0}), scope="a", seen_at=1.0)
+    assert first.counts() == {"new": 2, "changed": 0, "unchanged": 0}
+
+    second_run = _results({"0001": 100.0, "0002": 250.0, "0003": 300.0})
+    assert tracker.classify(second_run, scope="a") == ["unchanged", "changed", "new"]
+    second = tracker.record(second_run, scope="a", seen_at=2.0)
+    assert second.fresh["purchase_number"].tolist() == ["0003", "0002"]
+    assert second.fresh["change"].tolist() == ["new", "changed"]
+    assert second.unchanged["purchase_number"].tolist() == ["0001"]
+
+    # Another scope has not seen anything yet, but shares the version history
+    assert tracker.classify(second_run, scope="b") == ["new", "new", "new"]
+    history = tracker.history("0002")
+    assert [(item["version"], item["price"], item["seen_at"]) for item in history] == [
+        (1, 200.0, 1.0),
+        (2, 250.0, 2.0),
+    ]
+    assert tracker.history("0001")[0]["title"] == "Поставка бумаги 0001"
+
+
+def test_rows_without_key_are_always_new(tmp_path):
+    tracker = ChangeTracker(tmp_path / "changes.sqlite")
+    rows = pd.DataFrame({"purchase_number": [""], "title": ["Без номера"], "url": [""]})
+    tracker.record(rows)
+    assert tracker.classify(rows) == ["new"]
+    assert tracker.record(pd.DataFrame()).counts() == {"new": 0, "changed": 0, "unchanged": 0}
+    assert ChangeSet.split(rows, ["new"]).fresh["change"].tolist() == ["new"]
+
+
+def test_concurrent_records_of_the_same_purchases_get_distinct_versions(tmp_path):
+    path = tmp_path / "changes.sqlite"
+    ChangeTracker(path).record(_results({"0001": 100.0}), scope="ui")
+    barrier, errors = threading.Barrier(2), []
+
+    def record(price: float, scope: str) -> None:
+        try:
+            barrier.wait(5)
+            ChangeTracker(path).record(_results({"0001": price}), scope=scope)
+        except Exception as exc:
+            errors.append(exc)
+
+    for _ in range(10):
+        threads = [
+            threading.Thread(target=record, args=(price, scope))
+            for price, scope in ((200.0, "ui"), (300.0, "scheduler"))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        barrier.reset()
+
+    assert errors == []
+    versions = [item["version"] for item in ChangeTracker(path).history("0001")]
+    assert versions == list(range(1, len(versions) + 1))
@@ -0,0 +1,65 @@
+"""Tests for core.cli module and the record/replay settings of core.sources.browser."""
+
+import pandas as pd
+import pytest
+
+import core.sources.browser as browser_module
+from core.cli import build_parser, settings_from_args, write_results
+from core.settings import SearchSettings
+from core.sources.browser import har_file, open_page
+
+
+def test_settings_from_args_network_mode():
+    args = build_parser().parse_args(
+        ["бумага", "--network-mode", "replay", "--har", "paper", "--no-extended", "--limit", "10"]
+    )
+    settings = settings_from_args(args)
+
+    assert settings.query == "бумага"
+    assert settings.network_mode == "replay"
+    assert settings.har_path == "paper"
+    assert settings.doc_search and not settings.extended_search
+    assert settings.limit == 10
+
+
+def test_settings_from_args_use_cache():
+    assert not settings_from_args(build_parser().parse_args(["бумага"])).use_cache
+    settings = settings_from_args(build_parser().parse_args(["бумага", "--use-cache"]))
+    assert settings.use_cache and settings.cache_max_age_h == SearchSettings.cache_max_age_h
+    assert settings_from_args(build_parser().parse_args(["бумага", "--use-cache", "2"])).cache_max_age_h == 2
+
+
+def test_settings_from_args_ai_workers():
+    assert settings_from_args(build_parser().parse_args(["бумага"])).ai_workers == SearchSettings.ai_workers
+    assert settings_from_args(build_parser().parse_args(["бумага", "--ai", "--ai-workers", "4"])).ai_workers == 4
+
+
+def test_har_file_per_source_inside_har_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(browser_module, "HAR_DIR", tmp_path)
+    settings = SearchSettings(query="x", har_path="paper")
+
+    assert har_file(settings, "docSearch") == tmp_path.resolve() / "paper" / "docSearch.har.zip"
+    assert har_file(settings, "extendedsearch") != har_file(settings, "docSearch")
+    assert har_file(SearchSettings(query="x"), "docSearch") == tmp_path.resolve() / "docSearch.har.zip"
+    for escape in ("../elsewhere", "/etc", "paper/../../x"):
+        with pytest.raises(RuntimeError, match="внутри"):
+            har_file(SearchSettings(query="x", har_path=escape), "docSearch")
+
+
+def test_open_page_rejects_missing_archive_and_unknown_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(browser_module, "HAR_DIR", tmp_path)
+    with pytest.raises(RuntimeError, match="HAR-архив"):
+        with open_page(SearchSettings(query="x", network_mode="replay", har_path="paper"), "docSearch"):
+            pass
+    with pytest.raises(RuntimeError, match="режим сети"):
+        with open_page(SearchSettings(query="x", network_mode="offline"), "docSearch"):
+            pass
+
+
+def test_write_results_by_extension(tmp_path):
+    df = pd.DataFrame({"title": ["a", "b"]})
+
+    path = write_results(df, tmp_path / "out.csv")
+    assert path.read_text(encoding="utf-8-sig").splitlines()[0] == "title"
+    with pytest.raises(RuntimeError, match="формат"):
+        write_results(df, tmp_path / "out.doc")
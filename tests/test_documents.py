@@ -0,0 +1,106 @@
+"""Tests for core.documents module."""
+
+import io
+
+import pandas as pd
+from openpyxl import Workbook
+
+from benchmarks.portal_stub import CONTRACT_TEMPLATE, PortalStub, docx_bytes
+from core.documents import (
+    DOC_TEXT_COLUMN,
+    DocumentFetcher,
+    DocumentIndex,
+    attach_document_text,
+    attachment_links,
+    documents_page_url,
+    extract_text,
+)
+
+
+def _hits(stub: PortalStub, count: int, source: str = "docSearch", start: int = 0) -> pd.DataFrame:
+    numbers = [f"{10**18 + index:019d}" for index in range(start, start + count)]
+    return pd.DataFrame(
+        {
+            "purchase_number": numbers,
+            "title": ["Закупка"] * count,
+            "url": [f"{stub.base_url}/epz/order/notice/ea20/view/common-info.html?regNumber={n}" for n in numbers],
+            "source": source,
+        }
+    )
+
+
+def test_extract_text_reads_docx_and_xlsx():
+    assert extract_text(docx_bytes("Техническое задание\nпоставка  бумаги")) == (
+        "docx",
+        "Техническое задание поставка бумаги",
+        None,
+    )
+
+    workbook = Workbook()
+    workbook.active.append(["Бумага А4", 500, None])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    assert extract_text(buffer.getvalue()) == ("xlsx", "Бумага А4 500", None)
+
+    kind, text, error = extract_text(b"plain text")
+    assert (kind, text) == (None, "") and error
+
+
+def test_documents_page_and_links():
+    url = "https://zakupki.gov.ru/epz/order/notice/ea20/view/common-info.html?regNumber=1"
+    page = documents_page_url(url)
+    assert page == "https://zakupki.gov.ru/epz/order/notice/ea20/view/documents.html?regNumber=1"
+    assert documents_page_url("https://zakupki.gov.ru/epz/order/docSearch/results.html") is None
+
+    html = (
+        '<a href="/44fz/filestore/public/1.0/download/priz/file.html?uid=A" title="ТЗ.docx">ТЗ</a>'
+        '<a href="/epz/order/notice/ea20/view/common-info.html">Общая информация</a>'
+        '<a href="https://example.org/files/spec.pdf">Спецификация</a>'
+    )
+    assert attachment_links(html, page) == [
+        ("https://zakupki.gov.ru/44fz/filestore/public/1.0/download/priz/file.html?uid=A", "ТЗ.docx"),
+        ("https://example.org/files/spec.pdf", "Спецификация"),
+    ]
+
+
+def test_fetch_deduplicates_indexes_and_never_refetches(tmp_path):
+    index = DocumentIndex(tmp_path / "documents.sqlite")
+    with PortalStub() as stub:
+        hits = pd.concat([_hits(stub, 4), _hits(stub, 1, source="extendedsearch", start=4)], ignore_index=True)
+        stats = DocumentFetcher(index, extract_workers=2).fetch(hits)
+
+        assert (stats.purchases, stats.attachments, stats.downloaded) == (4, 8, 8)
+        # The contract template is byte-identical for every purchase: extracted once
+        assert stats.duplicates == 3
+        assert stats.extracted == 5
+        assert stub.file_requests == 8
+
+        again = DocumentFetcher(index).fetch(hits)
+        assert again.already_indexed == 8
+        assert again.downloaded == 0
+        assert stub.file_requests == 8
+
+    found = index.search("государственного контракта")
+    assert len(found) == 4
+    assert "[контракта]" in found[0]["snippet"]
+
+    enriched = attach_document_text(hits, index)
+    assert enriched["documents"].tolist() == [2, 2, 2, 2, 0]
+    assert CONTRACT_TEMPLATE in enriched.loc[0, DOC_TEXT_COLUMN]
+    assert "Техническое задание на закупку № 1000000000000000000" in enriched.loc[0, DOC_TEXT_COLUMN]
+    assert enriched.loc[4, DOC_TEXT_COLUMN] == ""
+
+
+def test_fetch_stops_at_byte_budget(tmp_path):
+    index = DocumentIndex(tmp_path / "documents.sqlite")
+    with PortalStub() as stub:
+        size = len(stub.attachment(f"{10**18:019d}-spec"))
+        stats = DocumentFetcher(index, workers=1, extract_workers=1, max_bytes=size * 3).fetch(_hits(stub, 4))
+
+    assert stats.budget_exhausted
+    assert 0 < stats.downloaded < 8
+    assert stats.bytes <= size * 3
+    # Attachments over the budget are not indexed, so the next run fetches them
+    assert sum(count for count, _ in index.texts(_hits(stub, 4)["purchase_number"].tolist()).values()) == (
+        stats.downloaded
+    )
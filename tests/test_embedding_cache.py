@@ -0,0 +1,50 @@
+"""Tests for core.embedding_cache module."""
+
+import numpy as np
+
+import core.ai_ranker as ai_ranker
+from core.ai_ranker import FALLBACK_ENCODER, encode_cached, encode_texts
+from core.embedding_cache import EmbeddingCache
+
+
+def test_vectors_persist_and_memory_is_bounded(tmp_path):
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite", memory_entries=2)
+    vectors = np.eye(3, dtype=np.float32)
+    cache.put_many("model", "passage", ["a", "b", "c"], vectors)
+    assert len(cache._memory) == 2
+
+    reopened = EmbeddingCache(tmp_path / "embeddings.sqlite")
+    found = reopened.get_many("model", "passage", ["a", "c", "unknown"])
+    assert set(found) == {"a", "c"}
+    np.testing.assert_array_equal(found["c"], vectors[2])
+    # Encoder and role are part of the key
+    assert reopened.get_many("model", "query", ["a"]) == {}
+    assert reopened.get_many("other", "passage", ["a"]) == {}
+
+
+def test_oldest_rows_are_pruned(tmp_path):
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite", max_rows=2)
+    for index, text in enumerate(["a", "b", "c"]):
+        cache.put_many("model", "passage", [text], np.full((1, 2), index, dtype=np.float32))
+    assert set(EmbeddingCache(tmp_path / "embeddings.sqlite").get_many("model", "passage", ["a", "b", "c"])) == {
+        "b",
+        "c",
+    }
+
+
+def test_encode_cached_encodes_only_new_texts(tmp_path, monkeypatch):
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite")
+    encoded = []
+
+    def encode(texts, encoder, role="passage", workers=None):
+        encoded.append(list(texts))
+        return encode_texts(texts, encoder, role=role)
+
+    monkeypatch.setattr(ai_ranker, "encode_parallel", encode)
+    titles = ["Поставка бумаги", "Ремонт кровли", "Поставка бумаги"]
+    first = encode_cached(titles, FALLBACK_ENCODER, cache=cache)
+    second = encode_cached(["Ремонт кровли", "Закупка мебели"], FALLBACK_ENCODER, cache=cache)
+
+    assert encoded == [["Поставка бумаги", "Ремонт кровли"], ["Закупка мебели"]]
+    np.testing.assert_allclose(first, encode_texts(titles, FALLBACK_ENCODER))
+    np.testing.assert_allclose(second[0], first[1])
@@ -0,0 +1,65 @@
+"""Tests for core.export_cache module."""
+
+import pandas as pd
+
+from core.export_cache import EXPORT_FORMATS, ExportCache, results_fingerprint
+
+
+def _sample_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "purchase_number": ["001", "002"],
+            "title": ["Lot A", "Lot B"],
+            "price": [1000.0, 2000.0],
+        }
+    )
+
+
+def test_fingerprint_changes_with_content():
+    df = _sample_df()
+    changed = df.assign(price=[1000.0, 2500.0])
+    assert results_fingerprint(df) == results_fingerprint(df.copy())
+    assert results_fingerprint(df) != results_fingerprint(changed)
+
+
+def test_export_cache_builds_lazily_and_memoises(monkeypatch):
+    calls = []
+    original = EXPORT_FORMATS["csv"]
+    monkeypatch.setitem(
+        EXPORT_FORMATS,
+        "csv",
+        original.__class__(
+            original.label,
+            original.file_name,
+            original.mime,
+            lambda df: calls.append(1) or original.build(df),
+        ),
+    )
+    cache = ExportCache()
+    df = _sample_df()
+    key = results_fingerprint(df)
+    assert cache.peek(key, "csv") is None
+    first = cache.get(df, "csv", fingerprint=key)
+    second = cache.get(df, "csv", fingerprint=key)
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_export_cache_drops_entries_when_results_change():
+    cache = ExportCache()
+    df = _sample_df()
+    cache.get(df, "csv")
+    other = df.iloc[:1]
+    cache.get(other, "json")
+    assert cache.peek(results_fingerprint(df), "csv") is None
+    assert cache.peek(results_fingerprint(other), "json") is not None
+
+
+def test_export_cache_is_bounded():
+    df = _sample_df()
+    cache = ExportCache(max_bytes=len(EXPORT_FORMATS["csv"].build(df)))
+    key = results_fingerprint(df)
+    cache.get(df, "csv", fingerprint=key)
+    cache.get(df, "json", fingerprint=key)
+    assert cache.peek(key, "csv") is None
+    assert cache.peek(key, "json") is not None
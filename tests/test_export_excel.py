@@ -1,8 +1,27 @@
 """Tests for core.export_excel module."""
 
+import io
+
 import pandas as pd
 
-from core.export_excel import to_excel_bytes
+from core.export_excel import (
+    iter_chunks,
+    stream_export,
+    to_arrow_bytes,
+    to_csv_bytes,
+    to_excel_bytes,
+    to_json_bytes,
+    to_ndjson_bytes,
+    to_parquet_bytes,
+    to_txt_bytes,
+    write_csv,
+    write_excel_stream,
+    write_json,
+    write_ndjson,
+    write_parquet,
+    write_txt,
+    write_arrow_ipc,
+)
 
 
 def _sample_df() -> pd.DataFrame:
@@ -26,8 +45,6 @@ def test_to_excel_bytes_returns_bytes():
 
 def test_to_excel_bytes_valid_xlsx():
     """Ensure the returned bytes can be read back as a valid Excel file."""
-    import io
-
     df = _sample_df()
     xlsx_bytes = to_excel_bytes(df)
     result_df = pd.read_excel(io.BytesIO(xlsx_bytes), sheet_name="Результаты")
@@ -43,3 +60,133 @@ def test_to_excel_bytes_empty_df():
     result = to_excel_bytes(empty_df)
     assert isinstance(result, bytes)
     assert len(result) > 0
+
+
+def test_to_json_bytes_serialises_typed_columns():
+    import json
+
+    from core.schema import to_schema
+
+    df = to_schema(_sample_df())
+    payload = json.loads(to_json_bytes(df).decode("utf-8"))
+    assert payload[0]["purchase_number"] == "001"
+    assert payload[0]["publish_date"].startswith("2024-01-01")
+
+
+def test_write_excel_stream_chunks_to_file(tmp_path):
+    df = pd.concat([_sample_df()] * 5, ignore_index=True)
+    target = write_excel_stream(df, tmp_path / "out" / "results.xlsx", chunk_rows=3)
+    result_df = pd.read_excel(target, sheet_name="Результаты")
+    assert len(result_df) == len(df)
+    assert list(result_df.columns) == list(df.columns)
+
+
+def test_write_excel_stream_from_iterator_with_types(tmp_path):
+    import openpyxl
+
+    from core.schema import to_schema
+
+    df = to_schema(_sample_df())
+    target = write_excel_stream(iter_chunks(df, 1), tmp_path / "typed.xlsx")
+    sheet = openpyxl.load_workbook(target)["Результаты"]
+    assert sheet["D2"].number_format == "#,##0.00"
+    assert sheet["E2"].number_format == "DD.MM.YYYY"
+    assert sheet.column_dimensions["B"].width == 80
+
+
+def test_to_json_bytes_streams_valid_array():
+    import json
+
+    df = pd.concat([_sample_df()] * 3, ignore_index=True)
+    buffer = io.BytesIO()
+    write_json(df, buffer, chunk_rows=2)
+    payload = json.loads(buffer.getvalue().decode("utf-8"))
+    assert len(payload) == len(df)
+    assert json.loads(to_json_bytes(df.iloc[:0])) == []
+
+
+def test_ndjson_round_trip_with_compression(tmp_path):
+    import gzip
+
+    df = _sample_df()
+    target = write_ndjson(df, tmp_path / "rows.ndjson.gz", compression="gzip", chunk_rows=1)
+    with gzip.open(target, "rt", encoding="utf-8") as fh:
+        result = pd.read_json(fh, lines=True, dtype={"purchase_number": str})
+    assert list(result["purchase_number"]) == ["001", "002"]
+
+
+def test_ndjson_zstd_compression():
+    import pyarrow as pa
+
+    data = to_ndjson_bytes(_sample_df(), compression="zstd")
+    decoded = pa.input_stream(pa.BufferReader(data), compression="zstd").read()
+    assert decoded.count(b"\n") == 2
+
+
+def test_parquet_and_arrow_round_trip():
+    import pyarrow as pa
+
+    from core.schema import to_schema
+
+    df = to_schema(pd.concat([_sample_df()] * 3, ignore_index=True))
+    from_parquet = pd.read_parquet(io.BytesIO(to_parquet_bytes(df)))
+    assert len(from_parquet) == len(df)
+    assert from_parquet["price"].tolist() == df["price"].tolist()
+
+    table = pa.ipc.open_file(pa.BufferReader(to_arrow_bytes(df))).read_all()
+    assert table.num_rows == len(df)
+    assert table.column_names == list(df.columns)
+
+
+def test_arrow_writers_keep_types_of_columns_empty_in_first_chunk(tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    first = _sample_df().assign(title=None, note=None)
+    second = _sample_df().assign(note="проверено")
+    path = write_parquet(iter([first, second]), tmp_path / "results.parquet")
+    table = pq.read_table(path)
+    assert table.schema.field("title").type == pa.string()
+    assert table.column("note").to_pylist() == [None, None, "проверено", "проверено"]
+
+    path = write_arrow_ipc(iter([first, second]), tmp_path / "results.arrow")
+    assert pa.ipc.open_file(str(path)).read_all().num_rows == 4
+
+
+def test_arrow_writers_write_empty_file_without_chunks(tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from core.schema import COLUMNS
+
+    assert pq.read_table(write_parquet(iter([]), tmp_path / "empty.parquet")).column_names == COLUMNS
+    table = pa.ipc.open_file(str(write_arrow_ipc([], tmp_path / "empty.arrow"))).read_all()
+    assert (table.num_rows, table.column_names) == (0, COLUMNS)
+
+
+def test_write_txt_from_chunk_iterator_matches_whole_frame():
+    df = pd.concat([_sample_df()] * 3, ignore_index=True)
+    df.loc[4, "title"] = "Очень длинное название лота"
+    buffer = io.BytesIO()
+    write_txt(iter_chunks(df, 2), buffer)
+    assert buffer.getvalue() == to_txt_bytes(df)
+    lines = buffer.getvalue().decode("utf-8").splitlines()
+    assert len(lines) == 7
+    assert len({len(line) for line in lines}) == 1  # Widths come from every chunk, not the first
+    assert b"".join(stream_export(iter_chunks(df, 2), "txt")) == to_txt_bytes(df)
+
+
+def test_to_txt_bytes_aligns_columns():
+    lines = to_txt_bytes(_sample_df()).decode("utf-8").splitlines()
+    assert len(lines) == 3
+    assert len({len(line) for line in lines}) == 1
+    assert "purchase_number" in lines[0]
+
+
+def test_to_csv_bytes_has_bom_and_single_header():
+    df = pd.concat([_sample_df()] * 3, ignore_index=True)
+    buffer = io.BytesIO()
+    write_csv(df, buffer, chunk_rows=2)
+    text = buffer.getvalue().decode("utf-8-sig")
+    assert text.count("purchase_number") == 1
+    assert text == to_csv_bytes(df).decode("utf-8-sig")
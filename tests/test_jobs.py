@@ -0,0 +1,92 @@
+"""Tests for core.jobs module."""
+
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import core.jobs
+from core.jobs import JobManager
+from core.pipeline import SearchOutcome
+from core.settings import SearchSettings
+
+
+def _fake_search(pages: int, page_s: float = 0.01):
+    """Stand-in for run_search that scrapes *pages* pages unless stopped."""
+
+    def run(settings, stop=None, progress=None):
+        rows = []
+        progress.stage = "docSearch"
+        for page in range(pages):
+            if stop is not None and stop.is_set():
+                break
+            time.sleep(page_s)
+            rows.append({"title": f"page {page}"})
+            progress.pages += 1
+            progress.rows += 1
+        progress.stage = "done"
+        return SearchOutcome(results=pd.DataFrame(rows))
+
+    return run
+
+
+def test_job_runs_to_completion(monkeypatch):
+    monkeypatch.setattr(core.jobs, "run_search", _fake_search(pages=3))
+    manager = JobManager()
+    job = manager.wait(manager.submit(SearchSettings(query="x")), timeout=5)
+
+    assert job.status == "done"
+    assert job.progress.pages == 3
+    assert len(job.outcome.results) == 3
+    manager.close()
+
+
+def test_cancel_returns_partial_results(monkeypatch):
+    monkeypatch.setattr(core.jobs, "run_search", _fake_search(pages=1000, page_s=0.01))
+    manager = JobManager()
+    job_id = manager.submit(SearchSettings(query="x"))
+    while manager.status(job_id).progress.pages < 2:
+        time.sleep(0.01)
+
+    assert manager.cancel(job_id)
+    job = manager.wait(job_id, timeout=5)
+    assert job.status == "cancelled"
+    assert 2 <= len(job.outcome.results) < 1000
+    assert not manager.cancel(job_id)
+    manager.close()
+
+
+def test_deadline_stops_job_with_partial_results(monkeypatch):
+    monkeypatch.setattr(core.jobs, "run_search", _fake_search(pages=1000, page_s=0.01))
+    manager = JobManager(deadline_s=0.1)
+    job = manager.wait(manager.submit(SearchSettings(query="x")), timeout=5)
+
+    assert job.status == "timed_out"
+    assert 0 < len(job.outcome.results) < 1000
+    manager.close()
+
+
+def test_queued_job_cancelled_before_start_and_failures(monkeypatch):
+    release = threading.Event()
+
+    def blocking(settings, stop=None, progress=None):
+        if settings.query == "boom":
+            raise RuntimeError("сбой")
+        release.wait(5)
+        return SearchOutcome(results=pd.DataFrame())
+
+    monkeypatch.setattr(core.jobs, "run_search", blocking)
+    manager = JobManager(workers=1)
+    running = manager.submit(SearchSettings(query="x"))
+    queued = manager.submit(SearchSettings(query="y"))
+
+    assert manager.cancel(queued)
+    assert manager.status(queued).status == "cancelled"
+    release.set()
+    assert manager.wait(running, timeout=5).status == "done"
+    failed = manager.wait(manager.submit(SearchSettings(query="boom")), timeout=5)
+    assert failed.status == "failed" and failed.error == "сбой"
+    with pytest.raises(KeyError):
+        manager.status("search-404")
+    manager.close()
@@ -0,0 +1,87 @@
+"""Tests for core.mail_packaging module."""
+
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+import core.export_excel as export_excel
+from core.mail_packaging import package_results
+
+
+def _sample_df(rows: int = 200) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "purchase_number": [f"{i:019d}" for i in range(rows)],
+            "title": ["Поставка оборудования для нужд учреждения"] * rows,
+            "price": np.arange(rows, dtype="float64"),
+        }
+    )
+
+
+def test_small_export_is_attached_as_is():
+    plan = package_results(_sample_df(), xlsx_bytes=b"x" * 100, max_bytes=1000)
+    assert plan.strategy == "as_is"
+    assert [(a.filename, a.data) for a in plan.attachments] == [("results.xlsx", b"x" * 100)]
+    assert plan.note == ""
+
+
+def test_text_export_is_zipped():
+    data = b"repetitive " * 1000
+    plan = package_results(_sample_df(), xlsx_bytes=data, filename="results.csv", max_bytes=len(data) // 2)
+    assert plan.strategy == "zip"
+    (attachment,) = plan.attachments
+    assert attachment.filename == "results.zip"
+    with zipfile.ZipFile(io.BytesIO(attachment.data)) as archive:
+        assert archive.read("results.csv") == data
+
+
+def test_xlsx_is_split_without_zipping_it_again():
+    data = b"repetitive " * 1000
+    plan = package_results(_sample_df(), xlsx_bytes=data, max_bytes=len(data) // 2)
+    assert plan.strategy == "split"
+    assert [a.filename for a in plan.attachments] == ["results.xlsx.001", "results.xlsx.002"]
+    assert b"".join(a.data for a in plan.attachments) == data
+
+
+def test_csv_is_built_when_no_bytes_are_given():
+    plan = package_results(_sample_df(3), filename="results.csv")
+    (attachment,) = plan.attachments
+    assert attachment.data.decode("utf-8-sig").splitlines()[0].startswith("purchase_number")
+
+
+def test_large_export_is_split_into_parts_that_rejoin():
+    data = np.random.default_rng(0).bytes(10_000)  # incompressible
+    plan = package_results(_sample_df(), xlsx_bytes=data, filename="results.txt", max_bytes=4_000, max_parts=5)
+    assert plan.strategy == "split"
+    assert plan.one_per_message
+    assert [a.filename for a in plan.attachments] == [
+        "results.zip.001",
+        "results.zip.002",
+        "results.zip.003",
+    ]
+    assert all(len(a.data) <= 4_000 for a in plan.attachments)
+    joined = b"".join(a.data for a in plan.attachments)
+    with zipfile.ZipFile(io.BytesIO(joined)) as archive:
+        assert archive.read("results.txt") == data
+
+
+def test_oversized_export_falls_back_to_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_excel, "OUTPUT_DIR", tmp_path)
+    df = _sample_df()
+    data = np.random.default_rng(0).bytes(10_000)
+    plan = package_results(df, xlsx_bytes=data, max_bytes=1_000, max_parts=2, summary_rows=50)
+
+    assert plan.strategy == "summary"
+    assert plan.saved_path.parent == tmp_path
+    assert len(pd.read_excel(plan.saved_path)) == len(df)
+    (attachment,) = plan.attachments
+    assert attachment.filename == "results_top50.xlsx"
+    assert len(pd.read_excel(io.BytesIO(attachment.data))) == 50
+    assert "первые 50" in plan.note
+    assert str(tmp_path) not in plan.note and plan.saved_path.name not in plan.note
+
+    # Runs finishing within the same second must not overwrite each other
+    again = package_results(df, xlsx_bytes=data, max_bytes=1_000, max_parts=2, summary_rows=50)
+    assert again.saved_path != plan.saved_path
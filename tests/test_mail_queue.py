@@ -0,0 +1,195 @@
+"""Tests for core.mail_queue module."""
+
+import email
+import email.header
+import io
+import smtplib
+import socket
+
+import pytest
+
+from core.email_mailru import Attachment, send_spooled
+from core.mail_queue import MailQueue
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class RecordingHandler:
+    """Collects delivered messages; optionally replies to the first DATA with an error."""
+
+    def __init__(self, fail_first_with: str | None = None):
+        self.messages = []
+        self.sessions = []
+        self.fail_first_with = fail_first_with
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_first_with:
+            reply, self.fail_first_with = self.fail_first_with, None
+            return reply
+        self.messages.append(envelope)
+        self.sessions.append(id(session))
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    def start(handler):
+        controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=_free_port())
+        controller.start()
+        started.append(controller)
+        return controller
+
+    started = []
+    yield start
+    for controller in started:
+        controller.stop()
+
+
+def _queue(controller) -> MailQueue:
+    return MailQueue(
+        host=controller.hostname, port=controller.port, starttls=False, backoff_s=0.0
+    )
+
+
+def test_sends_to_every_recipient_over_one_connection(smtp_server):
+    handler = RecordingHandler()
+    mail = _queue(smtp_server(handler))
+
+    job_id = mail.submit(
+        "a@example.com, b@example.com; c@example.com",
+        subject="Результаты",
+        body="Тело письма",
+        attachments=[Attachment("results.xlsx", b"xlsx-bytes")],
+    )
+    job = mail.wait(job_id, timeout=10)
+    mail.close(timeout=5)
+
+    assert job.status == "done"
+    assert job.sent == ["a@example.com", "b@example.com", "c@example.com"]
+    assert [envelope.rcpt_tos for envelope in handler.messages] == [
+        ["a@example.com"],
+        ["b@example.com"],
+        ["c@example.com"],
+    ]
+    assert len(set(handler.sessions)) == 1
+
+    parsed = email.message_from_bytes(handler.messages[1].content)
+    assert parsed["To"] == "b@example.com"
+    attachment = [part for part in parsed.walk() if part.get_filename()][0]
+    assert attachment.get_filename() == "results.xlsx"
+    assert attachment.get_payload(decode=True) == b"xlsx-bytes"
+
+
+def test_split_attachments_go_in_separate_messages(smtp_server):
+    handler = RecordingHandler()
+    mail = _queue(smtp_server(handler))
+    parts = [Attachment("results.zip.001", b"a" * 5000), Attachment("results.zip.002", b"b" * 10)]
+
+    job = mail.wait(
+        mail.submit("a@example.com", "Итоги", ".leading dot\n.\nend", parts, one_per_message=True),
+        timeout=10,
+    )
+
+    assert job.status == "done"
+    parsed = [email.message_from_bytes(envelope.content) for envelope in handler.messages]
+    subjects = [str(email.header.make_header(email.header.decode_header(m["Subject"]))) for m in parsed]
+    assert subjects == ["Итоги (часть 1 из 2)", "Итоги (часть 2 из 2)"]
+    payloads = [
+        [part.get_payload(decode=True) for part in message.walk() if part.get_filename()]
+        for message in parsed
+    ]
+    assert payloads == [[b"a" * 5000], [b"b" * 10]]
+    text = parsed[0].get_payload()[0].get_payload(decode=True).decode("utf-8")
+    assert text.splitlines() == [".leading dot", ".", "end"]
+
+
+def test_transient_error_is_retried_on_a_new_connection(smtp_server):
+    handler = RecordingHandler(fail_first_with="421 Try again later")
+    mail = _queue(smtp_server(handler))
+
+    job = mail.wait(mail.submit(["a@example.com"], "s", "b"), timeout=10)
+
+    assert job.status == "done"
+    assert job.attempts == 2
+    assert len(handler.messages) == 1
+
+
+def test_permanent_error_fails_only_that_recipient(smtp_server):
+    handler = RecordingHandler(fail_first_with="554 Rejected")
+    mail = _queue(smtp_server(handler))
+
+    job = mail.wait(mail.submit("a@example.com, b@example.com", "s", "b"), timeout=10)
+
+    assert job.status == "partial"
+    assert job.attempts == 1
+    assert set(job.failed) == {"a@example.com"}
+    assert job.sent == ["b@example.com"]
+    assert [envelope.rcpt_tos for envelope in handler.messages] == [["b@example.com"]]
+
+
+def test_finished_jobs_are_pruned(smtp_server):
+    mail = MailQueue(
+        host="127.0.0.1", port=smtp_server(RecordingHandler()).port, starttls=False, max_finished=2
+    )
+    job_ids = [mail.submit("a@example.com", "s", "b") for _ in range(2)]
+    for job_id in job_ids:
+        mail.wait(job_id, timeout=10)
+
+    latest = mail.submit("a@example.com", "s", "b")
+
+    with pytest.raises(KeyError):
+        mail.status(job_ids[0])
+    assert mail.wait(job_ids[1], timeout=10).status == "done"
+    assert mail.wait(latest, timeout=10).status == "done"
+
+
+def test_unreachable_server_gives_up_after_retries():
+    mail = MailQueue(host="127.0.0.1", port=_free_port(), starttls=False, retries=2, backoff_s=0.0)
+
+    job = mail.wait(mail.submit("a@example.com", "s", "b"), timeout=10)
+
+    assert job.status == "failed"
+    assert job.attempts == 3
+
+
+def test_submit_requires_a_recipient():
+    with pytest.raises(RuntimeError):
+        MailQueue().submit(" , ", "s", "b")
+
+
+class _DataRefusingServer:
+    """Stands in for smtplib.SMTP: accepts the envelope, refuses the DATA command."""
+
+    def __init__(self):
+        self.commands = []
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def mail(self, sender):
+        self.commands.append("MAIL")
+        return 250, b"OK"
+
+    def rcpt(self, recipient):
+        self.commands.append("RCPT")
+        return 250, b"OK"
+
+    def docmd(self, command):
+        self.commands.append(command)
+        return 554, b"No valid recipients"
+
+    def rset(self):
+        self.commands.append("RSET")
+
+
+def test_send_spooled_resets_session_when_data_is_refused():
+    server = _DataRefusingServer()
+    with pytest.raises(smtplib.SMTPDataError):
+        send_spooled(server, "me@example.com", ["a@example.com"], b"Subject: s\r\n\r\n", io.BytesIO(b"b"))
+    assert server.commands == ["MAIL", "RCPT", "DATA", "RSET"]
@@ -1,9 +1,8 @@
 """Tests for core.merge module."""
 
 import pandas as pd
-import pytest
 
-from core.merge import merge_results
+from core.merge import StreamingMerger, canonicalize_url, merge_results, row_key
 
 
 def _make_df(rows: list[dict]) -> pd.DataFrame:
@@ -128,3 +127,93 @@ def test_merge_multiple_sources():
     sources = set(result["source"])
     assert "docSearch" in sources
     assert "extendedsearch" in sources
+
+
+def test_merge_sorts_portal_dates_chronologically():
+    df = _make_df(
+        [
+            {
+                "purchase_number": "001",
+                "title": "March",
+                "url": "https://example.com/1",
+                "price": "1 000,00 руб.",
+                "publish_date": "12.03.2024",
+                "source": "docSearch",
+            },
+            {
+                "purchase_number": "002",
+                "title": "December",
+                "url": "https://example.com/2",
+                "price": "2 500,50 руб.",
+                "publish_date": "01.12.2023",
+                "source": "docSearch",
+            },
+        ]
+    )
+    result = merge_results([df])
+    assert list(result["purchase_number"]) == ["001", "002"]
+    assert result["price"].tolist() == [1000.0, 2500.5]
+
+
+def test_merge_keeps_rows_with_empty_purchase_numbers():
+    df = _make_df(
+        [
+            {"purchase_number": "", "title": "A", "url": "https://example.com/a"},
+            {"purchase_number": "", "title": "B", "url": "https://example.com/b"},
+            {"purchase_number": "", "title": "C", "url": ""},
+            {"purchase_number": "", "title": "D", "url": ""},
+        ]
+    )
+    result = merge_results([df])
+    assert sorted(result["title"]) == ["A", "B", "C", "D"]
+
+
+def test_merge_matches_url_shapes():
+    df1 = _make_df([{"purchase_number": "", "title": "A", "url": "/epz/notice?b=2&a=1"}])
+    df2 = _make_df(
+        [{"purchase_number": "", "title": "A", "url": "http://www.zakupki.gov.ru/epz/notice/?a=1&b=2#x"}]
+    )
+    result = merge_results([df1, df2])
+    assert len(result) == 1
+
+
+def test_merge_prefers_more_complete_row():
+    df1 = _make_df([{"purchase_number": "001", "title": "Lot", "source": "docSearch"}])
+    df2 = _make_df(
+        [
+            {
+                "purchase_number": "№ 001",
+                "title": "Lot",
+                "price": 500.0,
+                "publish_date": "2024-01-01",
+                "source": "extendedsearch",
+            }
+        ]
+    )
+    result = merge_results([df1, df2])
+    assert len(result) == 1
+    assert result.iloc[0]["source"] == "extendedsearch"
+    assert result.iloc[0]["price"] == 500.0
+
+
+def test_merge_uses_source_priority_between_equal_rows():
+    row = {"purchase_number": "001", "title": "Lot", "url": "https://example.com/1"}
+    df1 = _make_df([{**row, "source": "extendedsearch"}])
+    df2 = _make_df([{**row, "source": "docSearch"}])
+    result = merge_results([df1, df2])
+    assert result.iloc[0]["source"] == "docSearch"
+
+
+def test_streaming_merger_accepts_batches_incrementally():
+    merger = StreamingMerger()
+    assert merger.add(_make_df([{"purchase_number": "001", "title": "A"}])) == 1
+    assert merger.add(_make_df([{"purchase_number": "001", "title": "A"}])) == 0
+    assert merger.add(_make_df([{"purchase_number": "002", "title": "B"}])) == 1
+    assert len(merger.result()) == 2
+
+
+def test_canonicalize_url_drops_tracking_and_fragment():
+    assert canonicalize_url("HTTPS://Zakupki.gov.ru/epz/?utm_source=x&id=5#top") == (
+        "https://zakupki.gov.ru/epz?id=5"
+    )
+    assert row_key({"purchase_number": None, "url": None}) == ""
@@ -0,0 +1,88 @@
+"""Tests for core.metrics module."""
+
+import contextvars
+import json
+import threading
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from core.export_excel import to_csv_bytes
+from core.metrics import (
+    REGISTRY,
+    MetricsRegistry,
+    collect_spans,
+    start_http_server,
+    summarize_spans,
+)
+
+
+def test_span_records_histogram_and_errors():
+    registry = MetricsRegistry()
+    with registry.span("stage", source="a"):
+        pass
+    with pytest.raises(ValueError):
+        with registry.span("stage", source="a"):
+            raise ValueError("boom")
+
+    (histogram,) = registry.to_dict()["histograms"]
+    assert histogram["name"] == "span_seconds"
+    assert histogram["labels"] == {"source": "a", "span": "stage"}
+    assert histogram["count"] == 2
+    assert histogram["buckets"]["+Inf"] == 2
+    assert registry.counter("errors_total", span="stage", source="a") == 1
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.inc("rows_total", 3, source="docSearch")
+    registry.inc("rows_total", 2, source="docSearch")
+    registry.observe("span_seconds", 0.2, buckets=(0.1, 1.0), span="merge")
+
+    text = registry.to_prometheus()
+    assert "# TYPE zakupki_rows_total counter" in text
+    assert 'zakupki_rows_total{source="docSearch"} 5' in text
+    assert 'zakupki_span_seconds_bucket{span="merge",le="0.1"} 0' in text
+    assert 'zakupki_span_seconds_bucket{span="merge",le="1"} 1' in text
+    assert 'zakupki_span_seconds_bucket{span="merge",le="+Inf"} 1' in text
+    assert 'zakupki_span_seconds_count{span="merge"} 1' in text
+
+
+def test_collect_spans_includes_threads_started_in_copied_context():
+    registry = MetricsRegistry()
+
+    def work():
+        with registry.span("background"):
+            pass
+
+    with collect_spans() as records:
+        with registry.span("outer", source="x"):
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(work,))
+            thread.start()
+            thread.join()
+        threading.Thread(target=work).start()  # plain thread: not collected
+
+    assert sorted(record.name for record in records) == ["background", "outer"]
+    summary = {row["stage"]: row for row in summarize_spans(records)}
+    assert summary["outer [x]"]["calls"] == 1
+
+
+def test_exports_count_bytes():
+    before = REGISTRY.counter("export_bytes_total", format="csv")
+    data = to_csv_bytes(pd.DataFrame({"title": ["Лот"]}))
+    assert REGISTRY.counter("export_bytes_total", format="csv") - before == len(data)
+
+
+def test_http_endpoint_serves_text_and_json():
+    registry = MetricsRegistry()
+    registry.inc("pages_total", source="docSearch")
+    server = start_http_server(0, host="127.0.0.1", registry=registry)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert 'zakupki_pages_total{source="docSearch"} 1' in response.read().decode()
+        with urllib.request.urlopen(f"{base}/metrics.json") as response:
+            assert json.load(response)["counters"][0]["name"] == "pages_total"
+    finally:
+        server.shutdown()
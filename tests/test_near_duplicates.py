@@ -0,0 +1,79 @@
+"""Tests for core.near_duplicates module."""
+
+import numpy as np
+import pandas as pd
+
+from core.near_duplicates import MAX_EXHAUSTIVE_BUCKET, _candidate_pairs, find_near_duplicates, minhash_signatures
+
+
+def _sample_df() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "purchase_number": ["001", "002", "003", "004"],
+            "title": [
+                "Поставка ноутбуков для нужд администрации города",
+                "Поставка ноутбуков для нужд администрации города.",
+                "Ремонт кровли здания школы",
+                "Поставка ноутбуков для нужд администрации города",
+            ],
+            "price": [100_000.0, 101_000.0, 50_000.0, 900_000.0],
+            "publish_date": pd.to_datetime(
+                ["2024-01-10", "2024-01-12", "2024-01-11", "2024-01-10"]
+            ),
+            "source": ["docSearch", "extendedsearch", "docSearch", "docSearch"],
+        }
+    )
+
+
+def test_near_duplicates_groups_similar_titles():
+    result = find_near_duplicates(_sample_df())
+    groups = dict(zip(result["purchase_number"], result["dup_group"]))
+    assert groups["001"] == groups["002"]
+    assert groups["003"] != groups["001"]
+
+
+def test_near_duplicates_respects_price_proximity():
+    result = find_near_duplicates(_sample_df())
+    groups = dict(zip(result["purchase_number"], result["dup_group"]))
+    assert groups["004"] != groups["001"]
+
+
+def test_near_duplicates_respects_date_window():
+    df = _sample_df()
+    df.loc[1, "publish_date"] = pd.Timestamp("2024-06-01")
+    result = find_near_duplicates(df)
+    groups = dict(zip(result["purchase_number"], result["dup_group"]))
+    assert groups["001"] != groups["002"]
+
+
+def test_near_duplicates_collapse_keeps_first_row():
+    result = find_near_duplicates(_sample_df(), collapse=True)
+    assert list(result["purchase_number"]) == ["001", "003", "004"]
+
+
+def test_near_duplicates_empty_and_blank_titles():
+    empty = find_near_duplicates(pd.DataFrame(columns=["title"]))
+    assert "dup_group" in empty.columns
+    blank = find_near_duplicates(pd.DataFrame({"title": ["", ""]}))
+    assert blank["dup_group"].nunique() == 2
+
+
+def test_near_duplicates_compares_every_pair_of_a_bucket():
+    # Identical titles share every band; alternating prices break the chains
+    # through the bucket's first member and each member's predecessor
+    df = pd.DataFrame(
+        {
+            "purchase_number": [f"00{index}" for index in range(6)],
+            "title": ["Поставка бумаги для офисной техники"] * 6,
+            "price": [100.0, 900.0, 100.0, 900.0, 100.0, 900.0],
+        }
+    )
+    groups = find_near_duplicates(df)["dup_group"].tolist()
+    assert groups == [0, 1, 0, 1, 0, 1]
+
+
+def test_candidate_pairs_are_exhaustive_in_small_buckets_and_linear_in_huge_ones():
+    signatures, _ = minhash_signatures(["Поставка бумаги"] * 200)
+    size = MAX_EXHAUSTIVE_BUCKET
+    assert len(_candidate_pairs(signatures[:size], np.arange(size))) == size * (size - 1) // 2
+    assert len(_candidate_pairs(signatures, np.arange(200))) == 2 * 199 - 1
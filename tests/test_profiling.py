@@ -0,0 +1,79 @@
+"""Tests for core.profiling module."""
+
+import contextvars
+import json
+import threading
+import time
+import zipfile
+
+from core.metrics import collect_spans, span
+from core.profiling import RunProfiler, active_profiler, memory_usage, track_thread
+
+
+class RecordingTracing:
+    """Stands in for ``BrowserContext.tracing``: writes a file on stop()."""
+
+    def stop(self, path):
+        with open(path, "wb") as trace:
+            trace.write(b"PK-trace")
+
+
+def _busy_loop(seconds: float) -> int:
+    total, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def _tracked_busy_loop(seconds: float) -> int:
+    track_thread()
+    return _busy_loop(seconds)
+
+
+def test_bundle_holds_chrome_trace_summary_and_playwright_traces(tmp_path):
+    with RunProfiler("поставка бумаги", directory=tmp_path, interval_s=0.002) as profiler:
+        with collect_spans() as records, span("pipeline.run"):
+            profiler.attach_spans(records)
+            assert active_profiler() is profiler
+            worker = threading.Thread(
+                target=contextvars.copy_context().run, args=(_tracked_busy_loop, 0.15), name="scraper"
+            )
+            other_run = threading.Thread(target=_busy_loop, args=(0.15,), name="other-search")
+            worker.start()
+            other_run.start()
+            with span("source.search", source="docSearch"):
+                _busy_loop(0.15)
+            worker.join()
+            other_run.join()
+            profiler.save_playwright_trace(RecordingTracing(), "docSearch")
+    assert active_profiler() is None
+    assert profiler.error is None and profiler.path.parent == tmp_path
+    assert "поставка_бумаги" in profiler.path.name
+
+    with zipfile.ZipFile(profiler.path) as bundle:
+        assert sorted(bundle.namelist()) == ["playwright/docSearch-1.zip", "summary.json", "trace.json"]
+        trace = json.loads(bundle.read("trace.json"))
+        summary = json.loads(bundle.read("summary.json"))
+
+    events = trace["traceEvents"]
+    stages = {event["name"] for event in events if event.get("cat") == "stage"}
+    assert stages == {"pipeline.run", "source.search"}
+    python_frames = [event for event in events if event.get("cat") == "python"]
+    assert any(event["name"].startswith("_busy_loop (test_profiling.py") for event in python_frames)
+    assert all(event["dur"] > 0 for event in python_frames)
+    thread_names = {event["args"]["name"] for event in events if event["name"] == "thread_name"}
+    assert {"stages", "scraper"} <= thread_names
+    assert "other-search" not in thread_names
+    assert any(event["ph"] == "C" and event["args"]["python"] > 0 for event in events)
+
+    assert summary["python_peak_rss_mb"] > 0
+    assert "concurrent runs" in summary["memory_scope"]
+    assert summary["stack_samples"] > 0
+    assert summary["top_functions"][0]["samples"] > 0
+    assert summary["playwright_traces"] == ["playwright/docSearch-1.zip"]
+
+
+def test_memory_usage_reports_this_process():
+    python, children = memory_usage()
+    assert python is None or python > 0
+    assert children >= 0
@@ -0,0 +1,112 @@
+"""Tests for core.result_store module."""
+
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+from core.result_store import ResultStore
+from core.schema import to_schema
+
+
+def _results(rows: int) -> pd.DataFrame:
+    return to_schema(
+        pd.DataFrame(
+            {
+                "purchase_number": [f"{index:019d}" for index in range(rows)],
+                "title": [
+                    f"Поставка бумаги {index}" if index % 2 else f"Ремонт кровли {index}"
+                    for index in range(rows)
+                ],
+                "url": [f"https://zakupki.gov.ru/{index}" for index in range(rows)],
+                "price": [float(index) for index in range(rows)],
+                "publish_date": "01.02.2024",
+                "source": ["docSearch" if index % 3 else "extendedsearch" for index in range(rows)],
+            }
+        )
+    )
+
+
+@pytest.fixture(params=["arrow", "duckdb"])
+def store(request, tmp_path):
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb")
+    return ResultStore(tmp_path, backend=request.param)
+
+
+def test_query_pages_in_stored_order(store):
+    run_id = store.save(_results(250), query="бумага")
+
+    first = store.query(run_id, page=1, page_size=100)
+    last = store.query(run_id, page=99, page_size=100)
+
+    assert store.info(run_id).rows == 250
+    assert first.total == 250 and first.pages == 3
+    assert first.rows["purchase_number"].iloc[0] == "0000000000000000000"
+    assert last.page == 3 and len(last.rows) == 50
+    assert str(first.rows["publish_date"].dtype) == "datetime64[ns]"
+
+
+def test_query_filters_and_sorts(store):
+    run_id = store.save(_results(250))
+
+    page = store.query(
+        run_id, page_size=10, text="БУМАГ", source="docSearch", sort_by="price", descending=True
+    )
+
+    # Odd indices that are not multiples of 3
+    assert page.total == 83
+    assert page.rows["price"].tolist()[:3] == [247.0, 245.0, 241.0]
+    assert set(page.rows["source"]) == {"docSearch"}
+    assert store.query(run_id, text="0000000000000000007").total == 1
+    with pytest.raises(RuntimeError, match="сортировки"):
+        store.query(run_id, sort_by="missing")
+
+
+@pytest.mark.parametrize(
+    ("sort_by", "descending", "expected"),
+    [
+        ("price", False, [0.0, 1.0, 2.0]),
+        ("source", False, ["docSearch"] * 3),
+        ("source", True, ["extendedsearch"] * 3),
+    ],
+)
+def test_query_sorts_by_column(store, sort_by, descending, expected):
+    run_id = store.save(_results(30))
+
+    page = store.query(run_id, page_size=3, sort_by=sort_by, descending=descending)
+
+    assert page.total == 30
+    assert page.rows[sort_by].tolist() == expected
+
+
+def test_old_runs_are_pruned(tmp_path):
+    store = ResultStore(tmp_path, max_runs=2, backend="arrow")
+    first = store.save(_results(3))
+    second = store.save(_results(4))
+    third = store.save(_results(5))
+
+    with pytest.raises(KeyError):
+        store.info(first)
+    assert not store.path(first).exists()
+    assert len(store.load(second)) == 4 and len(store.load(third)) == 5
+
+
+def _save_runs(path, count: int) -> None:
+    store = ResultStore(path, backend="arrow")
+    for _ in range(count):
+        store.save(_results(2))
+
+
+def test_saves_from_several_processes_keep_every_run(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_save_runs, args=(tmp_path, 10)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+
+    runs = ResultStore(tmp_path, backend="arrow")._read_manifest()
+    assert len(runs) == 30
+    assert sorted(path.stem for path in tmp_path.glob("*.parquet")) == sorted(runs)
@@ -0,0 +1,201 @@
+"""Tests for core.scheduler module."""
+
+import datetime
+import json
+import threading
+
+import pandas as pd
+
+import core.scheduler as scheduler_module
+from core.change_tracking import ChangeTracker
+from core.pipeline import SearchOutcome
+from core.scheduler import ProfileStore, Scheduler, SearchProfile, new_rows
+from core.settings import SearchSettings
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, **kwargs):
+        self.jobs.append(kwargs)
+        return f"job-{len(self.jobs)}"
+
+
+def _results(*numbers: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "purchase_number": list(numbers),
+            "title": [f"Лот {n}" for n in numbers],
+            "url": [f"https://zakupki.gov.ru/{n}" for n in numbers],
+        }
+    )
+
+
+def _store(tmp_path) -> ProfileStore:
+    return ProfileStore(tmp_path / "profiles.json", tmp_path / "snapshots")
+
+
+def test_profiles_round_trip_without_credentials(tmp_path):
+    store = _store(tmp_path)
+    settings = SearchSettings(
+        query="бумага",
+        date_from=datetime.date(2024, 1, 1),
+        email_recipient="a@example.com",
+        smtp_login="user@mail.ru",
+        smtp_password="secret",
+    )
+    store.save(SearchProfile("Бумага", settings, interval_hours=6))
+
+    raw = (tmp_path / "profiles.json").read_text(encoding="utf-8")
+    assert "secret" not in raw and "user@mail.ru" not in raw
+    (loaded,) = store.profiles()
+    assert loaded.settings.date_from == datetime.date(2024, 1, 1)
+    assert loaded.settings.smtp_password == ""
+    assert loaded.interval_hours == 6
+
+
+def test_range_ending_today_is_saved_as_rolling_window(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    saved_on = datetime.date(2024, 3, 1)
+    rolling = SearchSettings("a", date_from=datetime.date(2024, 1, 31), date_to=saved_on)
+    store.save(SearchProfile.from_search("A", rolling, today=saved_on))
+    fixed = SearchSettings("b", date_from=datetime.date(2024, 1, 1), date_to=datetime.date(2024, 2, 1))
+    store.save(SearchProfile.from_search("B", fixed, today=saved_on))
+
+    profiles = {profile.name: profile for profile in store.profiles()}
+    assert profiles["A"].days_back == 30 and profiles["A"].settings.date_to is None
+    assert profiles["B"].days_back is None and profiles["B"].settings == fixed
+
+    searched = []
+    monkeypatch.setattr(
+        scheduler_module, "run_search", lambda settings: searched.append(settings) or SearchOutcome(_results())
+    )
+    scheduler = Scheduler(store, jitter_s=0, mail_queue=RecordingQueue(), tracker=ChangeTracker(tmp_path / "c.db"))
+    scheduler.run_profile(profiles["A"])
+    scheduler.stop()
+    today = datetime.date.today()
+    assert (searched[0].date_from, searched[0].date_to) == (today - datetime.timedelta(days=30), today)
+
+
+def test_concurrent_writers_never_lose_a_profile(tmp_path):
+    _store(tmp_path).save(SearchProfile("base", SearchSettings("base")))
+
+    def write(index: int) -> None:
+        store = _store(tmp_path)  # Own instance: only the file lock is shared, as between processes
+        store.save(SearchProfile(f"p{index}", SearchSettings(f"q{index}")))
+        store.mark_run("base", float(index))
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {profile.name for profile in _store(tmp_path).profiles()} == {"base"} | {f"p{i}" for i in range(8)}
+
+
+def test_new_rows_keeps_only_unseen_purchases():
+    results = _results("0001", "0002", "0003")
+    assert len(new_rows(results, None)) == 3
+    fresh = new_rows(results, {"0001", "0003"})
+    assert fresh["purchase_number"].tolist() == ["0002"]
+    fresh = new_rows(results, {"0001", "0003"}, changed_keys={"0003"})
+    assert fresh["purchase_number"].tolist() == ["0002", "0003"]
+
+
+def test_run_due_diffs_against_previous_run_and_groups_digests(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.save(SearchProfile("A", SearchSettings("a", email_recipient="x@example.com, y@example.com")))
+    store.save(SearchProfile("B", SearchSettings("b", email_recipient="x@example.com")))
+    responses = {
+        "a": [_results("1", "2"), _results("1", "2", "3")],
+        "b": [_results("9"), _results("9")],
+    }
+    monkeypatch.setattr(
+        scheduler_module,
+        "run_search",
+        lambda settings: SearchOutcome(responses[settings.query].pop(0)),
+    )
+    mail = RecordingQueue()
+    scheduler = Scheduler(
+        store, workers=2, jitter_s=0, mail_queue=mail, tracker=ChangeTracker(tmp_path / "changes.sqlite")
+    )
+
+    first = scheduler.run_due(now=0)
+    assert sorted(len(run.new_rows) for run in first) == [1, 2]
+    assert sorted(job["recipients"][0] for job in mail.jobs) == ["x@example.com", "y@example.com"]
+
+    # Nothing is due until the interval has passed
+    assert scheduler.run_due(now=60) == []
+
+    mail.jobs.clear()
+    later = max(profile.last_run for profile in store.profiles()) + 24 * 3600
+    second = {run.profile.name: run for run in scheduler.run_due(now=later)}
+    assert second["A"].new_rows["purchase_number"].tolist() == ["3"]
+    assert second["B"].new_rows.empty
+    assert sorted(job["recipients"][0] for job in mail.jobs) == ["x@example.com", "y@example.com"]
+    assert all(job["subject"] == "Новые закупки: 1" for job in mail.jobs)
+    scheduler.stop()
+
+
+def test_failed_run_keeps_previous_snapshot(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.save(SearchProfile("A", SearchSettings(query="a")))
+    store.save_keys("A", _results("1"))
+    monkeypatch.setattr(
+        scheduler_module,
+        "run_search",
+        lambda settings: SearchOutcome(pd.DataFrame(), errors=["docSearch: timeout"]),
+    )
+    scheduler = Scheduler(
+        store, jitter_s=0, mail_queue=RecordingQueue(), tracker=ChangeTracker(tmp_path / "changes.sqlite")
+    )
+
+    (run,) = scheduler.run_due(now=0)
+    assert run.errors == ["docSearch: timeout"]
+    assert store.previous_keys("A") == {"1"}
+    assert json.loads((tmp_path / "profiles.json").read_text())[0]["last_run"] is not None
+    scheduler.stop()
+
+
+def test_raising_run_is_not_retried_on_the_next_tick(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.save(SearchProfile("A", SearchSettings(query="a")))
+    calls = []
+
+    def broken_search(settings):
+        calls.append(settings)
+        raise RuntimeError("сломанный профиль")
+
+    monkeypatch.setattr(scheduler_module, "run_search", broken_search)
+    scheduler = Scheduler(
+        store, jitter_s=0, mail_queue=RecordingQueue(), tracker=ChangeTracker(tmp_path / "changes.sqlite")
+    )
+
+    (run,) = scheduler.run_due()
+    assert run.errors == ["сломанный профиль"]
+    assert store.profiles()[0].last_run is not None
+    assert scheduler.run_due() == []
+    assert len(calls) == 1
+    scheduler.stop()
+
+
+def test_digest_includes_purchases_whose_content_changed(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.save(SearchProfile("A", SearchSettings("a", email_recipient="x@example.com")))
+    changed = _results("1", "2")
+    changed.loc[1, "title"] = "Лот 2 (изменён)"
+    responses = [_results("1", "2"), changed]
+    monkeypatch.setattr(scheduler_module, "run_search", lambda settings: SearchOutcome(responses.pop(0)))
+    mail = RecordingQueue()
+    scheduler = Scheduler(store, jitter_s=0, mail_queue=mail, tracker=ChangeTracker(tmp_path / "changes.sqlite"))
+
+    scheduler.run_due(now=0)
+    mail.jobs.clear()
+    (run,) = scheduler.run_due(now=store.profiles()[0].last_run + 24 * 3600)
+    assert run.new_rows["title"].tolist() == ["Лот 2 (изменён)"]
+    assert run.changed == 1
+    (job,) = mail.jobs
+    assert "новых 0, изменённых 1 из 2" in job["body"]
+    scheduler.stop()
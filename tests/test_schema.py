@@ -0,0 +1,58 @@
+"""Tests for core.schema module."""
+
+import pandas as pd
+
+from core.schema import COLUMNS, arrow_schema, parse_dates, parse_prices, to_schema
+
+
+def test_parse_prices_handles_portal_formats():
+    values = pd.Series(["1 234 567,89 руб.", "12\xa0500,00 ₽", "—", None])
+    result = parse_prices(values)
+    assert result.iloc[0] == 1234567.89
+    assert result.iloc[1] == 12500.0
+    assert result.iloc[2:].isna().all()
+
+
+def test_parse_dates_accepts_portal_and_iso_dates():
+    values = pd.Series(["12.03.2024", "Размещено 01.02.2023 10:00", "2024-01-05", ""])
+    result = parse_dates(values)
+    assert result.dtype == "datetime64[ns]"
+    assert result.iloc[0] == pd.Timestamp("2024-03-12")
+    assert result.iloc[1] == pd.Timestamp("2023-02-01")
+    assert result.iloc[2] == pd.Timestamp("2024-01-05")
+    assert pd.isna(result.iloc[3])
+
+
+def test_to_schema_types_and_order():
+    df = pd.DataFrame(
+        {
+            "source": ["docSearch"],
+            "title": [None],
+            "extra": [1],
+            "price": ["100 руб."],
+        }
+    )
+    result = to_schema(df)
+    assert list(result.columns) == COLUMNS + ["extra"]
+    assert result.iloc[0]["title"] == ""
+    assert result.iloc[0]["purchase_number"] == ""
+    assert result["price"].dtype == "float64"
+    assert isinstance(result["source"].dtype, pd.CategoricalDtype)
+
+
+def test_to_schema_is_idempotent():
+    df = to_schema(pd.DataFrame({"price": ["1,5"], "publish_date": ["01.01.2024"]}))
+    again = to_schema(df)
+    pd.testing.assert_frame_equal(df, again)
+
+
+def test_arrow_schema_fixes_known_types_and_defaults_empty_columns_to_string():
+    import pyarrow as pa
+
+    df = to_schema(pd.DataFrame({"title": [None], "ai_score": [None], "note": [None], "count": [3]}))
+    schema = arrow_schema(df)
+    assert schema.names == list(df.columns)
+    assert schema.field("publish_date").type == pa.timestamp("ns")
+    assert schema.field("ai_score").type == pa.float64()
+    assert schema.field("note").type == pa.string()
+    assert schema.field("count").type == pa.int64()
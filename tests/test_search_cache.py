@@ -0,0 +1,80 @@
+"""Tests for core.search_cache module."""
+
+import datetime
+import time
+
+import pandas as pd
+
+import core.pipeline as pipeline_module
+from core.pipeline import run_search
+from core.search_cache import SearchCache, cache_key
+from core.settings import SearchSettings
+
+
+def _rows(*numbers: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "purchase_number": list(numbers),
+            "title": [f"Поставка бумаги {n}" for n in numbers],
+            "url": [f"https://zakupki.gov.ru/{n}" for n in numbers],
+            "price": [100.0] * len(numbers),
+            "source": "docSearch",
+        }
+    )
+
+
+def test_put_get_respects_age_and_replaces_entries(tmp_path):
+    cache = SearchCache(tmp_path)
+    settings = SearchSettings(query="Бумага  А4")
+    assert cache.get(settings, max_age_s=3600) is None
+
+    cache.put(settings, _rows("1", "2"), fetched_at=time.time() - 600)
+    cached = cache.get(SearchSettings(query="бумага а4"), max_age_s=3600)
+    assert cached is not None
+    assert cached.results["purchase_number"].tolist() == ["1", "2"]
+    assert 590 < cached.age_s < 700
+    assert cache.get(settings, max_age_s=60) is None
+    assert cache.get(SearchSettings(query="бумага а4", region="г Казань"), max_age_s=3600) is None
+
+    cache.put(settings, _rows("3"))
+    assert cache.get(settings, max_age_s=3600).results["purchase_number"].tolist() == ["3"]
+    assert len(list((tmp_path / "runs").glob("*.parquet"))) == 1
+
+
+def test_popular_counts_requests_and_moves_rolling_ranges(tmp_path):
+    cache = SearchCache(tmp_path)
+    day = datetime.date(2024, 3, 10)
+    at = datetime.datetime(2024, 3, 10, 12).timestamp()
+    rolling = SearchSettings(query="бумага", date_from=day - datetime.timedelta(days=30), date_to=day)
+    fixed = SearchSettings(query="ремонт", date_from=datetime.date(2024, 1, 1), date_to=datetime.date(2024, 2, 1))
+    for offset in range(3):
+        cache.note_request(rolling, requested_at=at + offset)
+    cache.note_request(fixed, requested_at=at + 10)
+    # Next day the same "last 30 days" search counts for the same entry
+    next_day = datetime.date(2024, 3, 11)
+    cache.note_request(
+        SearchSettings(query="Бумага", date_from=next_day - datetime.timedelta(days=30), date_to=next_day),
+        requested_at=at + 86400,
+    )
+
+    popular = cache.popular(limit=5, since=at - 1, day=datetime.date(2024, 3, 12))
+    assert [(settings.query, count) for settings, count in popular] == [("Бумага", 4), ("ремонт", 1)]
+    assert popular[0][0].date_to == datetime.date(2024, 3, 12)
+    assert popular[0][0].date_from == datetime.date(2024, 2, 11)
+    assert popular[1][0].date_to == datetime.date(2024, 2, 1)
+    assert cache_key(popular[1][0]) == cache_key(fixed)
+
+
+def test_pipeline_serves_cached_rows_without_scraping(tmp_path, monkeypatch):
+    cache = SearchCache(tmp_path)
+    monkeypatch.setattr(pipeline_module, "get_search_cache", lambda: cache)
+    settings = SearchSettings(query="бумага", use_cache=True)
+    cache.put(settings, _rows("1", "2"), fetched_at=time.time() - 60)
+
+    outcome = run_search(settings)
+
+    assert outcome.errors == []
+    assert outcome.results["purchase_number"].tolist() == ["1", "2"]
+    assert outcome.cached_at is not None and time.time() - outcome.cached_at >= 60
+    [(requested, count)] = cache.popular()
+    assert (requested.query, count) == ("бумага", 1)